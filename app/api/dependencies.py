@@ -2,9 +2,13 @@ import time
 from typing import Annotated
 
 import structlog
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request, WebSocketException, status
+from starlette.requests import HTTPConnection
 
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.contracts.services.frame_broker import IFrameBrokerService
 from app.contracts.services.health_check import IHealthCheckService
+from app.contracts.services.hls import IHlsService
 from app.contracts.services.onvif_service import IOnvifService
 from app.core.config import Settings
 from app.core.types import LoggerType
@@ -15,8 +19,8 @@ def get_settings_dependency(request: Request) -> Settings:
     return request.app.state.settings
 
 
-def get_logger(request: Request) -> structlog.stdlib.BoundLogger:
-    return request.app.state.logger
+def get_logger(connection: HTTPConnection) -> structlog.stdlib.BoundLogger:
+    return connection.app.state.logger
 
 
 def get_shared_services(request: Request) -> SharedServices:
@@ -31,8 +35,35 @@ def get_health_check_service(request: Request) -> IHealthCheckService:
     return request.app.state.shared_services.health_check_service
 
 
-def get_onvif_service(request: Request) -> IOnvifService:
-    return request.app.state.shared_services.onvif_service
+def get_camera_registry(connection: HTTPConnection) -> ICameraRegistry:
+    return connection.app.state.shared_services.camera_registry
+
+
+async def get_onvif_service(
+    camera_id: str, connection: HTTPConnection
+) -> IOnvifService:
+    # Async, so the registry is only ever touched from the event loop
+    try:
+        return get_camera_registry(connection).get(camera_id)
+    except ValueError:
+        # WebSocket handshakes can't be answered with an HTTP error response
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(
+                code=status.WS_1008_POLICY_VIOLATION,
+                reason=f"Camera {camera_id} not found",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Camera {camera_id} not found",
+        )
+
+
+def get_frame_broker(request: Request) -> IFrameBrokerService:
+    return request.app.state.shared_services.frame_broker
+
+
+def get_hls_service(request: Request) -> IHlsService:
+    return request.app.state.shared_services.hls_service
 
 
 # ───────────────────────────────SETTINGS───────────────────────────────
@@ -42,7 +73,10 @@ SharedServicesDep = Annotated[SharedServices, Depends(get_shared_services)]
 HealthCheckServiceDep = Annotated[
     IHealthCheckService, Depends(get_health_check_service)
 ]
+CameraRegistryDep = Annotated[ICameraRegistry, Depends(get_camera_registry)]
 OnvifServiceDep = Annotated[IOnvifService, Depends(get_onvif_service)]
+FrameBrokerDep = Annotated[IFrameBrokerService, Depends(get_frame_broker)]
+HlsServiceDep = Annotated[IHlsService, Depends(get_hls_service)]
 # ───────────────────────────────OTHER───────────────────────────────
 UptimeDep = Annotated[float, Depends(get_uptime)]
 LoggerDep = Annotated[LoggerType, Depends(get_logger)]
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Response
+
+from app.api.dependencies import SharedServicesDep
+from app.services.metrics import (
+    PROMETHEUS_MEDIA_TYPE,
+    REGISTRY,
+    collect_stream_gauges,
+)
+
+metrics_router = APIRouter(tags=["metrics"])
+
+
+@metrics_router.get("/metrics", response_class=Response)
+async def get_metrics(shared_services: SharedServicesDep) -> Response:
+    frame_broker = shared_services.frame_broker
+    stats = [
+        source_stats
+        for camera_id in shared_services.camera_registry.camera_ids()
+        if (source_stats := frame_broker.get_stats(camera_id)) is not None
+    ]
+    return Response(
+        content=REGISTRY.render(collect_stream_gauges(stats)),
+        media_type=PROMETHEUS_MEDIA_TYPE,
+    )
@@ -1,106 +1,297 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from app.api.dependencies import OnvifServiceDep
+import asyncio
+import contextlib
+import time
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter, ValidationError
+
+from app.api.dependencies import CameraRegistryDep, LoggerDep, OnvifServiceDep
 from app.core.types import PanVelocityType, TiltVelocityType, ZoomVelocityType
+from app.schemas.ptz import (
+    PTZControlMessage,
+    PTZMove,
+    PTZMoveMessage,
+    PTZSequence,
+    PTZStopMessage,
+)
+from app.services.onvif_client import ONVIF_ERRORS
 
 router = APIRouter()
 
-
-class PTZCommand(BaseModel):
-    pan_velocity: PanVelocityType
-    tilt_velocity: TiltVelocityType
-    zoom_velocity: ZoomVelocityType
+control_message_adapter: TypeAdapter[PTZControlMessage] = TypeAdapter(PTZControlMessage)
 
 
 @router.post("/cameras/ptz")
-async def set_ptz_position(command: PTZCommand, onvif_service: OnvifServiceDep):
+async def set_ptz_position(
+    command: PTZMove, onvif_service: OnvifServiceDep, wait: bool = False
+):
     # Execute PTZ movements
     try:
-        if command.pan_velocity != 0:
-            onvif_service.move_pan(command.pan_velocity)
-        if command.tilt_velocity != 0:
-            onvif_service.move_tilt(command.tilt_velocity)
-        if command.zoom_velocity != 0:
-            onvif_service.move_zoom(command.zoom_velocity)
+        # All axes move together in a single ContinuousMove
+        if command.pan_velocity or command.tilt_velocity or command.zoom_velocity:
+            await onvif_service.move(
+                command.pan_velocity,
+                command.tilt_velocity,
+                command.zoom_velocity,
+                duration=command.duration,
+                wait=wait,
+            )
 
         return {
             "success": True,
             "message": "PTZ movement executed successfully",
         }
-    except Exception as e:
+    except ONVIF_ERRORS as e:
         return {
             "success": False,
-            "error": f"Failed to execute PTZ movement: {str(e)}",
+            "error": f"Failed to execute PTZ movement: {e}",
         }
 
 
+@router.post("/sequence")
+async def run_sequence(sequence: PTZSequence, onvif_service: OnvifServiceDep):
+    await onvif_service.run_sequence(sequence.steps)
+    return {
+        "success": True,
+        "message": f"PTZ sequence of {len(sequence.steps)} moves executed",
+    }
+
+
+@router.websocket("/ws")
+async def ptz_control(
+    websocket: WebSocket,
+    camera_id: str,
+    onvif_service: OnvifServiceDep,
+    camera_registry: CameraRegistryDep,
+    logger: LoggerDep,
+):
+    """
+    Interactive PTZ control channel
+
+    Clients send JSON `move`, `stop` and `ping` messages. Each one is acknowledged
+    with the milliseconds the server took to apply it to the camera. A move without
+    a duration lasts until the next command as long as the client keeps sending
+    messages: every ping or move pushes its Stop back by the heartbeat timeout. The
+    camera is stopped when the client disconnects or stays silent for longer than
+    that. Only text frames are accepted, a binary one closes the connection.
+
+    The camera's service is looked up for every command, the registry may have
+    disconnected and reconnected it during a long session.
+    """
+    heartbeat_timeout = onvif_service.ptz_settings.ws_heartbeat_timeout
+    send_lock = asyncio.Lock()
+    commands: set[asyncio.Task] = set()
+    moved = False
+    # The move without a duration currently kept alive by the client's messages
+    held: PTZMoveMessage | None = None
+
+    async def send(message: dict) -> None:
+        async with send_lock:
+            # The client may be gone by the time a command has been applied
+            with contextlib.suppress(WebSocketDisconnect, RuntimeError):
+                await websocket.send_json(message)
+
+    async def apply(
+        message: PTZControlMessage, held: PTZMoveMessage | None, received_at: float
+    ) -> None:
+        # Commands run concurrently, so a newer move can replace one still being sent
+        try:
+            service = camera_registry.get(camera_id)
+            if isinstance(message, PTZMoveMessage):
+                await service.move(
+                    message.pan_velocity,
+                    message.tilt_velocity,
+                    message.zoom_velocity,
+                    duration=message.duration or heartbeat_timeout,
+                )
+            elif isinstance(message, PTZStopMessage):
+                await service.stop()
+            elif held is not None:
+                # Re-submitting the same velocity isn't sent to the camera again, it
+                # only pushes back the scheduled Stop
+                await service.move(
+                    held.pan_velocity,
+                    held.tilt_velocity,
+                    held.zoom_velocity,
+                    duration=heartbeat_timeout,
+                )
+        except Exception as e:
+            # Reported whatever failed, nothing else retrieves this task's exceptions
+            logger.exception(f"Failed to execute PTZ {message.type} {message.id}")
+            await send(
+                {
+                    "type": "error",
+                    "id": message.id,
+                    "error": f"Failed to execute PTZ {message.type}: {e}",
+                }
+            )
+            return
+        await send(
+            {
+                "type": "ack",
+                "id": message.id,
+                "command": message.type,
+                "latency_ms": round((time.perf_counter() - received_at) * 1000, 3),
+            }
+        )
+
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.receive(), heartbeat_timeout)
+            except TimeoutError:
+                logger.warning(
+                    f"PTZ control client silent for {heartbeat_timeout}s, closing"
+                )
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION, reason="Heartbeat timeout"
+                )
+                break
+
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000), frame.get("reason"))
+            data = frame.get("text")
+            if data is None:
+                logger.warning("PTZ control client sent a binary message, closing")
+                await websocket.close(
+                    code=status.WS_1003_UNSUPPORTED_DATA,
+                    reason="Only text messages are supported",
+                )
+                break
+
+            received_at = time.perf_counter()
+            try:
+                message = control_message_adapter.validate_json(data)
+            except ValidationError as e:
+                await send(
+                    {
+                        "type": "error",
+                        "id": None,
+                        "error": f"Invalid PTZ message: {e.errors(include_url=False)}",
+                    }
+                )
+                continue
+
+            if isinstance(message, PTZMoveMessage):
+                moved = True
+                held = message if message.duration is None else None
+            elif isinstance(message, PTZStopMessage):
+                held = None
+            task = asyncio.create_task(apply(message, held, received_at))
+            commands.add(task)
+            task.add_done_callback(commands.discard)
+    except WebSocketDisconnect:
+        logger.info("PTZ control client disconnected")
+    finally:
+        for task in commands:
+            task.cancel()
+        # Never leave the camera moving without a client controlling it. A camera
+        # disconnected in the meantime was stopped when its service was closed
+        service = camera_registry.connected().get(camera_id)
+        if moved and service is not None:
+            try:
+                await service.stop()
+            except Exception:
+                # Best effort, the session is over whatever failed
+                logger.exception("Failed to stop camera after PTZ control session")
+
+
 @router.post("/left")
 async def move_left(
-    onvif_service: OnvifServiceDep, velocity: PanVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: PanVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.move_left(velocity)
+    await onvif_service.move_left(velocity, wait=wait)
     return {"success": True, "message": "Camera moved left"}
 
 
 @router.post("/right")
 async def move_right(
-    onvif_service: OnvifServiceDep, velocity: PanVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: PanVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.move_right(velocity)
+    await onvif_service.move_right(velocity, wait=wait)
     return {"success": True, "message": "Camera moved right"}
 
 
 @router.post("/up")
 async def move_up(
-    onvif_service: OnvifServiceDep, velocity: TiltVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: TiltVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.move_up(velocity)
+    await onvif_service.move_up(velocity, wait=wait)
     return {"success": True, "message": "Camera moved up"}
 
 
 @router.post("/down")
 async def move_down(
-    onvif_service: OnvifServiceDep, velocity: TiltVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: TiltVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.move_down(velocity)
+    await onvif_service.move_down(velocity, wait=wait)
     return {"success": True, "message": "Camera moved down"}
 
 
 @router.post("/zoom_in")
 async def zoom_in(
-    onvif_service: OnvifServiceDep, velocity: ZoomVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: ZoomVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.zoom_in(velocity)
+    await onvif_service.zoom_in(velocity, wait=wait)
     return {"success": True, "message": "Camera zoomed in"}
 
 
 @router.post("/zoom_out")
 async def zoom_out(
-    onvif_service: OnvifServiceDep, velocity: ZoomVelocityType | None = None
+    onvif_service: OnvifServiceDep,
+    velocity: ZoomVelocityType | None = None,
+    wait: bool = False,
 ):
-    onvif_service.zoom_out(velocity)
+    await onvif_service.zoom_out(velocity, wait=wait)
     return {"success": True, "message": "Camera zoomed out"}
 
 
+@router.post("/stop")
+async def stop(onvif_service: OnvifServiceDep):
+    await onvif_service.stop()
+    return {"success": True, "message": "Camera stopped"}
+
+
+@router.get("/stats")
+async def get_ptz_stats(onvif_service: OnvifServiceDep):
+    stats = onvif_service.get_ptz_stats()
+    return {
+        "success": True,
+        "message": "PTZ command statistics",
+        "stats": stats.model_dump(),
+    }
+
+
 @router.post("/preset")
 async def set_preset(onvif_service: OnvifServiceDep, preset_name: str):
-    onvif_service.set_preset(preset_name)
+    await onvif_service.set_preset(preset_name)
     return {"success": True, "message": "Camera preset set"}
 
 
 @router.get("/presets")
 async def list_presets(onvif_service: OnvifServiceDep):
-    presets = onvif_service.list_presets()
+    presets = await onvif_service.list_presets()
     return {"success": True, "message": "Camera presets listed", "presets": presets}
 
 
 @router.post("/preset/{preset_name}")
 async def goto_preset(onvif_service: OnvifServiceDep, preset_name: str):
-    onvif_service.goto_preset(preset_name)
+    await onvif_service.goto_preset(preset_name)
     return {"success": True, "message": "Camera moved to preset"}
 
 
 @router.delete("/preset/{preset_name}")
 async def delete_preset(onvif_service: OnvifServiceDep, preset_name: str):
-    onvif_service.delete_preset(preset_name)
+    await onvif_service.delete_preset(preset_name)
     return {"success": True, "message": "Camera preset deleted"}
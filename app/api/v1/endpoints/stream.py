@@ -1,57 +1,223 @@
-import logging
-from fastapi import APIRouter, HTTPException
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
-import cv2
+from starlette.background import BackgroundTask
 
-from app.api.dependencies import LoggerDep, OnvifServiceDep
+from app.api.dependencies import (
+    CameraRegistryDep,
+    FrameBrokerDep,
+    HlsServiceDep,
+    LoggerDep,
+    OnvifServiceDep,
+)
+from app.schemas.stream import StreamRequest
+from app.services.capture import is_mjpeg_encoding
+from app.services.hls import (
+    HLS_INIT_MEDIA_TYPE,
+    HLS_PLAYLIST_MEDIA_TYPE,
+    HLS_SEGMENT_MEDIA_TYPE,
+)
+from app.services.metrics import STREAM_SENT_BYTES, profile_label
+from app.services.mjpeg import MJPEG_MEDIA_TYPE, chunk_jpeg
+from app.services.onvif_client import ONVIF_ERRORS
 
 router = APIRouter()
 
 
 @router.get("/stream/{camera_id}", response_class=StreamingResponse)
 async def get_stream(
-    camera_id: str, onvif_service: OnvifServiceDep, logger: LoggerDep
+    camera_id: str,
+    onvif_service: OnvifServiceDep,
+    camera_registry: CameraRegistryDep,
+    frame_broker: FrameBrokerDep,
+    logger: LoggerDep,
+    stream: Annotated[StreamRequest, Query()],
 ) -> StreamingResponse:
+    variant = stream.variant
+    # Without a profile, a viewer asking for a smaller width is streamed the
+    # narrowest profile wide enough, so it decodes the camera's substream
+    try:
+        media_profile = await onvif_service.select_profile(
+            stream.profile, variant.width
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ONVIF_ERRORS as e:
+        logger.error(f"Failed to get media profiles: {e}")
+        raise HTTPException(status_code=404, detail="Camera stream not found")
+    profile_token = None if media_profile.default else media_profile.token
+    # Frames are never scaled up, so a profile already that narrow is streamed as is
+    if (
+        variant.width is not None
+        and media_profile.width is not None
+        and variant.width >= media_profile.width
+    ):
+        variant = variant.model_copy(update={"width": None})
+
     try:
-        stream_uri = onvif_service.get_stream_uri()
-        logger.info(f"Stream URI: {stream_uri}")
-    except Exception as e:
+        stream_uri = await onvif_service.get_stream_uri(profile_token)
+    except ONVIF_ERRORS as e:
         logger.error(f"Failed to get stream URI: {e}")
         raise HTTPException(status_code=404, detail="Camera stream not found")
 
-    def generate_frames():
-        cap = cv2.VideoCapture(stream_uri)
-        if not cap.isOpened():
-            logger.error(f"Cannot open video stream for {camera_id}")
-            return  # Stop generator immediately
+    # A camera already streaming JPEG frames is proxied without decoding or
+    # re-encoding them, falling back to transcoding if the stream turns out otherwise
+    passthrough = is_mjpeg_encoding(media_profile.encoding)
+    sent_bytes = STREAM_SENT_BYTES.labels(camera_id, profile_label(profile_token))
 
+    async def resolve_stream_uri() -> str:
+        # The capture loop outlives this request, and the registry may have
+        # disconnected and reconnected the camera by the time it asks
+        service = camera_registry.get(camera_id)
+        return await service.get_stream_uri(profile_token, refresh=True)
+
+    # Frames come from the camera's shared capture loop, so every viewer of the
+    # same camera reuses a single RTSP session and decoder. A viewer that can't
+    # keep up skips to the newest frame instead of falling behind. Viewers asking
+    # for the same width, fps and quality share the resize and encode.
+    # A lost camera stream is reconnected while the viewer keeps watching a
+    # placeholder, instead of every viewer reconnecting at once
+    try:
+        subscription = frame_broker.subscribe(
+            camera_id,
+            stream_uri,
+            variant,
+            passthrough,
+            resolve_stream_uri=resolve_stream_uri,
+            profile=profile_token,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def generate_frames():
         try:
-            while True:
-                success, frame = cap.read()
-                if not success:
-                    logging.warning(
-                        f"Frame read failed for {camera_id}, stopping stream"
-                    )
-                    break
-                ret, jpeg = cv2.imencode(".jpg", frame)
-                if not ret:
+            # Waiting for frames holds no thread, only encoding does, on the broker's
+            # small encoder pool; a slow socket makes the viewer skip frames
+            async for frame in subscription:
+                # The chunk is encoded once per frame and shared by every viewer
+                chunk = await frame_broker.mjpeg_chunk(frame)
+                if chunk is None:
                     continue
-                frame_bytes = jpeg.tobytes()
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-                )
+                sent_bytes.inc(len(chunk))
+                yield chunk
         finally:
-            cap.release()
+            subscription.close()
 
     return StreamingResponse(
         generate_frames(),
-        media_type="multipart/x-mixed-replace; boundary=frame",
+        media_type=MJPEG_MEDIA_TYPE,
+        # Also unsubscribes a viewer gone before the first frame was sent
+        background=BackgroundTask(subscription.close),
+    )
+
+
+@router.get("/stream/{camera_id}/hls/index.m3u8", response_class=Response)
+async def get_hls_playlist(
+    camera_id: str,
+    onvif_service: OnvifServiceDep,
+    hls_service: HlsServiceDep,
+    logger: LoggerDep,
+) -> Response:
+    try:
+        stream_uri = await onvif_service.get_stream_uri()
+    except ONVIF_ERRORS as e:
+        logger.error(f"Failed to get stream URI: {e}")
+        raise HTTPException(status_code=404, detail="Camera stream not found")
+
+    # The camera's H.264/H.265 packets are remuxed into fMP4 as they are, without
+    # decoding, so this costs a fraction of the MJPEG stream's CPU
+    try:
+        playlist = await hls_service.get_playlist(camera_id, stream_uri)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        logger.error(f"Failed to get HLS playlist: {e}")
+        raise HTTPException(status_code=404, detail="Camera stream not found")
+
+    return Response(
+        content=playlist,
+        media_type=HLS_PLAYLIST_MEDIA_TYPE,
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@router.get("/stream/{camera_id}/hls/init_{number}.mp4", response_class=Response)
+async def get_hls_init_segment(
+    camera_id: str, number: int, hls_service: HlsServiceDep
+) -> Response:
+    try:
+        init = hls_service.get_init_segment(camera_id, number)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=init, media_type=HLS_INIT_MEDIA_TYPE)
+
+
+@router.get("/stream/{camera_id}/hls/segment_{sequence}.m4s", response_class=Response)
+async def get_hls_segment(
+    camera_id: str, sequence: int, hls_service: HlsServiceDep
+) -> Response:
+    try:
+        segment = hls_service.get_segment(camera_id, sequence)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=segment, media_type=HLS_SEGMENT_MEDIA_TYPE)
+
+
+@router.get("/stream/{camera_id}/snapshot", response_class=Response)
+async def get_snapshot(
+    camera_id: str,
+    onvif_service: OnvifServiceDep,
+    frame_broker: FrameBrokerDep,
+    logger: LoggerDep,
+) -> Response:
+    # A running capture loop already has the newest frame, usually encoded too
+    frame = frame_broker.latest_frame(camera_id)
+    jpeg: bytes | memoryview | None = None
+    if frame is not None:
+        # Encoded off the event loop when no viewer has needed this frame yet
+        chunk = await frame_broker.mjpeg_chunk(frame)
+        jpeg = chunk_jpeg(chunk) if chunk is not None else None
+
+    if jpeg is None:
+        try:
+            jpeg = await onvif_service.get_snapshot()
+        except ONVIF_ERRORS as e:
+            logger.error(f"Failed to get snapshot: {e}")
+            raise HTTPException(status_code=404, detail="Camera snapshot not found")
+
+    return Response(
+        content=jpeg,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "no-store"},
     )
 
 
-# @router.get("/stream/{camera_id}/frame")
-# async def get_stream_frame(camera_id: str):
-#     return StreamingResponse(
-#         content=b"", media_type="multipart/x-mixed-replace; boundary=frame"
-#     )
+@router.get("/stream/{camera_id}/profiles")
+async def get_stream_profiles(
+    camera_id: str,
+    onvif_service: OnvifServiceDep,
+    logger: LoggerDep,
+):
+    try:
+        profiles = await onvif_service.get_profiles()
+    except ONVIF_ERRORS as e:
+        logger.error(f"Failed to get media profiles: {e}")
+        raise HTTPException(status_code=404, detail="Camera profiles not found")
+    return {
+        "success": True,
+        "message": "Media profiles",
+        "profiles": [profile.model_dump() for profile in profiles],
+    }
+
+
+@router.get("/stream/{camera_id}/stats")
+async def get_stream_stats(camera_id: str, frame_broker: FrameBrokerDep):
+    stats = frame_broker.get_stats(camera_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Camera stream not running")
+    return {
+        "success": True,
+        "message": "Stream statistics",
+        "stats": stats.model_dump(),
+    }
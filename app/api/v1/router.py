@@ -7,5 +7,5 @@ from .endpoints import ptz, stream
 
 v1_router = APIRouter(prefix="/api/v1")
 
-v1_router.include_router(ptz.router, prefix="/ptz", tags=["ptz"])
+v1_router.include_router(ptz.router, prefix="/ptz/{camera_id}", tags=["ptz"])
 v1_router.include_router(stream.router, prefix="/stream", tags=["stream"])
@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+
+from pydantic import BaseModel, ConfigDict, NonNegativeFloat, PositiveInt
+
+from app.contracts.services.onvif_service import IOnvifService
+from app.core.config import OnvifSettings, PTZSettings
+from app.core.types import LoggerType
+
+
+class ICameraRegistry(ABC, BaseModel):
+    """
+    Interface for camera registry
+
+    This service is responsible for handing out the ONVIF service of a camera by its ID,
+    connecting cameras on first use and limiting how many stay connected at once.
+    """
+
+    cameras: dict[str, OnvifSettings]
+    ptz_settings: PTZSettings
+    max_connected: PositiveInt
+    warmup_timeout: NonNegativeFloat = 10.0
+    logger: LoggerType
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @abstractmethod
+    def camera_ids(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    def get(self, camera_id: str) -> IOnvifService:
+        pass
+
+    @abstractmethod
+    def connected(self) -> dict[str, IOnvifService]:
+        pass
+
+    @abstractmethod
+    async def warm_up(self) -> dict[str, str | None]:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,86 @@
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterator
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, ConfigDict
+
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.core.types import LoggerType
+from app.schemas.stream import FrameSourceStats, StreamVariant, SubscriberStats
+
+if TYPE_CHECKING:
+    from app.services.mjpeg import Frame
+
+
+class IFrameSubscription(ABC):
+    """
+    Interface for a single viewer's subscription to a camera frame source
+
+    Iterating over the subscription, on a thread or asynchronously, yields decoded
+    frames until the source ends.
+    """
+
+    @abstractmethod
+    def __iter__(self) -> Iterator["Frame"]:
+        pass
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator["Frame"]:
+        pass
+
+    @abstractmethod
+    def stats(self) -> SubscriberStats:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class IFrameBrokerService(ABC, BaseModel):
+    """
+    Interface for frame broker service
+
+    This service is responsible for running one capture/decode loop per camera and
+    fanning each decoded frame out to all subscribers of that camera.
+    """
+
+    logger: LoggerType
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @abstractmethod
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def start_always_warm(self, camera_registry: ICameraRegistry) -> None:
+        pass
+
+    @abstractmethod
+    def subscribe(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        variant: StreamVariant | None = None,
+        passthrough: bool = False,
+        resolve_stream_uri: Callable[[], Coroutine[Any, Any, str]] | None = None,
+        profile: str | None = None,
+    ) -> IFrameSubscription:
+        pass
+
+    @abstractmethod
+    async def mjpeg_chunk(self, frame: "Frame") -> bytes | None:
+        pass
+
+    @abstractmethod
+    def latest_frame(self, camera_id: str) -> "Frame | None":
+        pass
+
+    @abstractmethod
+    def get_stats(self, camera_id: str) -> FrameSourceStats | None:
+        pass
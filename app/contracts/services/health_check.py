@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
 from typing import Protocol, runtime_checkable
 
-from pydantic import BaseModel, ConfigDict, NonNegativeFloat
+from pydantic import BaseModel, ConfigDict, NonNegativeFloat, PositiveFloat
 
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.contracts.services.frame_broker import IFrameBrokerService
 from app.core.config import Settings
 from app.core.types import LoggerType
 from app.schemas.health import ComponentHealth, HealthResponse
@@ -18,15 +20,27 @@ class IHealthCheckService(ABC, BaseModel):
     """
     Interface for health check service
 
-    This service is responsible for checking the health of the application.
+    This service is responsible for checking the health of the application. Components
+    are probed in the background and health requests are answered from the results.
     """
 
     logger: LoggerType
-    # Use ServiceWithHealthCheck protocol to ensure that the service has a check_health method
-    # cache_service: ServiceWithHealthCheck
+    camera_registry: ICameraRegistry
+    frame_broker: IFrameBrokerService
+    interval: PositiveFloat = 15.0
+    timeout: PositiveFloat = 5.0
+    max_frame_age: PositiveFloat = 10.0
 
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
+    @abstractmethod
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        pass
+
     @abstractmethod
     async def check_health(
         self, settings: Settings, uptime: NonNegativeFloat
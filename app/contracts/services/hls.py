@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+
+from pydantic import BaseModel, ConfigDict, PositiveFloat, PositiveInt
+
+from app.core.types import LoggerType
+
+
+class IHlsService(ABC, BaseModel):
+    """
+    Interface for HLS service
+
+    This service is responsible for remuxing camera streams into fragmented MP4 HLS
+    segments, without decoding them, and keeping a short window of segments per camera.
+    """
+
+    segment_duration: PositiveFloat = 2.0
+    window_size: PositiveInt = 6
+    idle_timeout: PositiveFloat = 30.0
+    reconnect_delay: PositiveFloat = 0.5
+    max_reconnect_delay: PositiveFloat = 30.0
+    logger: LoggerType
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @abstractmethod
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get_playlist(self, camera_id: str, stream_uri: str) -> str:
+        pass
+
+    @abstractmethod
+    def get_init_segment(self, camera_id: str, number: int) -> bytes:
+        pass
+
+    @abstractmethod
+    def get_segment(self, camera_id: str, sequence: int) -> bytes:
+        pass
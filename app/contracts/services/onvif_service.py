@@ -1,13 +1,18 @@
 from abc import ABC, abstractmethod
+
 from pydantic import BaseModel, ConfigDict
 
 from app.core.config import OnvifSettings, PTZSettings
 from app.core.types import (
     LoggerType,
     PanVelocityType,
+    PTZDurationType,
     TiltVelocityType,
     ZoomVelocityType,
 )
+from app.schemas.health import ComponentHealth
+from app.schemas.ptz import PTZCommandStats, PTZMove
+from app.schemas.stream import MediaProfile
 
 
 class IOnvifService(ABC, BaseModel):
@@ -17,6 +22,7 @@ class IOnvifService(ABC, BaseModel):
     This service is responsible for interacting with the ONVIF camera.
     """
 
+    camera_id: str
     onvif_settings: OnvifSettings
     ptz_settings: PTZSettings
     logger: LoggerType
@@ -24,61 +30,128 @@ class IOnvifService(ABC, BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     @abstractmethod
-    def get_snapshot_uri(self) -> str:
+    async def connect(self) -> None:
+        pass
+
+    @abstractmethod
+    async def check_health(self) -> ComponentHealth:
+        pass
+
+    @abstractmethod
+    async def get_snapshot_uri(self) -> str:
+        pass
+
+    @abstractmethod
+    async def get_profiles(self) -> list[MediaProfile]:
+        pass
+
+    @abstractmethod
+    async def select_profile(
+        self, token: str | None = None, width: int | None = None
+    ) -> MediaProfile:
+        pass
+
+    @abstractmethod
+    async def get_stream_uri(
+        self, profile_token: str | None = None, refresh: bool = False
+    ) -> str:
+        pass
+
+    @abstractmethod
+    async def get_snapshot(self) -> bytes:
+        pass
+
+    @abstractmethod
+    async def get_video_encoding(self) -> str | None:
+        pass
+
+    @abstractmethod
+    async def move(
+        self,
+        pan_velocity: PanVelocityType = 0.0,
+        tilt_velocity: TiltVelocityType = 0.0,
+        zoom_velocity: ZoomVelocityType = 0.0,
+        duration: PTZDurationType = 1.0,
+        wait: bool = False,
+    ):
+        pass
+
+    @abstractmethod
+    async def run_sequence(self, steps: list[PTZMove]) -> None:
+        pass
+
+    @abstractmethod
+    async def move_pan(self, pan_velocity: PanVelocityType, wait: bool = False):
+        pass
+
+    @abstractmethod
+    async def move_tilt(self, tilt_velocity: TiltVelocityType, wait: bool = False):
         pass
 
     @abstractmethod
-    def get_stream_uri(self) -> str:
+    async def move_zoom(self, zoom_velocity: ZoomVelocityType, wait: bool = False):
         pass
 
     @abstractmethod
-    def move_pan(self, pan_velocity: PanVelocityType):
+    async def move_left(
+        self, velocity: PanVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_tilt(self, tilt_velocity: TiltVelocityType):
+    async def move_right(
+        self, velocity: PanVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_zoom(self, zoom_velocity: ZoomVelocityType):
+    async def move_up(
+        self, velocity: TiltVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_left(self, velocity: PanVelocityType | None = None):
+    async def move_down(
+        self, velocity: TiltVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_right(self, velocity: PanVelocityType | None = None):
+    async def zoom_in(
+        self, velocity: ZoomVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_up(self, velocity: TiltVelocityType | None = None):
+    async def zoom_out(
+        self, velocity: ZoomVelocityType | None = None, wait: bool = False
+    ):
         pass
 
     @abstractmethod
-    def move_down(self, velocity: TiltVelocityType | None = None):
+    async def stop(self):
         pass
 
     @abstractmethod
-    def zoom_in(self, velocity: ZoomVelocityType | None = None):
+    def get_ptz_stats(self) -> PTZCommandStats:
         pass
 
     @abstractmethod
-    def zoom_out(self, velocity: ZoomVelocityType | None = None):
+    async def set_preset(self, preset_name: str) -> None:
         pass
 
     @abstractmethod
-    def set_preset(self, preset_name: str) -> None:
+    async def delete_preset(self, preset_name: str) -> None:
         pass
 
     @abstractmethod
-    def delete_preset(self, preset_name: str) -> None:
+    async def list_presets(self) -> list[str]:
         pass
 
     @abstractmethod
-    def list_presets(self) -> list[str]:
+    async def goto_preset(self, preset_name: str) -> None:
         pass
 
     @abstractmethod
-    def goto_preset(self, preset_name: str) -> None:
+    async def close(self) -> None:
         pass
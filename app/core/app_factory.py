@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.api.healthcheck import health_router
+from app.api.metrics import metrics_router
 from app.api.v1.router import v1_router
 from app.core.config import Settings, get_settings
 from app.core.lifespan import lifespan_factory
@@ -36,6 +37,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
     # Include API routes
     app.include_router(v1_router)
     app.include_router(health_router)
+    app.include_router(metrics_router)
 
     # Add security middleware
     if settings.allowed_hosts:
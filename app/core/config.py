@@ -1,16 +1,25 @@
 from functools import lru_cache
 from typing import Annotated
 
-from pydantic import Field, SecretStr
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    SecretStr,
+    ValidationError,
+    model_validator,
+)
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from app.core.enums import Environment
+from app.core.enums import DecoderMode, Environment
 from app.core.types import SemanticVersionType
 
 DEFAULT_APP_NAME = "onvif-ptz-stream-api"
 
 
-class OnvifSettings(BaseSettings):
+class OnvifSettings(BaseModel):
+    """Connection settings of one ONVIF camera, e.g. an entry of CAMERAS"""
+
     onvif_camera_ip_address: str = Field(
         ...,
         description="The IP address of the ONVIF camera",
@@ -30,12 +39,65 @@ class OnvifSettings(BaseSettings):
         description="The password for the ONVIF camera",
         alias="ONVIF_CAMERA_PASSWORD",
     )
+    onvif_camera_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        description="Timeout in seconds for SOAP requests to the ONVIF camera",
+        alias="ONVIF_CAMERA_TIMEOUT",
+    )
+    onvif_camera_pool_size: int = Field(
+        default=4,
+        ge=1,
+        description="Maximum number of concurrent keep-alive connections to the ONVIF camera",
+        alias="ONVIF_CAMERA_POOL_SIZE",
+    )
+    onvif_camera_snapshot_cache_ttl: float = Field(
+        default=1.0,
+        ge=0,
+        description="How long in seconds a snapshot fetched from the camera is served from memory",
+        alias="ONVIF_CAMERA_SNAPSHOT_CACHE_TTL",
+    )
+
+    model_config = ConfigDict(
+        frozen=True,
+        arbitrary_types_allowed=True,
+        populate_by_name=True,
+    )
+
+
+class DefaultOnvifSettings(BaseSettings, OnvifSettings):
+    """
+    The camera configured through the ONVIF_CAMERA_* environment variables
+
+    Only this camera reads the environment; cameras in CAMERAS are plain
+    `OnvifSettings`, so they never pick up its address or credentials.
+    """
 
     model_config = SettingsConfigDict(
-        frozen=True, arbitrary_types_allowed=True, env_prefix="ONVIF_CAMERA_"
+        frozen=True,
+        arbitrary_types_allowed=True,
+        env_prefix="ONVIF_CAMERA_",
+        populate_by_name=True,
     )
 
 
+def load_default_camera_settings() -> OnvifSettings | None:
+    """Load the camera configured through the ONVIF_CAMERA_* variables, if there is one
+
+    Without ONVIF_CAMERA_IP_ADDRESS there is no such camera; any other validation
+    error is a misconfigured camera and is raised.
+    """
+    try:
+        return DefaultOnvifSettings()  # type: ignore[call-arg]
+    except ValidationError as e:
+        if any(
+            error["type"] == "missing" and error["loc"] == ("ONVIF_CAMERA_IP_ADDRESS",)
+            for error in e.errors()
+        ):
+            return None
+        raise
+
+
 PTZVelocity = Annotated[
     float,
     Field(
@@ -58,6 +120,18 @@ class PTZSettings(BaseSettings):
         description="The velocity of the PTZ zoom",
         alias="PTZ_ZOOM_VELOCITY",
     )
+    preset_cache_ttl: float = Field(
+        default=60.0,
+        ge=0.0,
+        description="How long in seconds a camera's preset list is served from memory",
+        alias="PTZ_PRESET_CACHE_TTL",
+    )
+    ws_heartbeat_timeout: float = Field(
+        default=5.0,
+        gt=0.0,
+        description="Seconds a PTZ WebSocket client may stay silent before the camera is stopped",
+        alias="PTZ_WS_HEARTBEAT_TIMEOUT",
+    )
 
     model_config = SettingsConfigDict(
         frozen=True, arbitrary_types_allowed=True, env_prefix="PTZ_"
@@ -92,12 +166,210 @@ class Settings(BaseSettings):
         ),
     ]
 
+    # Cameras
+    cameras: Annotated[
+        dict[str, OnvifSettings],
+        Field(
+            default_factory=dict,
+            alias="CAMERAS",
+            description="Additional cameras keyed by camera ID, as a JSON object",
+        ),
+    ]
+    default_camera_id: Annotated[
+        str,
+        Field(
+            default="default",
+            alias="DEFAULT_CAMERA_ID",
+            description="Camera ID of the camera configured through ONVIF_CAMERA_*",
+        ),
+    ]
+    max_connected_cameras: Annotated[
+        int,
+        Field(
+            default=16,
+            ge=1,
+            alias="MAX_CONNECTED_CAMERAS",
+            description="How many camera sessions are kept connected at once",
+        ),
+    ]
+
+    camera_warmup_timeout: Annotated[
+        float,
+        Field(
+            default=10.0,
+            ge=0.0,
+            alias="CAMERA_WARMUP_TIMEOUT",
+            description="How long startup waits for cameras to connect, 0 disables warm-up",
+        ),
+    ]
+
+    # Streaming
+    decoder_mode: Annotated[
+        DecoderMode,
+        Field(
+            default=DecoderMode.THREAD,
+            alias="DECODER_MODE",
+            description="Decode camera streams on threads of the API process or in worker processes",
+        ),
+    ]
+    decoder_ring_slots: Annotated[
+        int,
+        Field(
+            default=4,
+            ge=2,
+            alias="DECODER_RING_SLOTS",
+            description="Frames each decoder process keeps in its shared memory ring",
+        ),
+    ]
+    decoder_slot_size: Annotated[
+        int,
+        Field(
+            default=4 * 1024 * 1024,
+            ge=64 * 1024,
+            alias="DECODER_SLOT_SIZE",
+            description="Largest encoded frame in bytes a shared memory ring slot can hold",
+        ),
+    ]
+    stream_reconnect_delay: Annotated[
+        float,
+        Field(
+            default=0.5,
+            gt=0.0,
+            alias="STREAM_RECONNECT_DELAY",
+            description="Seconds before reconnecting a lost camera stream, doubled after every failed attempt",
+        ),
+    ]
+    stream_reconnect_max_delay: Annotated[
+        float,
+        Field(
+            default=30.0,
+            gt=0.0,
+            alias="STREAM_RECONNECT_MAX_DELAY",
+            description="Longest delay in seconds between attempts to reconnect a camera stream",
+        ),
+    ]
+    stream_idle_timeout: Annotated[
+        float,
+        Field(
+            default=10.0,
+            ge=0.0,
+            alias="STREAM_IDLE_TIMEOUT",
+            description="Seconds a camera's capture loop keeps running after its last viewer left",
+        ),
+    ]
+    stream_always_warm: Annotated[
+        list[str],
+        Field(
+            default_factory=list,
+            alias="STREAM_ALWAYS_WARM",
+            description="Camera IDs whose capture loop runs from startup, with or without viewers",
+        ),
+    ]
+    stream_encode_workers: Annotated[
+        int,
+        Field(
+            default=4,
+            ge=1,
+            alias="STREAM_ENCODE_WORKERS",
+            description="Threads JPEG encoding frames for MJPEG viewers, shared by all cameras",
+        ),
+    ]
+    stream_max_variants: Annotated[
+        int,
+        Field(
+            default=8,
+            ge=0,
+            alias="STREAM_MAX_VARIANTS",
+            description="Scaled down MJPEG streams a camera can run at once",
+        ),
+    ]
+    hls_segment_duration: Annotated[
+        float,
+        Field(
+            default=2.0,
+            gt=0.0,
+            alias="HLS_SEGMENT_DURATION",
+            description="Target duration in seconds of an HLS segment, cut on the next keyframe",
+        ),
+    ]
+    hls_window_size: Annotated[
+        int,
+        Field(
+            default=6,
+            ge=1,
+            alias="HLS_WINDOW_SIZE",
+            description="How many of the newest HLS segments a playlist lists",
+        ),
+    ]
+    hls_idle_timeout: Annotated[
+        float,
+        Field(
+            default=30.0,
+            gt=0.0,
+            alias="HLS_IDLE_TIMEOUT",
+            description="Seconds without HLS requests before a camera's remux is stopped",
+        ),
+    ]
+
+    # Health checks
+    health_check_interval: Annotated[
+        float,
+        Field(
+            default=15.0,
+            gt=0.0,
+            alias="HEALTH_CHECK_INTERVAL",
+            description="Seconds between background health probes of the cameras",
+        ),
+    ]
+    health_check_timeout: Annotated[
+        float,
+        Field(
+            default=5.0,
+            gt=0.0,
+            alias="HEALTH_CHECK_TIMEOUT",
+            description="Seconds a camera health probe may take before it counts as down",
+        ),
+    ]
+    health_max_frame_age: Annotated[
+        float,
+        Field(
+            default=10.0,
+            gt=0.0,
+            alias="HEALTH_MAX_FRAME_AGE",
+            description="Seconds without a new frame before a running stream counts as down",
+        ),
+    ]
+
     # External services - The settings for external services should be grouped together in a separate class
-    onvif: OnvifSettings = Field(default_factory=lambda: OnvifSettings())  # type: ignore[call-arg]
+    onvif: OnvifSettings | None = Field(default_factory=load_default_camera_settings)
     ptz: PTZSettings = Field(default_factory=lambda: PTZSettings())  # type: ignore[call-arg]
 
     model_config = SettingsConfigDict(frozen=True)
 
+    @model_validator(mode="after")
+    def validate_cameras(self) -> "Settings":
+        if self.onvif is None and not self.cameras:
+            raise ValueError(
+                "No camera configured. Set ONVIF_CAMERA_* or CAMERAS environment variables."
+            )
+        if self.onvif is not None and self.default_camera_id in self.cameras:
+            raise ValueError(
+                f"Camera ID {self.default_camera_id} is used by both ONVIF_CAMERA_* and CAMERAS"
+            )
+        unknown = set(self.stream_always_warm) - self.all_cameras.keys()
+        if unknown:
+            raise ValueError(
+                f"STREAM_ALWAYS_WARM lists unknown cameras: {', '.join(sorted(unknown))}"
+            )
+        return self
+
+    @property
+    def all_cameras(self) -> dict[str, OnvifSettings]:
+        """All configured cameras keyed by camera ID"""
+        if self.onvif is None:
+            return dict(self.cameras)
+        return {self.default_camera_id: self.onvif, **self.cameras}
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -11,3 +11,8 @@ class Environment(str, Enum):
     STAGING = "staging"
     DEVELOPMENT = "development"
     TEST = "test"
+
+
+class DecoderMode(str, Enum):
+    THREAD = "thread"
+    PROCESS = "process"
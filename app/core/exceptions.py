@@ -0,0 +1,2 @@
+class ServiceClosedError(RuntimeError):
+    """A service was used after it was closed, e.g. a camera the registry evicted."""
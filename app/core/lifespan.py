@@ -1,13 +1,15 @@
 import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
 import structlog
+from fastapi import FastAPI
 
 from app.core.config import Settings
-from app.services.onvif_service import OnvifService
-from app.services.shared_services import SharedServices
+from app.services.camera_registry import CameraRegistry
+from app.services.frame_broker import FrameBrokerService
 from app.services.health_check import HealthCheckService
+from app.services.hls import HlsService
+from app.services.shared_services import SharedServices
 
 
 def lifespan_factory(settings: Settings):
@@ -17,18 +19,49 @@ def lifespan_factory(settings: Settings):
         app.state.startup_time = time.time()
         app.state.logger = structlog.get_logger()
 
+        camera_registry = CameraRegistry(
+            cameras=settings.all_cameras,
+            ptz_settings=settings.ptz,
+            max_connected=settings.max_connected_cameras,
+            warmup_timeout=settings.camera_warmup_timeout,
+            logger=app.state.logger,
+        )
+        frame_broker = FrameBrokerService(
+            decoder_mode=settings.decoder_mode,
+            decoder_ring_slots=settings.decoder_ring_slots,
+            decoder_slot_size=settings.decoder_slot_size,
+            reconnect_delay=settings.stream_reconnect_delay,
+            max_reconnect_delay=settings.stream_reconnect_max_delay,
+            idle_timeout=settings.stream_idle_timeout,
+            always_warm=frozenset(settings.stream_always_warm),
+            encode_workers=settings.stream_encode_workers,
+            max_variants=settings.stream_max_variants,
+            logger=app.state.logger,
+        )
         services = SharedServices(
-            health_check_service=HealthCheckService(logger=app.state.logger),
-            onvif_service=OnvifService(
-                onvif_settings=settings.onvif,
-                ptz_settings=settings.ptz,
+            health_check_service=HealthCheckService(
+                camera_registry=camera_registry,
+                frame_broker=frame_broker,
+                interval=settings.health_check_interval,
+                timeout=settings.health_check_timeout,
+                max_frame_age=settings.health_max_frame_age,
+                logger=app.state.logger,
+            ),
+            camera_registry=camera_registry,
+            frame_broker=frame_broker,
+            hls_service=HlsService(
+                segment_duration=settings.hls_segment_duration,
+                window_size=settings.hls_window_size,
+                idle_timeout=settings.hls_idle_timeout,
+                reconnect_delay=settings.stream_reconnect_delay,
+                max_reconnect_delay=settings.stream_reconnect_max_delay,
                 logger=app.state.logger,
             ),
         )
         app.state.shared_services = services
 
         # Log the settings, so that its easy to debug
-        app.state.logger.info(f"{repr(settings)}")
+        app.state.logger.info(f"{settings!r}")
 
         await services.initialize()
 
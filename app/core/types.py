@@ -53,3 +53,7 @@ ZoomVelocityType: TypeAlias = Annotated[
     float,
     Field(ge=-1.0, le=1.0, description="Zoom velocity in the range of -1.0 to 1.0"),
 ]
+PTZDurationType = Annotated[
+    float,
+    Field(gt=0.0, le=60.0, description="Duration of a PTZ move in seconds"),
+]
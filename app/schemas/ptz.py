@@ -0,0 +1,53 @@
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field, NonNegativeInt
+
+from app.core.types import (
+    PanVelocityType,
+    PTZDurationType,
+    TiltVelocityType,
+    ZoomVelocityType,
+)
+
+
+class PTZCommandStats(BaseModel):
+    submitted: NonNegativeInt
+    sent: NonNegativeInt
+    coalesced: NonNegativeInt
+    dropped: NonNegativeInt
+    stops: NonNegativeInt
+
+
+class PTZMove(BaseModel):
+    pan_velocity: PanVelocityType = 0.0
+    tilt_velocity: TiltVelocityType = 0.0
+    zoom_velocity: ZoomVelocityType = 0.0
+    duration: PTZDurationType = 1.0
+
+
+class PTZSequence(BaseModel):
+    steps: list[PTZMove] = Field(min_length=1, max_length=100)
+
+
+class PTZMoveMessage(BaseModel):
+    type: Literal["move"]
+    id: int | str | None = None
+    pan_velocity: PanVelocityType = 0.0
+    tilt_velocity: TiltVelocityType = 0.0
+    zoom_velocity: ZoomVelocityType = 0.0
+    duration: PTZDurationType | None = None
+
+
+class PTZStopMessage(BaseModel):
+    type: Literal["stop"]
+    id: int | str | None = None
+
+
+class PTZPingMessage(BaseModel):
+    type: Literal["ping"]
+    id: int | str | None = None
+
+
+PTZControlMessage = Annotated[
+    PTZMoveMessage | PTZStopMessage | PTZPingMessage, Field(discriminator="type")
+]
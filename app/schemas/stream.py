@@ -0,0 +1,130 @@
+from bisect import bisect_left
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    NonNegativeFloat,
+    NonNegativeInt,
+    field_validator,
+)
+
+# Values stream variants are snapped to, so that any width, fps and quality a viewer
+# asks for maps onto a small set of variants that can be shared
+VARIANT_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920, 2560, 3840, 7680)
+VARIANT_FPS = (1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 60.0)
+VARIANT_QUALITIES = (30, 50, 70, 85, 95)
+
+
+class SubscriberStats(BaseModel):
+    id: NonNegativeInt
+    delivered: NonNegativeInt
+    dropped: NonNegativeInt
+    fps: NonNegativeFloat
+    lag_ms: NonNegativeFloat
+
+
+class FrameSourceStats(BaseModel):
+    camera_id: str
+    profile: str | None = None
+    variant: str | None = None
+    passthrough: bool = False
+    reconnecting: bool = False
+    outages: NonNegativeInt = 0
+    outage_seconds: NonNegativeFloat = 0.0
+    reconnects: NonNegativeInt = 0
+    idle_seconds: NonNegativeFloat = 0.0
+    captured: NonNegativeInt
+    fps: NonNegativeFloat
+    subscribers: list[SubscriberStats]
+    variants: list["FrameSourceStats"] = []
+    # Capture loops of the camera's other media profiles, e.g. a substream
+    profiles: list["FrameSourceStats"] = []
+
+
+class MediaProfile(BaseModel):
+    """A camera media profile, e.g. its main stream or a substream"""
+
+    token: str
+    name: str | None = None
+    encoding: str | None = None
+    width: int | None = None
+    height: int | None = None
+    fps: float | None = None
+    default: bool = Field(
+        default=False,
+        description="Whether PTZ and snapshots use it, and it is streamed by default",
+    )
+
+
+class StreamVariant(BaseModel):
+    """
+    Output size, frame rate and JPEG quality of an MJPEG stream
+
+    Width and fps are rounded up to the next of VARIANT_WIDTHS and VARIANT_FPS, so a
+    viewer gets at least what it asked for, and quality to the nearest of
+    VARIANT_QUALITIES.
+    """
+
+    width: int | None = Field(
+        default=None, ge=16, le=7680, description="Frame width in pixels"
+    )
+    fps: float | None = Field(
+        default=None, gt=0.0, le=60.0, description="Maximum frames per second"
+    )
+    quality: int | None = Field(
+        default=None, ge=1, le=100, description="JPEG quality from 1 to 100"
+    )
+
+    model_config = ConfigDict(frozen=True)
+
+    @field_validator("width")
+    @classmethod
+    def snap_width(cls, width: int | None) -> int | None:
+        if width is None:
+            return None
+        return VARIANT_WIDTHS[
+            min(bisect_left(VARIANT_WIDTHS, width), len(VARIANT_WIDTHS) - 1)
+        ]
+
+    @field_validator("fps")
+    @classmethod
+    def snap_fps(cls, fps: float | None) -> float | None:
+        if fps is None:
+            return None
+        return VARIANT_FPS[min(bisect_left(VARIANT_FPS, fps), len(VARIANT_FPS) - 1)]
+
+    @field_validator("quality")
+    @classmethod
+    def snap_quality(cls, quality: int | None) -> int | None:
+        if quality is None:
+            return None
+        return min(VARIANT_QUALITIES, key=lambda step: abs(step - quality))
+
+    @property
+    def is_source(self) -> bool:
+        """Whether the variant is the camera stream as captured."""
+        return self.width is None and self.fps is None and self.quality is None
+
+    @property
+    def name(self) -> str:
+        parts = []
+        if self.width is not None:
+            parts.append(f"{self.width}w")
+        if self.fps is not None:
+            parts.append(f"{self.fps:g}fps")
+        if self.quality is not None:
+            parts.append(f"q{self.quality}")
+        return "-".join(parts) or "source"
+
+
+class StreamRequest(StreamVariant):
+    """Query parameters of an MJPEG stream: its variant and the media profile it is of"""
+
+    profile: str | None = Field(
+        default=None, description="Media profile token, e.g. of a substream"
+    )
+
+    @property
+    def variant(self) -> StreamVariant:
+        return StreamVariant(width=self.width, fps=self.fps, quality=self.quality)
@@ -0,0 +1,118 @@
+import asyncio
+from collections import OrderedDict
+from functools import partial
+
+from pydantic import PrivateAttr
+
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.contracts.services.onvif_service import IOnvifService
+from app.services.onvif_service import OnvifService
+
+
+class CameraRegistry(ICameraRegistry):
+    """
+    Registry of configured cameras keyed by camera ID.
+
+    ONVIF services are created lazily on first use. Once more than `max_connected`
+    cameras are connected, the least recently used one is disconnected; it is
+    reconnected transparently the next time it is requested. A disconnected service
+    raises ServiceClosedError, so holders that outlive a request, e.g. PTZ WebSockets
+    and capture loops, look the service up again on every use instead of keeping it.
+    """
+
+    _connected: OrderedDict[str, IOnvifService] = PrivateAttr(
+        default_factory=OrderedDict
+    )
+    _closing: set[asyncio.Task] = PrivateAttr(default_factory=set)
+    _warming: set[asyncio.Task] = PrivateAttr(default_factory=set)
+
+    def camera_ids(self) -> list[str]:
+        return list(self.cameras)
+
+    def get(self, camera_id: str) -> IOnvifService:
+        service = self._connected.get(camera_id)
+        if service is not None:
+            self._connected.move_to_end(camera_id)
+            return service
+
+        try:
+            onvif_settings = self.cameras[camera_id]
+        except KeyError:
+            raise ValueError(f"Camera {camera_id} not found") from None
+
+        service = OnvifService(
+            camera_id=camera_id,
+            onvif_settings=onvif_settings,
+            ptz_settings=self.ptz_settings,
+            logger=self.logger,
+        )
+        self._connected[camera_id] = service
+        self._evict()
+        return service
+
+    def connected(self) -> dict[str, IOnvifService]:
+        """The services of the connected cameras, without counting it as a use."""
+        return dict(self._connected)
+
+    def _evict(self) -> None:
+        while len(self._connected) > self.max_connected:
+            camera_id, service = self._connected.popitem(last=False)
+            self.logger.info(f"Disconnecting least recently used camera {camera_id}")
+            task = asyncio.create_task(service.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    async def warm_up(self) -> dict[str, str | None]:
+        """
+        Connect the configured cameras concurrently, waiting at most `warmup_timeout`
+
+        Returns the error of every camera that couldn't be connected in time (None for
+        the ones that did). Cameras still connecting at the deadline keep doing so in
+        the background, so a slow camera never blocks startup.
+        """
+        camera_ids = self.camera_ids()[: self.max_connected]
+        if not camera_ids or self.warmup_timeout == 0:
+            return {}
+
+        tasks = {
+            camera_id: asyncio.create_task(self.get(camera_id).connect())
+            for camera_id in camera_ids
+        }
+        _, pending = await asyncio.wait(tasks.values(), timeout=self.warmup_timeout)
+
+        results: dict[str, str | None] = {}
+        for camera_id, task in tasks.items():
+            if task in pending:
+                results[camera_id] = f"Not connected after {self.warmup_timeout}s"
+                self._warming.add(task)
+                task.add_done_callback(self._warming.discard)
+                task.add_done_callback(partial(self._log_late_warm_up, camera_id))
+            elif (exception := task.exception()) is not None:
+                results[camera_id] = str(exception)
+            else:
+                results[camera_id] = None
+
+        failed = {camera_id: e for camera_id, e in results.items() if e is not None}
+        for camera_id, error in failed.items():
+            self.logger.warning(f"Camera {camera_id} could not be warmed up: {error}")
+        self.logger.info(
+            f"Warmed up {len(results) - len(failed)} of {len(results)} cameras"
+        )
+        return results
+
+    def _log_late_warm_up(self, camera_id: str, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        if (exception := task.exception()) is not None:
+            self.logger.warning(
+                f"Camera {camera_id} could not be warmed up: {exception}"
+            )
+        else:
+            self.logger.info(f"Camera {camera_id} connected after the warm-up deadline")
+
+    async def close(self) -> None:
+        for task in self._warming:
+            task.cancel()
+        services = list(self._connected.values())
+        self._connected.clear()
+        await asyncio.gather(*(service.close() for service in services), *self._closing)
@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+# FourCCs FFmpeg reports for Motion JPEG streams
+MJPEG_FOURCCS = frozenset({"MJPG", "mjpg", "MJPA", "AVRn", "jpeg"})
+_JPEG_SOI = (0xFF, 0xD8)
+# Seconds between the frames decoded while nobody watches a capture, which keeps its
+# latest frame as fresh as a cached snapshot for the snapshot and health endpoints
+UNWATCHED_FRAME_INTERVAL = 1.0
+
+
+def is_mjpeg_encoding(encoding: str | None) -> bool:
+    """Whether an ONVIF video encoder configuration's encoding is Motion JPEG."""
+    return encoding == "JPEG"
+
+
+def _fourcc(cap: cv2.VideoCapture) -> str:
+    return (
+        int(cap.get(cv2.CAP_PROP_FOURCC))
+        .to_bytes(4, "little")
+        .decode("ascii", errors="replace")
+    )
+
+
+def open_capture(
+    stream_uri: str, passthrough: bool = False
+) -> tuple[cv2.VideoCapture, bool]:
+    """
+    Open a camera stream, without decoding it if asked to and the stream is MJPEG
+
+    In passthrough mode `read()` returns every frame's JPEG bytes as the camera sent
+    them instead of a decoded image. Streams in any other codec are opened for decoding
+    instead; the second value tells which mode the capture is in.
+    """
+    if passthrough:
+        cap = cv2.VideoCapture(stream_uri, cv2.CAP_FFMPEG)
+        if (
+            cap.isOpened()
+            and cap.set(cv2.CAP_PROP_FORMAT, -1)
+            and _fourcc(cap) in MJPEG_FOURCCS
+        ):
+            return cap, True
+        cap.release()
+    return cv2.VideoCapture(stream_uri), False
+
+
+def wants_frame(watched: bool, timestamp: float, last_decoded: float | None) -> bool:
+    """
+    Whether to `retrieve()` the frame `grab()`bed at `timestamp`
+
+    Every frame is grabbed as soon as it arrives, so FFmpeg's buffers never hold a
+    backlog and the stream stays at live, but only frames someone is waiting for are
+    decoded.
+    """
+    return (
+        watched
+        or last_decoded is None
+        or timestamp - last_decoded >= UNWATCHED_FRAME_INTERVAL
+    )
+
+
+def is_jpeg(data: np.ndarray) -> bool:
+    """Whether a packet read in passthrough mode holds a JPEG image."""
+    return data.size > len(_JPEG_SOI) and tuple(data.ravel()[:2]) == _JPEG_SOI
@@ -0,0 +1,101 @@
+import struct
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Event
+
+import cv2
+
+from app.services.capture import is_jpeg, open_capture, wants_frame
+from app.services.frame_ring import SharedFrameRing
+from app.services.mjpeg import MJPEG_PART_HEADER, MJPEG_PART_TRAILER
+
+# Kind of a message to the API process, its first byte
+FRAME_MESSAGE = b"F"
+WARNING_MESSAGE = b"W"
+ERROR_MESSAGE = b"E"
+# Rest of a frame message: the ring slot the frame was written to, the seconds spent
+# encoding it, 0 if it was passed through, and whether the stream is passed through.
+# Warning and error messages carry UTF-8 text, logged by the API process
+SLOT_MESSAGE = struct.Struct("<Id?")
+
+
+def _log(notify: Connection, kind: bytes, message: str) -> None:
+    notify.send_bytes(kind + message.encode())
+
+
+def run_decoder(
+    stream_uri: str,
+    ring_name: str,
+    slots: int,
+    slot_size: int,
+    notify: Connection,
+    stop: Event,
+    watched: Event,
+    passthrough: bool = False,
+) -> None:
+    """
+    Entry point of a decoder process
+
+    Grabs every frame of the camera stream as it arrives. While `watched` is set, each
+    one is encoded as a ready-to-send MJPEG part and written into the shared ring,
+    announcing each slot over `notify`; otherwise only one a second is. With
+    `passthrough`, the JPEG frames of an MJPEG stream are written as they are. Problems
+    are sent over `notify` too, for the API process to log. Returns, and so exits with
+    status 0, when the stream ends or `stop` is set.
+    """
+    ring = SharedFrameRing.attach(ring_name, slots, slot_size)
+    cap, passthrough = open_capture(stream_uri, passthrough)
+    try:
+        if not cap.isOpened():
+            _log(notify, ERROR_MESSAGE, "Cannot open video stream")
+            return
+
+        index = 0
+        last_decoded: float | None = None
+        while not stop.is_set():
+            if not cap.grab():
+                return
+            timestamp = time.monotonic()
+            if not wants_frame(watched.is_set(), timestamp, last_decoded):
+                continue
+            success, data = cap.retrieve()
+            if not success:
+                return
+            last_decoded = timestamp
+            if passthrough and not is_jpeg(data):
+                _log(
+                    notify,
+                    WARNING_MESSAGE,
+                    "Stream sent a frame that isn't JPEG, transcoding instead",
+                )
+                cap.release()
+                cap, passthrough = open_capture(stream_uri)
+                continue
+            encode_time = 0.0
+            if passthrough:
+                jpeg = data
+            else:
+                start = time.perf_counter()
+                ret, jpeg = cv2.imencode(".jpg", data)
+                if not ret:
+                    continue
+                encode_time = time.perf_counter() - start
+
+            slot = index % slots
+            if not ring.write(
+                slot, (MJPEG_PART_HEADER, jpeg, MJPEG_PART_TRAILER), timestamp
+            ):
+                _log(
+                    notify,
+                    WARNING_MESSAGE,
+                    f"Frame of {len(jpeg)} bytes doesn't fit a {slot_size} byte slot",
+                )
+                continue
+            notify.send_bytes(
+                FRAME_MESSAGE + SLOT_MESSAGE.pack(slot, encode_time, passthrough)
+            )
+            index += 1
+    finally:
+        cap.release()
+        ring.close()
+        notify.close()
@@ -0,0 +1,1147 @@
+import asyncio
+import itertools
+import multiprocessing
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing.connection import Connection
+from typing import Any
+
+import cv2
+from pydantic import PrivateAttr
+
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.contracts.services.frame_broker import IFrameBrokerService, IFrameSubscription
+from app.core.enums import DecoderMode
+from app.core.types import LoggerType
+from app.schemas.stream import FrameSourceStats, StreamVariant, SubscriberStats
+from app.services.capture import (
+    is_jpeg,
+    is_mjpeg_encoding,
+    open_capture,
+    wants_frame,
+)
+from app.services.decoder_worker import (
+    ERROR_MESSAGE,
+    FRAME_MESSAGE,
+    SLOT_MESSAGE,
+    WARNING_MESSAGE,
+    run_decoder,
+)
+from app.services.frame_ring import SharedFrameRing
+from app.services.metrics import (
+    STREAM_OUTAGE_SECONDS,
+    STREAM_OUTAGES,
+    STREAM_RECONNECTS,
+    StreamMetrics,
+)
+from app.services.mjpeg import Frame, placeholder_chunk
+from app.services.onvif_client import ONVIF_ERRORS
+
+# How long to wait for a capture thread to exit during shutdown
+SOURCE_STOP_TIMEOUT = 5.0
+# How long a decoder process gets to exit on its own before it is killed
+DECODER_STOP_TIMEOUT = 2.0
+# Delay before reconnecting a lost camera stream, doubled after every failed attempt
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+# How often viewers are sent a placeholder frame while their camera reconnects
+PLACEHOLDER_INTERVAL = 1.0
+# How long a capture thread waits for the camera to tell its stream URI again
+RESOLVE_STREAM_URI_TIMEOUT = 30.0
+# How long a camera's capture loop keeps running after its last viewer left
+IDLE_TIMEOUT = 10.0
+# How often sources are checked for having been idle long enough to stop
+IDLE_CHECK_INTERVAL = 1.0
+# Threads encoding frames for MJPEG viewers, shared by all cameras
+ENCODE_WORKERS = 4
+# Stream variants a camera can have running at once, each costs a thread and encoding
+MAX_VARIANTS = 8
+# Number of recent frames the frame rates are measured over
+FPS_WINDOW = 30
+
+_END_OF_STREAM = object()
+
+# Sources are keyed by camera and variant; the camera's own capture loop has no variant
+SourceKey = tuple[str, str | None, StreamVariant | None]
+_subscription_ids = itertools.count(1)
+
+
+def _stream_name(camera_id: str, profile: str | None) -> str:
+    return camera_id if profile is None else f"{camera_id}/{profile}"
+
+
+def _wake(waiters: Iterable[asyncio.Future]) -> None:
+    for waiter in waiters:
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+def _wake_threadsafe(waiters: Iterable[asyncio.Future | None]) -> None:
+    """Wake async subscribers from a producer thread, with one loop callback for all."""
+    pending = [waiter for waiter in waiters if waiter is not None]
+    if pending:
+        # Subscribers are all iterated on the application's event loop
+        pending[0].get_loop().call_soon_threadsafe(_wake, pending)
+
+
+class FrameRateMeter:
+    """Frame rate over the last `window` frames."""
+
+    def __init__(self, window: int = FPS_WINDOW):
+        self._timestamps: deque[float] = deque(maxlen=window)
+
+    def tick(self, timestamp: float) -> None:
+        self._timestamps.append(timestamp)
+
+    @property
+    def fps(self) -> float:
+        if len(self._timestamps) < 2:
+            return 0.0
+        elapsed = self._timestamps[-1] - self._timestamps[0]
+        return (len(self._timestamps) - 1) / elapsed if elapsed > 0 else 0.0
+
+
+class FrameSubscription(IFrameSubscription):
+    """
+    A single viewer's subscription to a camera frame source
+
+    Each subscriber has a single-slot mailbox holding the newest frame. The capture
+    thread never waits on a subscriber: a frame the viewer hasn't picked up yet is
+    replaced by the next one and counted as dropped, so a slow viewer skips ahead to
+    live instead of falling behind, and never holds more than one frame.
+
+    The subscription can be iterated on a thread, or asynchronously on the event loop,
+    where waiting for the next frame holds no thread at all.
+    """
+
+    def __init__(self, source: "FrameSource"):
+        self.id = next(_subscription_ids)
+        self._source = source
+        self._slot: Frame | object | None = None
+        self._ready = threading.Condition()
+        self._closed = False
+        # Resolved with the next frame while the async iterator waits for one
+        self._waiter: asyncio.Future | None = None
+
+        self._delivered = 0
+        self._dropped = 0
+        self._dropped_frames = source.metrics.dropped_frames
+        self._lag = 0.0
+        self._rate = FrameRateMeter()
+
+    def publish(self, frame: Frame | object) -> asyncio.Future | None:
+        """Put `frame` in the mailbox; return the async iterator's waiter to wake."""
+        with self._ready:
+            if isinstance(self._slot, Frame):
+                self._dropped += 1
+                self._dropped_frames.inc()
+            self._slot = frame
+            self._ready.notify()
+            waiter, self._waiter = self._waiter, None
+        return waiter
+
+    def __iter__(self) -> Iterator[Frame]:
+        while True:
+            with self._ready:
+                while self._slot is None and not self._closed:
+                    self._ready.wait()
+                frame = self._take()
+            if frame is None:
+                return
+            yield frame
+
+    async def __aiter__(self) -> AsyncIterator[Frame]:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._ready:
+                if self._slot is None and not self._closed:
+                    waiter = self._waiter = loop.create_future()
+                    frame = None
+                else:
+                    waiter = None
+                    frame = self._take()
+            if waiter is not None:
+                await waiter
+                continue
+            if frame is None:
+                return
+            yield frame
+
+    def _take(self) -> Frame | None:
+        """Empty the mailbox, with `_ready` held; None once the stream has ended."""
+        if self._closed:
+            return None
+        frame, self._slot = self._slot, None
+        if not isinstance(frame, Frame):
+            return None
+        now = time.monotonic()
+        self._delivered += 1
+        self._lag = now - frame.timestamp
+        self._rate.tick(now)
+        return frame
+
+    def stats(self) -> SubscriberStats:
+        return SubscriberStats(
+            id=self.id,
+            delivered=self._delivered,
+            dropped=self._dropped,
+            fps=round(self._rate.fps, 2),
+            lag_ms=round(self._lag * 1000, 1),
+        )
+
+    def close(self) -> None:
+        with self._ready:
+            if self._closed:
+                return
+            self._closed = True
+            self._ready.notify_all()
+            waiter, self._waiter = self._waiter, None
+        _wake_threadsafe([waiter])
+        self._source.unsubscribe(self)
+
+
+class FrameSource(ABC):
+    """
+    A stream of frames shared by all of its subscribers
+
+    Frames are produced on a dedicated thread by `_produce` and handed to every
+    subscriber. The source stops when `_produce` returns, or `idle_timeout` seconds
+    after the last subscriber left.
+    """
+
+    variant: StreamVariant | None = None
+    # Media profile streamed, None for the camera's default one
+    profile: str | None = None
+    # Whether frames are the camera's own JPEGs, passed through without re-encoding
+    passthrough: bool = False
+    # Seconds the source keeps running without subscribers; 0 stops it as soon as the
+    # last one leaves, None keeps it running until the broker stops
+    idle_timeout: float | None = 0.0
+
+    def __init__(
+        self,
+        camera_id: str,
+        name: str,
+        logger: LoggerType,
+        on_stopped: Callable[["FrameSource"], None],
+    ):
+        self.camera_id = camera_id
+        self.name = name
+        self.logger = logger
+        self._on_stopped = on_stopped
+        self.metrics = StreamMetrics(camera_id, self.profile)
+        self._subscribers: set[FrameSubscription] = set()
+        self._latest: Frame | None = None
+        self._captured = 0
+        self._rate = FrameRateMeter()
+        # When the source was last left without subscribers, None while it has some
+        self._idle_since: float | None = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"frame-source-{name}", daemon=True
+        )
+
+    @property
+    def key(self) -> "SourceKey":
+        return self.camera_id, self.profile, self.variant
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop_event.set()
+        self._interrupt()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    @property
+    def latest_frame(self) -> Frame | None:
+        """The most recently produced frame, or None if the source isn't running."""
+        if self._stop_event.is_set():
+            return None
+        return self._latest
+
+    def subscribe(self) -> FrameSubscription | None:
+        """Add a subscriber, or return None if the source has already stopped."""
+        with self._lock:
+            if self._stop_event.is_set():
+                return None
+            subscription = FrameSubscription(self)
+            self._subscribers.add(subscription)
+            self._idle_since = None
+            return subscription
+
+    def stop_if_idle(self) -> bool:
+        """Stop the source if it has had no subscribers for `idle_timeout` seconds."""
+        with self._lock:
+            idle_since = self._idle_since
+            if (
+                self.idle_timeout is None
+                or idle_since is None
+                or time.monotonic() - idle_since < self.idle_timeout
+                or self._stop_event.is_set()
+            ):
+                return False
+            self._stop_event.set()
+        self.logger.info(f"Stopping {self.name}, it has had no subscribers for a while")
+        self._interrupt()
+        return True
+
+    def stats(self) -> FrameSourceStats:
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+            idle_since = self._idle_since
+        return FrameSourceStats(
+            camera_id=self.camera_id,
+            profile=self.profile,
+            passthrough=self.passthrough,
+            idle_seconds=(
+                round(time.monotonic() - idle_since, 1)
+                if idle_since is not None
+                else 0.0
+            ),
+            captured=self._captured,
+            fps=round(self._rate.fps, 2),
+            subscribers=[subscription.stats() for subscription in subscribers],
+        )
+
+    def unsubscribe(self, subscription: FrameSubscription) -> None:
+        stats = subscription.stats()
+        self.logger.info(
+            f"Subscriber {stats.id} of {self.name} left after {stats.delivered} "
+            f"frames, {stats.dropped} dropped"
+        )
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if self._subscribers:
+                return
+            self._idle_since = time.monotonic()
+            if self.idle_timeout != 0:
+                # Kept warm for the next viewer, the broker stops it once idle
+                return
+            self._stop_event.set()
+        self._interrupt()
+
+    def _interrupt(self) -> None:
+        """Wake up `_produce` if it may be blocked waiting for its next frame."""
+
+    @abstractmethod
+    def _produce(self) -> None:
+        pass
+
+    def _publish(self, frame: Frame) -> None:
+        self._latest = frame
+        self._captured += 1
+        self.metrics.frames.inc()
+        self._rate.tick(frame.timestamp)
+        self._broadcast(frame)
+
+    def _broadcast(self, frame: Frame) -> None:
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+        _wake_threadsafe([subscription.publish(frame) for subscription in subscribers])
+
+    def _run(self) -> None:
+        try:
+            self._produce()
+        finally:
+            self._latest = None
+            with self._lock:
+                self._stop_event.set()
+                subscribers = tuple(self._subscribers)
+                self._subscribers.clear()
+            _wake_threadsafe(
+                [subscription.publish(_END_OF_STREAM) for subscription in subscribers]
+            )
+            self._on_stopped(self)
+
+
+class ReconnectingFrameSource(FrameSource):
+    """
+    Frame source reading a camera stream, which reconnects when the stream is lost
+
+    Subscribers stay connected through an outage and are sent a placeholder frame
+    while the stream reconnects. Reconnects back off exponentially with jitter. The
+    stream URI is only resolved again once reconnecting to the known one has failed.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        logger: LoggerType,
+        on_stopped: Callable[[FrameSource], None],
+        resolve_stream_uri: Callable[[], str] | None = None,
+        reconnect_delay: float = RECONNECT_DELAY,
+        max_reconnect_delay: float = MAX_RECONNECT_DELAY,
+        profile: str | None = None,
+    ):
+        self.profile = profile
+        super().__init__(
+            camera_id, _stream_name(camera_id, profile), logger, on_stopped
+        )
+        self.stream_uri = stream_uri
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._resolve_stream_uri = resolve_stream_uri
+        self._outage_start: float | None = None
+        self._outages = 0
+        self._outage_seconds = 0.0
+        self._reconnects = 0
+
+    def stats(self) -> FrameSourceStats:
+        outage_start = self._outage_start
+        outage_seconds = self._outage_seconds
+        if outage_start is not None:
+            outage_seconds += time.monotonic() - outage_start
+        return (
+            super()
+            .stats()
+            .model_copy(
+                update={
+                    "reconnecting": outage_start is not None,
+                    "outages": self._outages,
+                    "outage_seconds": round(outage_seconds, 1),
+                    "reconnects": self._reconnects,
+                }
+            )
+        )
+
+    @property
+    def watched(self) -> bool:
+        """Whether anyone is subscribed, and so waiting for the next frame."""
+        return bool(self._subscribers)
+
+    def _publish(self, frame: Frame) -> None:
+        if self._outage_start is not None:
+            self._end_outage()
+        super()._publish(frame)
+
+    def _run(self) -> None:
+        try:
+            super()._run()
+        finally:
+            if self._outage_start is not None:
+                self._end_outage()
+
+    def _connect_loop(self, connect: Callable[[], bool]) -> None:
+        """
+        Run `connect` until the source stops, reconnecting whenever it returns
+
+        `connect` streams frames until the stream is lost and returns whether it
+        received any, which tells a dropped stream from a failed connection attempt.
+        """
+        attempt = 0
+        while not self._stop_event.is_set():
+            received = connect()
+            if self._stop_event.is_set():
+                break
+            if received:
+                attempt = 0
+            if not self._wait_to_reconnect(attempt):
+                break
+            if not received:
+                # The known URI didn't work, the camera may hand out a new one
+                self._update_stream_uri()
+            attempt += 1
+
+    def _wait_to_reconnect(self, attempt: int) -> bool:
+        """Back off before reconnect `attempt`; False if the source stopped meanwhile."""
+        if self._outage_start is None:
+            self._outage_start = time.monotonic()
+            self._outages += 1
+            STREAM_OUTAGES.labels(self.camera_id).inc()
+
+        # Jittered, so viewers of cameras that went down together don't all come back
+        # at the same moment
+        delay = min(
+            self.reconnect_delay * 2 ** min(attempt, 16), self.max_reconnect_delay
+        )
+        deadline = time.monotonic() + random.uniform(delay / 2, delay)  # nosec B311
+        placeholder = placeholder_chunk()
+        while True:
+            self._broadcast(Frame.from_mjpeg_chunk(placeholder, time.monotonic()))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._stop_event.wait(min(remaining, PLACEHOLDER_INTERVAL)):
+                return False
+
+        self._reconnects += 1
+        STREAM_RECONNECTS.labels(self.camera_id).inc()
+        return True
+
+    def _update_stream_uri(self) -> None:
+        if self._resolve_stream_uri is None:
+            return
+        try:
+            self.stream_uri = self._resolve_stream_uri()
+        except (RuntimeError, *ONVIF_ERRORS) as e:
+            self.logger.warning(
+                f"Failed to resolve the stream URI of {self.camera_id}: {e}"
+            )
+
+    def _end_outage(self) -> None:
+        assert self._outage_start is not None  # nosec B101
+        duration = time.monotonic() - self._outage_start
+        self._outage_start = None
+        self._outage_seconds += duration
+        STREAM_OUTAGE_SECONDS.labels(self.camera_id).inc(duration)
+        self.logger.info(
+            f"Stream of {self.camera_id} was down for {duration:.1f}s, "
+            f"{self._reconnects} reconnects so far"
+        )
+
+
+class CameraFrameSource(ReconnectingFrameSource):
+    """
+    Single capture/decode loop for one camera
+
+    Frames are grabbed from one `cv2.VideoCapture` on a dedicated thread as fast as the
+    camera sends them, so they never queue up in FFmpeg and viewers stay at live. Only
+    frames someone is subscribed for are retrieved and handed to every subscriber,
+    stamped with the time they were grabbed. With `passthrough`, an MJPEG stream's
+    frames are handed on as the camera encoded them; they are only decoded if a variant
+    needs the pixels.
+    """
+
+    # Type of the frames handed to subscribers, e.g. one instrumenting its encoding
+    frame_type: type[Frame] = Frame
+
+    def __init__(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        logger: LoggerType,
+        on_stopped: Callable[[FrameSource], None],
+        passthrough: bool = False,
+        **kwargs: Any,
+    ):
+        super().__init__(camera_id, stream_uri, logger, on_stopped, **kwargs)
+        self.passthrough = passthrough
+        self._passthrough = passthrough
+
+    def _produce(self) -> None:
+        try:
+            self._connect_loop(self._capture)
+        finally:
+            self.logger.info(f"Stopped frame capture for {self.camera_id}")
+
+    def _capture(self) -> bool:
+        cap, self.passthrough = self._open_capture(self._passthrough)
+        received = False
+        try:
+            if not cap.isOpened():
+                self.logger.error(f"Cannot open video stream for {self.camera_id}")
+                return False
+
+            mode = "JPEG passthrough" if self.passthrough else "transcoding"
+            self.logger.info(f"Started frame capture for {self.camera_id} ({mode})")
+            last_decoded: float | None = None
+            while not self._stop_event.is_set():
+                success = cap.grab()
+                # Stamped before decoding, so the lag covers the whole way to a viewer
+                timestamp = time.monotonic()
+                if success and not wants_frame(self.watched, timestamp, last_decoded):
+                    received = True
+                    continue
+                if success:
+                    success, data = cap.retrieve()
+                if not success:
+                    self.logger.warning(
+                        f"Frame read failed for {self.camera_id}, reconnecting"
+                    )
+                    break
+                last_decoded = timestamp
+                if not self.passthrough:
+                    self._publish(
+                        self.frame_type(
+                            data, timestamp, encode_time=self.metrics.encode_time
+                        )
+                    )
+                elif is_jpeg(data):
+                    self._publish(self.frame_type.from_jpeg(data, timestamp))
+                else:
+                    self.logger.warning(
+                        f"Stream of {self.camera_id} sent a frame that isn't JPEG, "
+                        "transcoding instead"
+                    )
+                    cap.release()
+                    self._passthrough = False
+                    cap, self.passthrough = self._open_capture()
+                    continue
+                received = True
+        finally:
+            cap.release()
+        return received
+
+    def _open_capture(self, passthrough: bool = False) -> tuple[cv2.VideoCapture, bool]:
+        return open_capture(self.stream_uri, passthrough)
+
+
+class ProcessFrameSource(ReconnectingFrameSource):
+    """
+    Capture loop for one camera running in a decoder process
+
+    The process decodes and encodes frames on its own core and writes them into a
+    shared memory ring. This thread only copies each announced frame out of the ring,
+    straight into the multipart chunk sent to viewers, and hands it to subscribers.
+    A decoder that exits, because it crashed or lost the stream, is started again.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        slots: int,
+        slot_size: int,
+        logger: LoggerType,
+        on_stopped: Callable[[FrameSource], None],
+        passthrough: bool = False,
+        **kwargs: Any,
+    ):
+        super().__init__(camera_id, stream_uri, logger, on_stopped, **kwargs)
+        self.slots = slots
+        self.slot_size = slot_size
+        # Only the decoder process knows whether the stream turned out to be MJPEG
+        self._passthrough = passthrough
+
+    def _produce(self) -> None:
+        ring = SharedFrameRing.create(self.slots, self.slot_size)
+        try:
+            self._connect_loop(lambda: self._run_decoder(ring))
+        finally:
+            ring.close()
+            ring.unlink()
+            self.logger.info(f"Stopped frame capture for {self.camera_id}")
+
+    def _run_decoder(self, ring: SharedFrameRing) -> bool:
+        """Run one decoder process until it exits; return whether it produced frames."""
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        stop = context.Event()
+        # Tells the decoder whether frames are watched, and so worth encoding
+        watched = context.Event()
+        process = context.Process(
+            target=run_decoder,
+            args=(
+                self.stream_uri,
+                ring.name,
+                ring.slots,
+                ring.slot_size,
+                sender,
+                stop,
+                watched,
+                self._passthrough,
+            ),
+            name=f"decoder-{self.camera_id}",
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        self.logger.info(f"Started decoder process {process.pid} for {self.camera_id}")
+
+        received = False
+        try:
+            while not self._stop_event.is_set():
+                if self.watched and not watched.is_set():
+                    watched.set()
+                elif not self.watched and watched.is_set():
+                    watched.clear()
+                if not receiver.poll(0.5):
+                    if not process.is_alive():
+                        break
+                    continue
+                try:
+                    slot = self._latest_slot(receiver)
+                except EOFError:
+                    break
+                if slot is None:
+                    continue
+                frame = ring.read(slot)
+                if frame is None:
+                    # Overwritten while copying, a newer frame has been announced
+                    continue
+                received = True
+                self._publish(Frame.from_mjpeg_chunk(*frame))
+        finally:
+            stop.set()
+            process.join(DECODER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            receiver.close()
+        if not self._stop_event.is_set():
+            self.logger.warning(
+                f"Decoder process for {self.camera_id} exited with code "
+                f"{process.exitcode}, reconnecting"
+            )
+        return received
+
+    def _latest_slot(self, receiver: Connection) -> int | None:
+        # Frames announced while this thread was busy are skipped, only the newest
+        # matters; the time the decoder spent encoding them is still recorded
+        slot = None
+        while True:
+            message = receiver.recv_bytes()
+            kind, body = message[:1], message[1:]
+            if kind == FRAME_MESSAGE:
+                slot, seconds, passthrough = SLOT_MESSAGE.unpack(body)
+                if seconds:
+                    self.metrics.encode_time.observe(seconds)
+                if self._passthrough and not passthrough:
+                    # Don't try passthrough again when the decoder is restarted
+                    self._passthrough = False
+                self.passthrough = passthrough
+            elif kind == WARNING_MESSAGE:
+                self.logger.warning(f"Decoder for {self.camera_id}: {body.decode()}")
+            elif kind == ERROR_MESSAGE:
+                self.logger.error(f"Decoder for {self.camera_id}: {body.decode()}")
+            if not receiver.poll():
+                return slot
+
+
+class VariantFrameSource(FrameSource):
+    """
+    Resized, rate limited and re-encoded copy of a camera's frames
+
+    The variant subscribes to the camera's capture loop like any viewer, so it skips
+    frames rather than holding the camera back when it can't keep up. Each frame is
+    resized and encoded once on the variant's own thread and shared by all of its
+    subscribers.
+    """
+
+    variant: StreamVariant
+
+    def __init__(
+        self,
+        camera_id: str,
+        variant: StreamVariant,
+        upstream: FrameSubscription,
+        logger: LoggerType,
+        on_stopped: Callable[[FrameSource], None],
+        profile: str | None = None,
+    ):
+        self.variant = variant
+        self.profile = profile
+        super().__init__(
+            camera_id,
+            f"{_stream_name(camera_id, profile)}@{variant.name}",
+            logger,
+            on_stopped,
+        )
+        self._upstream = upstream
+        self._interval = 1.0 / variant.fps if variant.fps else 0.0
+        self._next_due = 0.0
+
+    def stats(self) -> FrameSourceStats:
+        return super().stats().model_copy(update={"variant": self.variant.name})
+
+    def _interrupt(self) -> None:
+        self._upstream.close()
+
+    def _produce(self) -> None:
+        self.logger.info(f"Started stream variant {self.name}")
+        try:
+            for frame in self._upstream:
+                if self._stop_event.is_set():
+                    break
+                if not self._is_due(frame.timestamp):
+                    continue
+                transformed = self._transform(frame)
+                if transformed is None:
+                    continue
+                transformed.mjpeg_chunk()
+                self._publish(transformed)
+        finally:
+            self._upstream.close()
+            self.logger.info(f"Stopped stream variant {self.name}")
+
+    def _is_due(self, timestamp: float) -> bool:
+        if not self._interval:
+            return True
+        # Allow some jitter, so a 10 fps variant of a 25 fps camera doesn't drop to 8 fps
+        if timestamp < self._next_due - self._interval / 4:
+            return False
+        self._next_due += self._interval
+        if self._next_due < timestamp:
+            # Fell behind the schedule, e.g. the camera stalled, so start over from now
+            self._next_due = timestamp + self._interval
+        return True
+
+    def _transform(self, frame: Frame) -> Frame | None:
+        image = frame.image
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        if self.variant.width and self.variant.width < width:
+            size = (self.variant.width, round(height * self.variant.width / width))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        elif self.variant.quality is None:
+            # Only the frame rate differs, so share the camera frame and its encoding
+            return frame
+        # Of the camera's frame type, see CameraFrameSource.frame_type
+        return type(frame)(
+            image,
+            frame.timestamp,
+            quality=self.variant.quality,
+            encode_time=self.metrics.encode_time,
+        )
+
+
+class FrameBrokerService(IFrameBrokerService):
+    """
+    Service sharing one capture/decode loop per camera between all viewers.
+
+    Cameras streaming MJPEG can be passed through: their JPEG frames are sent to
+    viewers as they are, without being decoded and re-encoded.
+    Viewers asking for a smaller size, lower frame rate or different JPEG quality
+    share one variant source per distinct request, fed by the camera's capture loop.
+    A camera runs at most `max_variants` of them at once.
+    In process decoder mode, each camera's capture loop runs in its own process.
+    A capture loop that loses its camera stream reconnects, while its viewers stay
+    connected.
+
+    Capture loops start with their first viewer and keep running for `idle_timeout`
+    seconds after the last one left, so a viewer coming back, or the next one, doesn't
+    wait for the RTSP handshake and a keyframe. Cameras in `always_warm` are started
+    with the broker and never stopped for being idle.
+
+    Frames that still need JPEG encoding for a viewer are encoded on a small executor
+    of `encode_workers` threads shared by all cameras, so viewers waiting for frames
+    on the event loop don't each hold a thread.
+    """
+
+    decoder_mode: DecoderMode = DecoderMode.THREAD
+    decoder_ring_slots: int = 4
+    decoder_slot_size: int = 4 * 1024 * 1024
+    reconnect_delay: float = RECONNECT_DELAY
+    max_reconnect_delay: float = MAX_RECONNECT_DELAY
+    idle_timeout: float = IDLE_TIMEOUT
+    always_warm: frozenset[str] = frozenset()
+    encode_workers: int = ENCODE_WORKERS
+    max_variants: int = MAX_VARIANTS
+
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+    # Encodes in progress, awaited by every viewer of the frame
+    _encoding: dict[Frame, asyncio.Future[bytes | None]] = PrivateAttr(
+        default_factory=dict
+    )
+    _sources: dict[SourceKey, FrameSource] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _running: bool = PrivateAttr(default=False)
+    _loop: asyncio.AbstractEventLoop | None = PrivateAttr(default=None)
+    _tasks: set[asyncio.Task] = PrivateAttr(default_factory=set)
+
+    def model_post_init(self, context: Any) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.encode_workers, thread_name_prefix="frame-encoder"
+        )
+
+    async def start(self) -> None:
+        with self._lock:
+            self._running = True
+            self._loop = asyncio.get_running_loop()
+        self._run_task(self._stop_idle_sources())
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        with self._lock:
+            self._running = False
+            sources = list(self._sources.values())
+            self._sources.clear()
+
+        await asyncio.gather(
+            *(asyncio.to_thread(source.stop, SOURCE_STOP_TIMEOUT) for source in sources)
+        )
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_task(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _stop_idle_sources(self) -> None:
+        while True:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            with self._lock:
+                sources = list(self._sources.values())
+            for source in sources:
+                source.stop_if_idle()
+
+    async def start_always_warm(self, camera_registry: ICameraRegistry) -> None:
+        """Start the capture loops of the always warm cameras in the background."""
+        for camera_id in self.always_warm:
+            self._run_task(self._start_warm(camera_registry, camera_id))
+
+    async def _start_warm(
+        self, camera_registry: ICameraRegistry, camera_id: str
+    ) -> None:
+        try:
+            onvif_service = camera_registry.get(camera_id)
+            stream_uri = await onvif_service.get_stream_uri()
+            encoding = await onvif_service.get_video_encoding()
+        except (ValueError, *ONVIF_ERRORS) as e:
+            # It is kept warm once its first viewer started it instead
+            self.logger.warning(f"Could not start stream of {camera_id}: {e}")
+            return
+
+        with self._lock:
+            if not self._running or (camera_id, None, None) in self._sources:
+                return
+            self._start_camera_source(
+                camera_id,
+                None,
+                stream_uri,
+                is_mjpeg_encoding(encoding),
+                self._blocking(
+                    partial(self._refresh_stream_uri, camera_registry, camera_id)
+                ),
+            )
+        self.logger.info(f"Started stream of {camera_id}, it is kept warm")
+
+    async def _refresh_stream_uri(
+        self, camera_registry: ICameraRegistry, camera_id: str
+    ) -> str:
+        # Looked up on every use, the registry may have reconnected the camera since
+        return await camera_registry.get(camera_id).get_stream_uri(refresh=True)
+
+    def subscribe(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        variant: StreamVariant | None = None,
+        passthrough: bool = False,
+        resolve_stream_uri: Callable[[], Coroutine[Any, Any, str]] | None = None,
+        profile: str | None = None,
+    ) -> FrameSubscription:
+        """
+        Subscribe to a camera's frames, or to a variant of them
+
+        `stream_uri` is the stream of the camera's media `profile`, None for its
+        default one; each profile streamed has a capture loop of its own.
+        `resolve_stream_uri` asks the camera for its stream URI again, for when the
+        capture loop can't reconnect to `stream_uri`.
+        Raises RuntimeError if the broker isn't running, or the variant would be more
+        than the camera's `max_variants`.
+        """
+        if variant is not None and variant.is_source:
+            variant = None
+
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("Frame broker is not running")
+            # Only a running broker has the event loop the URI is resolved on
+            resolve = (
+                self._blocking(resolve_stream_uri)
+                if resolve_stream_uri is not None
+                else None
+            )
+
+            if variant is None:
+                return self._subscribe_camera(
+                    camera_id, profile, stream_uri, passthrough, resolve
+                )
+
+            key: SourceKey = (camera_id, profile, variant)
+            source = self._sources.get(key)
+            subscription = source.subscribe() if source else None
+            if subscription is None:
+                running = sum(
+                    1
+                    for camera, _, other in self._sources
+                    if camera == camera_id and other is not None
+                )
+                if running >= self.max_variants:
+                    raise RuntimeError(
+                        f"Camera {camera_id} already streams {running} variants"
+                    )
+                upstream = self._subscribe_camera(
+                    camera_id, profile, stream_uri, passthrough, resolve
+                )
+                source = self._create_variant_source(
+                    camera_id, variant, upstream, profile
+                )
+                subscription = source.subscribe()
+                assert subscription is not None  # nosec B101
+                self._sources[key] = source
+                source.start()
+
+        return subscription
+
+    def _blocking(
+        self, resolve: Callable[[], Coroutine[Any, Any, str]]
+    ) -> Callable[[], str]:
+        """Make a coroutine function callable from a capture thread."""
+        loop = self._loop
+        assert loop is not None  # nosec B101
+
+        def resolve_blocking() -> str:
+            future = asyncio.run_coroutine_threadsafe(resolve(), loop)
+            try:
+                return future.result(RESOLVE_STREAM_URI_TIMEOUT)
+            finally:
+                future.cancel()
+
+        return resolve_blocking
+
+    def _subscribe_camera(
+        self,
+        camera_id: str,
+        profile: str | None,
+        stream_uri: str,
+        passthrough: bool,
+        resolve_stream_uri: Callable[[], str] | None,
+    ) -> FrameSubscription:
+        # Called with the lock held
+        key: SourceKey = (camera_id, profile, None)
+        source = self._sources.get(key)
+        subscription = source.subscribe() if source else None
+        if subscription is None:
+            source = self._start_camera_source(
+                camera_id, profile, stream_uri, passthrough, resolve_stream_uri
+            )
+            subscription = source.subscribe()
+            assert subscription is not None  # nosec B101
+        return subscription
+
+    def _start_camera_source(
+        self,
+        camera_id: str,
+        profile: str | None,
+        stream_uri: str,
+        passthrough: bool,
+        resolve_stream_uri: Callable[[], str] | None,
+    ) -> FrameSource:
+        # Called with the lock held
+        source = self._create_camera_source(
+            camera_id, stream_uri, passthrough, resolve_stream_uri, profile
+        )
+        # Only a camera's default profile is kept warm
+        source.idle_timeout = (
+            None
+            if camera_id in self.always_warm and profile is None
+            else self.idle_timeout
+        )
+        self._sources[source.key] = source
+        source.start()
+        return source
+
+    def _create_camera_source(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        passthrough: bool,
+        resolve_stream_uri: Callable[[], str] | None,
+        profile: str | None = None,
+    ) -> FrameSource:
+        reconnect = {
+            "resolve_stream_uri": resolve_stream_uri,
+            "reconnect_delay": self.reconnect_delay,
+            "max_reconnect_delay": self.max_reconnect_delay,
+            "profile": profile,
+        }
+        if self.decoder_mode == DecoderMode.PROCESS:
+            return ProcessFrameSource(
+                camera_id,
+                stream_uri,
+                self.decoder_ring_slots,
+                self.decoder_slot_size,
+                self.logger,
+                self._on_source_stopped,
+                passthrough,
+                **reconnect,
+            )
+        return CameraFrameSource(
+            camera_id,
+            stream_uri,
+            self.logger,
+            self._on_source_stopped,
+            passthrough,
+            **reconnect,
+        )
+
+    def _create_variant_source(
+        self,
+        camera_id: str,
+        variant: StreamVariant,
+        upstream: FrameSubscription,
+        profile: str | None = None,
+    ) -> FrameSource:
+        return VariantFrameSource(
+            camera_id,
+            variant,
+            upstream,
+            self.logger,
+            self._on_source_stopped,
+            profile,
+        )
+
+    async def mjpeg_chunk(self, frame: Frame) -> bytes | None:
+        """The frame's multipart chunk, encoded on the encoder executor if need be."""
+        if frame.encoded:
+            return frame.mjpeg_chunk()
+        # Viewers woken by the same frame share one encode, instead of each taking
+        # an executor thread only to wait for the first one's
+        encoding = self._encoding.get(frame)
+        if encoding is None:
+            loop = asyncio.get_running_loop()
+            encoding = loop.run_in_executor(self._executor, frame.mjpeg_chunk)
+            self._encoding[frame] = encoding
+            encoding.add_done_callback(lambda _: self._encoding.pop(frame, None))
+        # A viewer leaving mid-encode doesn't cancel it for the others
+        return await asyncio.shield(encoding)
+
+    def latest_frame(self, camera_id: str) -> Frame | None:
+        with self._lock:
+            source = self._sources.get((camera_id, None, None))
+        return source.latest_frame if source else None
+
+    def get_stats(self, camera_id: str) -> FrameSourceStats | None:
+        """
+        Stats of a camera's capture loop and its variants
+
+        The default profile's capture loop comes first, those of other profiles the
+        camera is streamed in are listed under `profiles`.
+        """
+        with self._lock:
+            sources = [
+                source
+                for (source_camera_id, _, _), source in self._sources.items()
+                if source_camera_id == camera_id
+            ]
+        captures = sorted(
+            (source for source in sources if source.variant is None),
+            key=lambda source: source.profile is not None,
+        )
+        if not captures:
+            return None
+
+        def with_variants(capture: FrameSource) -> FrameSourceStats:
+            variants = [
+                source.stats()
+                for source in sources
+                if source.variant is not None and source.profile == capture.profile
+            ]
+            return capture.stats().model_copy(update={"variants": variants})
+
+        first, *others = captures
+        return with_variants(first).model_copy(
+            update={"profiles": [with_variants(capture) for capture in others]}
+        )
+
+    def _on_source_stopped(self, source: FrameSource) -> None:
+        with self._lock:
+            if self._sources.get(source.key) is source:
+                del self._sources[source.key]
@@ -0,0 +1,87 @@
+import struct
+from collections.abc import Iterable
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Buffer
+
+# Per-slot header: sequence number, payload length and capture timestamp
+_SLOT_HEADER = struct.Struct("<QQd")
+_SLOT_HEADER_SIZE = 32
+
+
+class SharedFrameRing:
+    """
+    Ring of fixed-size frame slots in shared memory, written by one decoder process
+
+    Every slot is guarded by a sequence number (a seqlock). The writer makes it odd
+    while it fills the slot and even again once the frame is complete. A reader copies
+    the payload out and only keeps it if the sequence number was even and unchanged
+    across the copy, so a frame overwritten mid-read is discarded instead of torn.
+    """
+
+    def __init__(self, shm: SharedMemory, slots: int, slot_size: int):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        buf = shm.buf
+        assert buf is not None  # nosec B101
+        self._buf: memoryview = buf
+
+    @classmethod
+    def create(cls, slots: int, slot_size: int) -> "SharedFrameRing":
+        shm = SharedMemory(create=True, size=slots * (_SLOT_HEADER_SIZE + slot_size))
+        return cls(shm, slots, slot_size)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_size: int) -> "SharedFrameRing":
+        # Spawned decoder processes share the resource tracker of the API process,
+        # which owns the segment and unlinks it
+        return cls(SharedMemory(name=name), slots, slot_size)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _offset(self, slot: int) -> int:
+        return slot * (_SLOT_HEADER_SIZE + self.slot_size)
+
+    def write(self, slot: int, parts: Iterable["Buffer"], timestamp: float) -> bool:
+        """Write the concatenated parts into a slot; False if they don't fit."""
+        views = [memoryview(part).cast("B") for part in parts]
+        length = sum(len(view) for view in views)
+        if length > self.slot_size:
+            return False
+
+        offset = self._offset(slot)
+        (seq, _, _) = _SLOT_HEADER.unpack_from(self._buf, offset)
+        seq += 1 if seq % 2 == 0 else 2
+        _SLOT_HEADER.pack_into(self._buf, offset, seq, 0, 0.0)
+
+        position = offset + _SLOT_HEADER_SIZE
+        for view in views:
+            self._buf[position : position + len(view)] = view
+            position += len(view)
+
+        _SLOT_HEADER.pack_into(self._buf, offset, seq + 1, length, timestamp)
+        return True
+
+    def read(self, slot: int) -> tuple[bytes, float] | None:
+        """Copy a complete frame out of a slot, or None if it is being overwritten."""
+        offset = self._offset(slot)
+        seq, length, timestamp = _SLOT_HEADER.unpack_from(self._buf, offset)
+        if seq % 2 or not length:
+            return None
+        start = offset + _SLOT_HEADER_SIZE
+        payload = bytes(self._buf[start : start + length])
+        if _SLOT_HEADER.unpack_from(self._buf, offset)[0] != seq:
+            return None
+        return payload, timestamp
+
+    def close(self) -> None:
+        self._buf.release()
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
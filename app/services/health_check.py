@@ -1,9 +1,12 @@
 import asyncio
+import contextlib
+import time
 from collections.abc import Callable
 
-from pydantic import NonNegativeFloat
+from pydantic import NonNegativeFloat, PrivateAttr
 
 from app.contracts.services import IHealthCheckService
+from app.contracts.services.health_check import ServiceWithHealthCheck
 from app.core.config import Settings
 from app.core.enums import Status
 from app.schemas.health import ComponentHealth, HealthResponse
@@ -12,8 +15,73 @@ from app.schemas.health import ComponentHealth, HealthResponse
 class HealthCheckService(IHealthCheckService):
     """
     Service for checking the health of the application.
+
+    Connected cameras are probed in the background every `interval` seconds: an ONVIF
+    call, their stream port and, while a stream is running, the age of its newest
+    frame. Health requests are answered from the latest results, so a load balancer
+    polling /health never reaches the cameras itself.
     """
 
+    # Overall status and the results of the last probe, replaced together
+    _results: tuple[Status, dict[str, ComponentHealth]] = PrivateAttr(
+        default=(Status.UP, {})
+    )
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:  # noqa: BLE001 - the probe loop must outlive any failure
+                self.logger.error(f"Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def probe(self) -> dict[str, ComponentHealth]:
+        """Run every health check now and keep the results for health requests."""
+        checks: dict[str, Callable] = {
+            camera_id: service.check_health
+            for camera_id, service in self.camera_registry.connected().items()
+            if isinstance(service, ServiceWithHealthCheck)
+        }
+        results = await self.gather_health_checks(checks, timeout=self.timeout)
+
+        health_results = {
+            f"camera:{camera_id}": self._with_frame_age(camera_id, health)
+            for camera_id, health in results.items()
+        }
+
+        # Determine overall status based on individual check results
+        overall_status = Status.UP
+        if any(result.status == Status.DOWN for result in health_results.values()):
+            overall_status = Status.DOWN
+
+        self._results = (overall_status, health_results)
+        return health_results
+
+    def _with_frame_age(
+        self, camera_id: str, health: ComponentHealth
+    ) -> ComponentHealth:
+        frame = self.frame_broker.latest_frame(camera_id)
+        if frame is None:
+            return health
+        age = time.monotonic() - frame.timestamp
+        details = {**(health.details or {}), "last_frame_age": round(age, 3)}
+        if age <= self.max_frame_age:
+            return health.model_copy(update={"details": details})
+        details["error"] = f"No frame from the stream for {age:.1f}s"
+        return health.model_copy(update={"status": Status.DOWN, "details": details})
+
     async def gather_health_checks(
         self, checks: dict[str, Callable], timeout: float | None = 5.0
     ) -> dict[str, ComponentHealth]:
@@ -63,23 +131,8 @@ class HealthCheckService(IHealthCheckService):
     async def check_health(
         self, settings: Settings, uptime: NonNegativeFloat
     ) -> HealthResponse:
-        services_checks: dict[str, Callable] = {  # type: ignore
-            # TODO: Add health checks for services. Each entry should be:
-            # ServiceNames.service_name: service.check_health (method returning ComponentHealth)
-            # ComponentHealth requires: status, details dict, responseTime
-            # Services should implement ServiceWithHealthCheck protocol
-        }
-
-        health_results: dict[str, ComponentHealth] = await self.gather_health_checks(
-            services_checks, timeout=5.0
-        )
-
-        # Determine overall status based on individual check results
-        overall_status = Status.UP
-        for _service_name, result in health_results.items():
-            if isinstance(result, ComponentHealth) and result.status == Status.DOWN:
-                overall_status = Status.DOWN
-                break
+        # Results of the last background probe, the services aren't called here
+        overall_status, health_results = self._results
 
         return HealthResponse(
             status=overall_status,
@@ -0,0 +1,443 @@
+import asyncio
+import io
+import math
+import random
+import struct
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from pydantic import PrivateAttr
+
+from app.contracts.services.hls import IHlsService
+from app.core.types import LoggerType
+
+try:
+    import av
+
+    HAS_PYAV = True
+except ImportError:  # PyAV is only installed with the `hls` extra
+    HAS_PYAV = False
+
+HLS_PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+HLS_INIT_MEDIA_TYPE = "video/mp4"
+HLS_SEGMENT_MEDIA_TYPE = "video/iso.segment"
+
+# Every keyframe starts a new fragment; the init segment is written up front
+FRAGMENTED_MP4_OPTIONS = {
+    "movflags": "frag_keyframe+empty_moov+default_base_moof",
+    "flush_packets": "1",
+}
+# How long a playlist request waits for the first segment of a starting stream
+FIRST_SEGMENT_TIMEOUT = 15.0
+# Connect and read timeout in seconds for the camera stream
+SOURCE_TIMEOUT = 10.0
+# First and longest delay in seconds before reconnecting a lost camera stream
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+_BOX_HEADER = struct.Struct(">I4s")
+
+
+class FragmentedMp4Writer(io.RawIOBase):
+    """
+    Write-only file splitting the muxer output into its init segment and fragments
+
+    The `ftyp` and `moov` boxes make up the init segment; every following `moof` box
+    and its `mdat` make up one fragment.
+    """
+
+    def __init__(
+        self,
+        on_init: Callable[[bytes], None],
+        on_fragment: Callable[[bytes], None],
+    ):
+        self._on_init = on_init
+        self._on_fragment = on_fragment
+        self._buffer = bytearray()
+        self._init = bytearray()
+        self._moof: bytes | None = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= _BOX_HEADER.size:
+            size, box_type = _BOX_HEADER.unpack_from(self._buffer)
+            if size == 1:
+                if len(self._buffer) < 16:
+                    break
+                (size,) = struct.unpack_from(">Q", self._buffer, 8)
+            if size < _BOX_HEADER.size or len(self._buffer) < size:
+                break
+            box = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._handle_box(box_type, box)
+        return len(data)
+
+    def _handle_box(self, box_type: bytes, box: bytes) -> None:
+        if box_type == b"ftyp":
+            self._init = bytearray(box)
+        elif box_type == b"moov":
+            self._on_init(bytes(self._init + box))
+        elif box_type == b"moof":
+            self._moof = box
+        elif box_type == b"mdat" and self._moof is not None:
+            self._on_fragment(self._moof + box)
+            self._moof = None
+
+
+@dataclass(frozen=True)
+class HlsSegment:
+    sequence: int
+    duration: float
+    data: bytes
+    # Number of the init segment the fragments were muxed with, one per connection
+    init: int = 0
+    # First segment after the camera stream was reconnected, timestamps start over
+    discontinuity: bool = False
+
+
+class HlsStream:
+    """
+    Remuxes one camera stream into a sliding window of fMP4 HLS segments
+
+    Packets are copied from the camera's H.264/H.265 stream into fragmented MP4 as they
+    are, nothing is decoded or encoded. Segments are cut on keyframes once they reach
+    the target duration. A lost camera stream is reconnected with backoff, and the
+    segments that follow are marked as a discontinuity. Every connection has an init
+    segment of its own, kept as long as segments muxed with it are in the window, so
+    each discontinuity maps a new init URI. The stream keeps running while
+    its playlist or segments are requested, and stops after `idle_timeout` seconds
+    without requests; only then does the playlist end.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        segment_duration: float,
+        window_size: int,
+        idle_timeout: float,
+        logger: LoggerType,
+        on_stopped: Callable[["HlsStream"], None],
+        reconnect_delay: float = RECONNECT_DELAY,
+        max_reconnect_delay: float = MAX_RECONNECT_DELAY,
+    ):
+        self.camera_id = camera_id
+        self.stream_uri = stream_uri
+        self.segment_duration = segment_duration
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.logger = logger
+        self._on_stopped = on_stopped
+
+        # Init segments by number, the newest one is the current connection's
+        self._inits: dict[int, bytes] = {}
+        self._init_number = -1
+        self._segments: deque[HlsSegment] = deque(maxlen=window_size)
+        self._sequence = 0
+        # Discontinuities that have slid out of the window
+        self._discontinuity_sequence = 0
+        self._discontinuity = False
+        self._ended = False
+        self._ready = threading.Condition()
+        self._last_access = time.monotonic()
+        self._stop_event = threading.Event()
+
+        # Fragment durations, known once the keyframe starting the next one is read
+        self._durations: deque[float] = deque()
+        self._pending: list[bytes] = []
+        self._pending_duration = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"hls-{camera_id}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def touch(self) -> None:
+        self._last_access = time.monotonic()
+
+    def is_idle(self) -> bool:
+        return time.monotonic() - self._last_access > self.idle_timeout
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait until the first segment is available or the stream has ended."""
+        with self._ready:
+            return self._ready.wait_for(
+                lambda: bool(self._segments) or self._ended, timeout
+            )
+
+    def has_segments(self) -> bool:
+        with self._ready:
+            return bool(self._segments)
+
+    def playlist(self) -> str:
+        with self._ready:
+            segments = list(self._segments)
+            discontinuity_sequence = self._discontinuity_sequence
+            ended = self._ended
+
+        target_duration = math.ceil(
+            max([self.segment_duration, *(s.duration for s in segments)])
+        )
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:7",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].sequence if segments else 0}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{discontinuity_sequence}",
+        ]
+        init = None
+        for segment in segments:
+            if segment.discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            if segment.init != init:
+                # The reconnected stream comes with an init segment of its own
+                init = segment.init
+                lines.append(f'#EXT-X-MAP:URI="init_{init}.mp4"')
+            lines.append(f"#EXTINF:{segment.duration:.3f},")
+            lines.append(f"segment_{segment.sequence}.m4s")
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def init_segment(self, number: int) -> bytes | None:
+        with self._ready:
+            return self._inits.get(number)
+
+    def segment(self, sequence: int) -> bytes | None:
+        with self._ready:
+            for segment in self._segments:
+                if segment.sequence == sequence:
+                    return segment.data
+        return None
+
+    def _run(self) -> None:
+        try:
+            attempt = 0
+            while not self._should_stop():
+                try:
+                    received = self._remux()
+                except av.FFmpegError as e:
+                    self.logger.error(f"HLS remux failed for {self.camera_id}: {e}")
+                    received = False
+                self._flush_segment()
+                if self._should_stop():
+                    break
+                if received:
+                    attempt = 0
+                    # The next muxer starts its timestamps over
+                    self._discontinuity = True
+                if not self._wait_to_reconnect(attempt):
+                    break
+                attempt += 1
+        finally:
+            self._flush_segment()
+            with self._ready:
+                self._ended = True
+                self._ready.notify_all()
+            self.logger.info(f"Stopped HLS remux for {self.camera_id}")
+            self._on_stopped(self)
+
+    def _should_stop(self) -> bool:
+        return self._stop_event.is_set() or self.is_idle()
+
+    def _wait_to_reconnect(self, attempt: int) -> bool:
+        """Back off before reconnect `attempt`; False if the stream stopped meanwhile."""
+        delay = min(
+            self.reconnect_delay * 2 ** min(attempt, 16), self.max_reconnect_delay
+        )
+        delay = random.uniform(delay / 2, delay)  # nosec B311
+        self.logger.warning(
+            f"HLS source of {self.camera_id} lost, reconnecting in {delay:.1f}s"
+        )
+        return not self._stop_event.wait(delay) and not self.is_idle()
+
+    def _remux(self) -> bool:
+        """Remux the camera stream until it ends; return whether it had any packets."""
+        options = (
+            {"rtsp_transport": "tcp"} if self.stream_uri.startswith("rtsp") else {}
+        )
+        received = False
+        with av.open(
+            self.stream_uri, options=options, timeout=SOURCE_TIMEOUT
+        ) as source:
+            video = source.streams.video[0]
+            writer = FragmentedMp4Writer(self._on_init, self._on_fragment)
+            with av.open(
+                writer, "w", format="mp4", options=FRAGMENTED_MP4_OPTIONS
+            ) as output:
+                stream = output.add_stream_from_template(video)
+                if video.codec_context.name == "hevc":
+                    # The tag players such as Safari expect for H.265 in fMP4
+                    stream.codec_tag = "hvc1"
+
+                self.logger.info(
+                    f"Started HLS remux for {self.camera_id} "
+                    f"({video.codec_context.name})"
+                )
+                keyframe_pts = end_pts = None
+                time_base = video.time_base
+                for packet in source.demux(video):
+                    if self._should_stop():
+                        break
+                    if packet.size == 0:
+                        # Demuxers signal the end of the stream with an empty packet
+                        continue
+                    pts = packet.pts if packet.pts is not None else packet.dts
+                    if pts is None:
+                        # Raw streams, and some cameras, leave timestamps unset; the
+                        # packet follows on from the previous one
+                        pts = end_pts or 0
+                    packet.pts = pts
+                    if packet.dts is None:
+                        packet.dts = pts
+                    time_base = packet.time_base
+                    if packet.is_keyframe:
+                        if keyframe_pts is not None:
+                            self._durations.append(
+                                float((pts - keyframe_pts) * time_base)
+                            )
+                        keyframe_pts = pts
+                    elif keyframe_pts is None:
+                        # Fragments have to start on a keyframe
+                        continue
+                    end_pts = pts + (packet.duration or 0)
+                    packet.stream = stream
+                    output.mux(packet)
+                    received = True
+
+                if keyframe_pts is not None and end_pts is not None and time_base:
+                    # The last fragment is written when the output is closed
+                    self._durations.append(float((end_pts - keyframe_pts) * time_base))
+        return received
+
+    def _on_init(self, data: bytes) -> None:
+        with self._ready:
+            self._init_number += 1
+            self._inits[self._init_number] = data
+
+    def _on_fragment(self, data: bytes) -> None:
+        self._pending.append(data)
+        self._pending_duration += self._durations.popleft() if self._durations else 0.0
+        if self._pending_duration >= self.segment_duration:
+            self._flush_segment()
+
+    def _flush_segment(self) -> None:
+        if not self._pending:
+            return
+        segment = HlsSegment(
+            self._sequence,
+            self._pending_duration,
+            b"".join(self._pending),
+            self._init_number,
+            self._discontinuity,
+        )
+        self._sequence += 1
+        self._pending = []
+        self._pending_duration = 0.0
+        self._discontinuity = False
+        with self._ready:
+            if (
+                len(self._segments) == self._segments.maxlen
+                and self._segments[0].discontinuity
+            ):
+                self._discontinuity_sequence += 1
+            self._segments.append(segment)
+            # Init segments are dropped with the last segment muxed with them
+            oldest = self._segments[0].init
+            for number in [number for number in self._inits if number < oldest]:
+                del self._inits[number]
+            self._ready.notify_all()
+
+
+class HlsService(IHlsService):
+    """
+    Service running one HLS remux per camera while players request it.
+    """
+
+    _streams: dict[str, HlsStream] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _running: bool = PrivateAttr(default=False)
+
+    async def start(self) -> None:
+        with self._lock:
+            self._running = True
+
+    async def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            streams = list(self._streams.values())
+            self._streams.clear()
+
+        await asyncio.gather(
+            *(asyncio.to_thread(stream.stop, SOURCE_TIMEOUT) for stream in streams)
+        )
+
+    async def get_playlist(self, camera_id: str, stream_uri: str) -> str:
+        if not HAS_PYAV:
+            raise RuntimeError("HLS output requires PyAV, install the hls extra")
+
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("HLS service is not running")
+            stream = self._streams.get(camera_id)
+            if stream is None:
+                stream = HlsStream(
+                    camera_id,
+                    stream_uri,
+                    self.segment_duration,
+                    self.window_size,
+                    self.idle_timeout,
+                    self.logger,
+                    self._on_stream_stopped,
+                    self.reconnect_delay,
+                    self.max_reconnect_delay,
+                )
+                self._streams[camera_id] = stream
+                stream.start()
+
+        stream.touch()
+        await asyncio.to_thread(stream.wait_ready, FIRST_SEGMENT_TIMEOUT)
+        if not stream.has_segments():
+            raise ValueError(f"No HLS segments available for camera {camera_id}")
+        return stream.playlist()
+
+    def _get_stream(self, camera_id: str) -> HlsStream:
+        with self._lock:
+            stream = self._streams.get(camera_id)
+        if stream is None:
+            raise ValueError(f"HLS stream for camera {camera_id} not found")
+        stream.touch()
+        return stream
+
+    def get_init_segment(self, camera_id: str, number: int) -> bytes:
+        init = self._get_stream(camera_id).init_segment(number)
+        if init is None:
+            raise ValueError(
+                f"HLS init segment {number} for camera {camera_id} not found"
+            )
+        return init
+
+    def get_segment(self, camera_id: str, sequence: int) -> bytes:
+        segment = self._get_stream(camera_id).segment(sequence)
+        if segment is None:
+            raise ValueError(f"HLS segment {sequence} for camera {camera_id} not found")
+        return segment
+
+    def _on_stream_stopped(self, stream: HlsStream) -> None:
+        with self._lock:
+            if self._streams.get(stream.camera_id) is stream:
+                del self._streams[stream.camera_id]
@@ -0,0 +1,316 @@
+import math
+import threading
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator, Sequence
+
+from app.schemas.stream import FrameSourceStats
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds in seconds
+ENCODE_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.1, 0.25)
+SOAP_DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Variant label of a camera's own capture loop
+SOURCE_VARIANT = "source"
+# Profile label of a camera's default media profile
+DEFAULT_PROFILE = ""
+
+
+class Counter:
+    """
+    A value that only goes up
+
+    Updates take no lock, they are a single attribute increment on the hot path. Most
+    series are only ever updated by one thread, e.g. a camera's capture loop; where
+    several threads share one, an increment racing another can in rare cases be lost,
+    which is an acceptable error for monitoring.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def render(self, name: str, labels: dict[str, str]) -> Iterator[str]:
+        yield f"{name}{_labels(labels)} {_value(self.value)}"
+
+
+class Gauge:
+    """A value that is set when the metrics are collected."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value: float = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self, name: str, labels: dict[str, str]) -> Iterator[str]:
+        yield f"{name}{_labels(labels)} {_value(self.value)}"
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets
+
+    Observing a value increments one preallocated bucket count, lock-free like
+    `Counter`. The counts are only made cumulative when they are rendered.
+    """
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # One count per bucket, plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name: str, labels: dict[str, str]) -> Iterator[str]:
+        # Copied first, so the buckets and count add up even while values come in
+        counts = list(self.counts)
+        total = 0
+        for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+            total += count
+            yield f"{name}_bucket{_labels({**labels, 'le': _value(bound)})} {total}"
+        yield f"{name}_sum{_labels(labels)} {_value(self.sum)}"
+        yield f"{name}_count{_labels(labels)} {total}"
+
+
+class MetricFamily[T: Counter | Gauge | Histogram]:
+    """
+    A metric and its series, one per combination of label values
+
+    Looking up a series allocates, so hot paths look theirs up once and keep it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        labelnames: Sequence[str],
+        factory: Callable[[], T],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._series: dict[tuple[str, ...], T] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str) -> T:
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            with self._lock:
+                series = self._series.setdefault(values, self._factory())
+        return series
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {_escape_help(self.documentation)}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        with self._lock:
+            series = list(self._series.items())
+        for values, metric in series:
+            yield from metric.render(
+                self.name, dict(zip(self.labelnames, values, strict=True))
+            )
+
+
+class MetricsRegistry:
+    """The metrics exported by the application, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._families: list[MetricFamily] = []
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str]
+    ) -> MetricFamily[Counter]:
+        return self._register(
+            MetricFamily(name, documentation, "counter", labelnames, Counter)
+        )
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float],
+    ) -> MetricFamily[Histogram]:
+        return self._register(
+            MetricFamily(
+                name, documentation, "histogram", labelnames, lambda: Histogram(buckets)
+            )
+        )
+
+    def _register[T: Counter | Gauge | Histogram](
+        self, family: MetricFamily[T]
+    ) -> MetricFamily[T]:
+        self._families.append(family)
+        return family
+
+    def render(self, collected: Iterable[MetricFamily] = ()) -> str:
+        """Render every registered metric, plus ones collected just for this scrape."""
+        lines: list[str] = []
+        for family in (*self._families, *collected):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def _escape_label(value: str) -> str:
+    return _escape_help(value).replace('"', r"\"")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+    return repr(value)
+
+
+REGISTRY = MetricsRegistry()
+
+STREAM_FRAMES = REGISTRY.counter(
+    "onvif_stream_frames_total",
+    "Frames read from the camera, plus those produced by its stream variants",
+    ("camera", "profile"),
+)
+STREAM_DROPPED_FRAMES = REGISTRY.counter(
+    "onvif_stream_dropped_frames_total",
+    "Frames replaced by a newer one before a subscriber picked them up",
+    ("camera", "profile"),
+)
+STREAM_SENT_BYTES = REGISTRY.counter(
+    "onvif_stream_sent_bytes_total",
+    "MJPEG bytes sent to viewers",
+    ("camera", "profile"),
+)
+STREAM_OUTAGES = REGISTRY.counter(
+    "onvif_stream_outages_total",
+    "Times a running camera stream was lost",
+    ("camera",),
+)
+STREAM_OUTAGE_SECONDS = REGISTRY.counter(
+    "onvif_stream_outage_seconds_total",
+    "Time camera streams spent reconnecting",
+    ("camera",),
+)
+STREAM_RECONNECTS = REGISTRY.counter(
+    "onvif_stream_reconnects_total",
+    "Attempts to reconnect a lost camera stream",
+    ("camera",),
+)
+STREAM_ENCODE_SECONDS = REGISTRY.histogram(
+    "onvif_stream_encode_seconds",
+    "Time to JPEG encode a frame",
+    ("camera", "profile"),
+    ENCODE_TIME_BUCKETS,
+)
+SOAP_REQUEST_SECONDS = REGISTRY.histogram(
+    "onvif_soap_request_duration_seconds",
+    "Duration of ONVIF SOAP calls to the camera",
+    ("camera", "operation"),
+    SOAP_DURATION_BUCKETS,
+)
+SOAP_ERRORS = REGISTRY.counter(
+    "onvif_soap_errors_total",
+    "ONVIF SOAP calls that failed",
+    ("camera", "operation"),
+)
+
+
+def profile_label(profile: str | None) -> str:
+    return DEFAULT_PROFILE if profile is None else profile
+
+
+class StreamMetrics:
+    """
+    The series a frame source updates, looked up once when the source starts
+
+    Series are never removed, so they are labelled by camera and media profile only,
+    which are both fixed by the configured cameras. The stream variants of a profile,
+    started and stopped as viewers ask for them, share its series.
+    """
+
+    __slots__ = ("dropped_frames", "encode_time", "frames")
+
+    def __init__(self, camera_id: str, profile: str | None = None):
+        label = profile_label(profile)
+        self.frames = STREAM_FRAMES.labels(camera_id, label)
+        self.dropped_frames = STREAM_DROPPED_FRAMES.labels(camera_id, label)
+        self.encode_time = STREAM_ENCODE_SECONDS.labels(camera_id, label)
+
+
+def collect_stream_gauges(
+    stats: Iterable[FrameSourceStats],
+) -> list[MetricFamily[Gauge]]:
+    """
+    Frame rate, subscriber and reconnect gauges of the running frame sources
+
+    The families are built anew for every scrape, so the gauges of a stopped stream
+    variant disappear with it.
+    """
+    fps: MetricFamily[Gauge] = MetricFamily(
+        "onvif_stream_fps",
+        "Frames per second read from the camera, or produced by a stream variant",
+        "gauge",
+        ("camera", "profile", "variant"),
+        Gauge,
+    )
+    subscribers: MetricFamily[Gauge] = MetricFamily(
+        "onvif_stream_subscribers",
+        "Viewers subscribed to a running stream",
+        "gauge",
+        ("camera", "profile", "variant"),
+        Gauge,
+    )
+    reconnecting: MetricFamily[Gauge] = MetricFamily(
+        "onvif_stream_reconnecting",
+        "Whether a running camera stream is currently reconnecting",
+        "gauge",
+        ("camera",),
+        Gauge,
+    )
+    for camera in stats:
+        sources = (camera, *camera.profiles)
+        reconnecting.labels(camera.camera_id).set(
+            int(any(source.reconnecting for source in sources))
+        )
+        for source in sources:
+            labels = (source.camera_id, profile_label(source.profile))
+            fps.labels(*labels, SOURCE_VARIANT).set(source.fps)
+            # Every running variant is subscribed to the camera's own stream too
+            subscribers.labels(*labels, SOURCE_VARIANT).set(
+                len(source.subscribers) - len(source.variants)
+            )
+            for variant in source.variants:
+                name = variant.variant or SOURCE_VARIANT
+                fps.labels(*labels, name).set(variant.fps)
+                subscribers.labels(*labels, name).set(len(variant.subscribers))
+    return [fps, subscribers, reconnecting]
@@ -0,0 +1,137 @@
+import functools
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from app.services.metrics import Histogram
+
+if TYPE_CHECKING:
+    from collections.abc import Buffer
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MEDIA_TYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+MJPEG_PART_HEADER = f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n\r\n".encode()
+MJPEG_PART_TRAILER = b"\r\n"
+
+PLACEHOLDER_SIZE = (640, 360)
+
+
+def build_mjpeg_chunk(jpeg: "Buffer") -> bytes:
+    """Build a complete multipart/x-mixed-replace part around JPEG data in a single copy."""
+    return b"".join((MJPEG_PART_HEADER, jpeg, MJPEG_PART_TRAILER))
+
+
+def chunk_jpeg(chunk: bytes) -> memoryview:
+    """The JPEG data of a multipart chunk, as a view without copying it."""
+    return memoryview(chunk)[len(MJPEG_PART_HEADER) : -len(MJPEG_PART_TRAILER)]
+
+
+@functools.cache
+def placeholder_chunk(text: str = "Reconnecting...") -> bytes:
+    """Multipart chunk of a blank frame showing `text`, encoded once per process."""
+    width, height = PLACEHOLDER_SIZE
+    image = np.full((height, width, 3), 32, np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    (text_width, text_height), _ = cv2.getTextSize(text, font, 1.0, 2)
+    origin = ((width - text_width) // 2, (height + text_height) // 2)
+    cv2.putText(image, text, origin, font, 1.0, (200, 200, 200), 2, cv2.LINE_AA)
+    _, jpeg = cv2.imencode(".jpg", image)
+    return build_mjpeg_chunk(jpeg)
+
+
+class Frame:
+    """
+    A decoded frame shared by all subscribers of a camera
+
+    The JPEG encoding and multipart chunk are built lazily, at most once, by whichever
+    subscriber asks first. Every other subscriber gets the same immutable bytes object.
+    Frames that arrive already encoded decode their image the same way, only when a
+    subscriber needs the pixels.
+    """
+
+    __slots__ = ("_chunk", "_encode_time", "_image", "_lock", "quality", "timestamp")
+
+    def __init__(
+        self,
+        image: np.ndarray | None,
+        timestamp: float | None = None,
+        quality: int | None = None,
+        encode_time: Histogram | None = None,
+    ):
+        self._image = image
+        # Monotonic time the frame was captured, to measure how far viewers lag behind
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        # JPEG quality, OpenCV's default when not set
+        self.quality = quality
+        self._chunk: bytes | None = None
+        self._lock = threading.Lock()
+        # Where the time to encode the frame is recorded, if anywhere
+        self._encode_time = encode_time
+
+    @classmethod
+    def from_mjpeg_chunk(cls, chunk: bytes, timestamp: float) -> "Frame":
+        """Wrap a multipart chunk that was encoded elsewhere, e.g. by a decoder process."""
+        frame = cls(None, timestamp)
+        frame._chunk = chunk
+        return frame
+
+    @classmethod
+    def from_jpeg(cls, jpeg: "Buffer", timestamp: float | None = None) -> "Frame":
+        """Wrap a JPEG image as received from the camera, without re-encoding it."""
+        frame = cls(None, timestamp)
+        frame._chunk = build_mjpeg_chunk(jpeg)
+        return frame
+
+    @property
+    def encoded(self) -> bool:
+        """Whether the multipart chunk is built already, so `mjpeg_chunk()` won't block."""
+        return self._chunk is not None
+
+    @property
+    def image(self) -> np.ndarray | None:
+        """The decoded image, or None if an encoded frame can't be decoded."""
+        image = self._image
+        if image is None:
+            jpeg = self.jpeg()
+            with self._lock:
+                image = self._image
+                if image is None and jpeg is not None:
+                    image = cv2.imdecode(
+                        np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR
+                    )
+                    self._image = image
+        return image
+
+    def mjpeg_chunk(self) -> bytes | None:
+        """Return the prebuilt multipart chunk, or None if the frame can't be encoded."""
+        chunk = self._chunk
+        if chunk is None:
+            with self._lock:
+                chunk = self._chunk
+                if chunk is None:
+                    chunk = self._chunk = self._encode()
+        return chunk or None
+
+    def _encode(self) -> bytes:
+        # Only frames wrapping an encoded chunk come without an image
+        if self._image is None:
+            return b""
+        params = (
+            [cv2.IMWRITE_JPEG_QUALITY, self.quality] if self.quality is not None else []
+        )
+        start = time.perf_counter()
+        ret, jpeg = cv2.imencode(".jpg", self._image, params)
+        if self._encode_time is not None:
+            self._encode_time.observe(time.perf_counter() - start)
+        return build_mjpeg_chunk(jpeg) if ret else b""
+
+    def jpeg(self) -> memoryview | None:
+        """Return the encoded JPEG as a view into the shared multipart chunk."""
+        chunk = self.mjpeg_chunk()
+        if chunk is None:
+            return None
+        return chunk_jpeg(chunk)
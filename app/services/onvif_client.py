@@ -0,0 +1,199 @@
+import threading
+import time
+
+import requests
+from onvif import ONVIFCamera, ONVIFError, ONVIFService
+from onvif.client import UsernameDigestTokenDtDiff
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+from zeep import Client, Settings
+from zeep.exceptions import Fault
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+from app.core.config import OnvifSettings
+from app.core.exceptions import ServiceClosedError
+from app.services.metrics import SOAP_ERRORS, SOAP_REQUEST_SECONDS
+
+# Errors of a failed request to a camera. onvif-zeep wraps those of SOAP calls in
+# ONVIFError, creating the clients and fetching snapshots raise the others, and a
+# camera disconnected by the registry raises ServiceClosedError
+ONVIF_ERRORS = (
+    ONVIFError,
+    Fault,
+    requests.RequestException,
+    OSError,
+    TimeoutError,
+    ServiceClosedError,
+)
+
+
+class ThreadSafeUsernameToken(UsernameDigestTokenDtDiff):
+    """
+    WS-Security UsernameToken that can be shared by concurrent SOAP calls
+
+    `UsernameDigestTokenDtDiff.apply` temporarily overwrites `self.created`, so two
+    threads signing at the same time can leave a stale timestamp behind for every
+    following request. Signing is serialised; it's a few microseconds of hashing.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def apply(self, envelope, headers):
+        with self._lock:
+            return super().apply(envelope, headers)
+
+
+def create_session(settings: OnvifSettings) -> requests.Session:
+    """
+    Create an HTTP session with a bounded pool of keep-alive connections to the camera
+
+    The pool blocks instead of opening extra connections once it is exhausted. HTTP
+    digest auth keeps its nonce per thread, so each pooled worker answers the camera's
+    challenge once and reuses it for the following requests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.onvif_camera_pool_size,
+        pool_block=True,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.auth = HTTPDigestAuth(
+        settings.onvif_camera_user,
+        settings.onvif_camera_password.get_secret_value(),
+    )
+    return session
+
+
+def create_transport(settings: OnvifSettings, session: requests.Session) -> Transport:
+    return Transport(
+        session=session,
+        timeout=settings.onvif_camera_timeout,
+        operation_timeout=settings.onvif_camera_timeout,
+    )
+
+
+_documents: dict[str, Document] = {}
+_documents_lock = threading.Lock()
+
+
+def _zeep_settings() -> Settings:
+    # Same settings onvif-zeep uses for its own clients
+    return Settings(strict=False, xml_huge_tree=True)
+
+
+def load_wsdl_document(path: str) -> Document:
+    """
+    Parse a WSDL file once per process
+
+    The parsed document only describes the service, it doesn't hold the connection, so
+    every camera shares it instead of re-parsing the same schemas for each service.
+    """
+    with _documents_lock:
+        document = _documents.get(path)
+        if document is None:
+            # Local files need no connection; the transport's session is closed as
+            # soon as the document and the schemas it imports are parsed
+            transport = Transport()
+            try:
+                document = Document(
+                    path,
+                    transport,  # type: ignore[arg-type]  # zeep annotates it as a class
+                    settings=_zeep_settings(),
+                )
+            finally:
+                transport.session.close()
+            _documents[path] = document
+        return document
+
+
+class InstrumentedONVIFService(ONVIFService):
+    """ONVIF service recording the duration and failures of its SOAP calls per operation"""
+
+    def __init__(self, *args, camera_id: str, **kwargs):
+        self.camera_id = camera_id
+        super().__init__(*args, **kwargs)
+
+    def service_wrapper(self, func):
+        call = super().service_wrapper(func)
+        operation = getattr(func, "_op_name", None) or func.__name__
+        duration = SOAP_REQUEST_SECONDS.labels(self.camera_id, operation)
+        errors = SOAP_ERRORS.labels(self.camera_id, operation)
+
+        def timed(params=None, callback=None):
+            start = time.perf_counter()
+            try:
+                return call(params, callback)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+
+        return timed
+
+
+class PooledONVIFCamera(ONVIFCamera):
+    """
+    ONVIF camera client tuned for concurrent use
+
+    Every service shares the camera's transport and its connection pool, reuses the
+    process-wide parsed WSDL documents and signs requests with a thread-safe token.
+    SOAP calls are timed for the metrics, labelled with `camera_id`.
+    """
+
+    def __init__(self, camera_id: str, *args, **kwargs):
+        # Set first, the device management service is created while connecting
+        self.camera_id = camera_id
+        super().__init__(*args, **kwargs)
+
+    def create_onvif_service(self, name, from_template=True, portType=None):
+        name = name.lower()
+        xaddr, wsdl_file, binding_name = self.get_definition(name, portType)
+        zeep_client = Client(
+            wsdl=load_wsdl_document(wsdl_file),
+            wsse=ThreadSafeUsernameToken(
+                self.user, self.passwd, dt_diff=self.dt_diff, use_digest=self.encrypt
+            ),
+            transport=self.transport,
+            settings=_zeep_settings(),
+        )
+
+        with self.services_lock:
+            service = InstrumentedONVIFService(
+                xaddr,
+                self.user,
+                self.passwd,
+                wsdl_file,
+                self.encrypt,
+                self.daemon,
+                zeep_client=zeep_client,
+                no_cache=self.no_cache,
+                portType=portType,
+                dt_diff=self.dt_diff,
+                binding_name=binding_name,
+                transport=self.transport,
+                camera_id=self.camera_id,
+            )
+            self.services[name] = service
+            setattr(self, name, service)
+
+        return service
+
+
+def create_camera(
+    camera_id: str, settings: OnvifSettings, transport: Transport
+) -> ONVIFCamera:
+    """Create an ONVIF camera client whose services all share one transport."""
+    return PooledONVIFCamera(
+        camera_id,
+        settings.onvif_camera_ip_address,
+        settings.onvif_camera_port,
+        settings.onvif_camera_user,
+        settings.onvif_camera_password.get_secret_value(),
+        transport=transport,
+    )
@@ -1,52 +1,319 @@
-from functools import cached_property
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, TypeVar
 from urllib.parse import urlparse, urlunparse
 
+import requests
 from onvif import ONVIFCamera
+from pydantic import ConfigDict, PrivateAttr
+from zeep.transports import Transport
+
 from app.contracts.services.onvif_service import IOnvifService
-from time import sleep
+from app.core.enums import Status
+from app.core.exceptions import ServiceClosedError
+from app.core.types import (
+    PanVelocityType,
+    PTZDurationType,
+    TiltVelocityType,
+    ZoomVelocityType,
+)
+from app.schemas.health import ComponentHealth
+from app.schemas.ptz import PTZCommandStats, PTZMove
+from app.schemas.stream import MediaProfile
+from app.services.onvif_client import (
+    ONVIF_ERRORS,
+    create_camera,
+    create_session,
+    create_transport,
+)
+from app.services.preset_index import PresetIndex
+from app.services.ptz_command_queue import PTZCommandQueue
+from app.services.snapshot_cache import SnapshotCache
+from app.utils.properties import locked_cached_property
+
+T = TypeVar("T")
+
+# How long a sequence step keeps moving past its slot, so the next step replaces it
+# before its Stop is due and the camera doesn't halt between steps
+SEQUENCE_STEP_OVERLAP = 0.5
+# Ports of stream URIs that don't name one
+DEFAULT_STREAM_PORTS = {"rtsp": 554, "rtsps": 322, "http": 80, "https": 443}
 
-from app.core.types import PanVelocityType, TiltVelocityType, ZoomVelocityType
+
+def describe_profile(profile: Any, default: bool = False) -> MediaProfile:
+    """Summarize an ONVIF media profile; profiles without a video encoder have no video."""
+    config = getattr(profile, "VideoEncoderConfiguration", None)
+    resolution = getattr(config, "Resolution", None)
+    rate_control = getattr(config, "RateControl", None)
+    return MediaProfile(
+        token=profile.token,
+        name=getattr(profile, "Name", None),
+        # E.g. JPEG, MPEG4 or H264
+        encoding=getattr(config, "Encoding", None),
+        width=getattr(resolution, "Width", None),
+        height=getattr(resolution, "Height", None),
+        fps=getattr(rate_control, "FrameRateLimit", None),
+        default=default,
+    )
 
 
 class OnvifService(IOnvifService):
-    @cached_property
-    def camera(self) -> ONVIFCamera:
-        return ONVIFCamera(
-            self.onvif_settings.onvif_camera_ip_address,
-            self.onvif_settings.onvif_camera_port,
-            self.onvif_settings.onvif_camera_user,
-            self.onvif_settings.onvif_camera_password.get_secret_value(),
+    """
+    ONVIF service with non-blocking SOAP calls
+
+    The onvif-zeep client is synchronous, so every SOAP call runs on a small per-camera
+    executor, sized like the keep-alive connection pool it shares. Concurrent API calls
+    overlap instead of serializing on the event loop, and connections and auth state
+    are reused between calls.
+
+    Media profiles and their stream URIs are resolved once and cached, so a new
+    viewer costs no SOAP call. The first profile, usually the camera's main stream, is
+    the default one and the one used for PTZ and snapshots.
+    """
+
+    _closed: bool = PrivateAttr(default=False)
+    _command_queue: PTZCommandQueue | None = PrivateAttr(default=None)
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+    _preset_indexes: dict[str, PresetIndex] = PrivateAttr(default_factory=dict)
+    _preset_lock: asyncio.Lock = PrivateAttr(default_factory=asyncio.Lock)
+    _snapshot_cache: SnapshotCache | None = PrivateAttr(default=None)
+    # Authorized stream URIs by profile token, under None for the default profile
+    _stream_uris: dict[str | None, str] = PrivateAttr(default_factory=dict)
+
+    model_config = ConfigDict(ignored_types=(locked_cached_property,))
+
+    def model_post_init(self, context: Any) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.onvif_settings.onvif_camera_pool_size,
+            thread_name_prefix=f"onvif-{self.onvif_settings.onvif_camera_ip_address}",
+        )
+        self._command_queue = PTZCommandQueue(
+            send_move=partial(self._call, self._send_continuous_move),
+            send_stop=partial(self._call, self._send_stop),
+            logger=self.logger,
         )
+        self._snapshot_cache = SnapshotCache(
+            ttl=self.onvif_settings.onvif_camera_snapshot_cache_ttl,
+            fetch=partial(self._call, self._fetch_snapshot),
+        )
+
+    @locked_cached_property
+    def session(self) -> requests.Session:
+        return create_session(self.onvif_settings)
+
+    @locked_cached_property
+    def transport(self) -> Transport:
+        return create_transport(self.onvif_settings, self.session)
+
+    @locked_cached_property
+    def camera(self) -> ONVIFCamera:
+        return create_camera(self.camera_id, self.onvif_settings, self.transport)
 
-    @cached_property
+    @locked_cached_property
     def ptz(self):
         return self.camera.create_ptz_service()
 
-    @cached_property
+    @locked_cached_property
     def media(self):
         return self.camera.create_media_service()
 
-    @cached_property
+    @locked_cached_property
+    def media_profiles(self) -> list:
+        return self.media.GetProfiles()
+
+    @locked_cached_property
     def media_profile(self):
-        return self.media.GetProfiles()[0]
+        return self.media_profiles[0]
+
+    @locked_cached_property
+    def profiles(self) -> dict[str, MediaProfile]:
+        return {
+            profile.token: describe_profile(profile, default=index == 0)
+            for index, profile in enumerate(self.media_profiles)
+        }
+
+    @locked_cached_property
+    def snapshot_uri(self) -> str:
+        return self._get_snapshot_uri()
+
+    async def connect(self) -> None:
+        """Create the camera clients and resolve the media profile ahead of the first request."""
+        await self._call(self._connect)
 
-    def get_snapshot_uri(self) -> str:
+    def _connect(self) -> None:
+        self.media_profile  # noqa: B018
+        self.ptz  # noqa: B018
+
+    async def _call(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking SOAP call on the camera's executor."""
+        if self._closed:
+            raise ServiceClosedError(f"Camera {self.camera_id} is disconnected")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def close(self) -> None:
+        # The command queue stops the camera first, which still needs the executor
+        if self._command_queue is not None:
+            await self._command_queue.close()
+        self._closed = True
+        if self._snapshot_cache is not None:
+            self._snapshot_cache.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if "session" in self.__dict__:
+            self.session.close()
+
+    async def check_health(self) -> ComponentHealth:
+        """
+        Probe the camera with a cheap SOAP call and a connection to its stream port.
+
+        GetSystemDateAndTime needs no media profile or PTZ state, so it only tells
+        whether the camera answers SOAP requests. The cached stream URI is used, it is
+        only asked for before the first one is cached, and the RTSP server is only
+        checked to accept TCP connections.
+        """
+        timeout = self.onvif_settings.onvif_camera_timeout
+        start = time.perf_counter()
+        try:
+            await self._call(self._get_system_date_and_time)
+            uri = urlparse(await self.get_stream_uri())
+        except ONVIF_ERRORS as e:
+            return ComponentHealth(
+                status=Status.DOWN,
+                details={"error": f"ONVIF request failed: {e}"},
+                responseTime=time.perf_counter() - start,
+            )
+
+        details: dict[str, Any] = {"onvif": "ok"}
+        # E.g. a file the stream is read from instead of a camera has no host
+        if uri.hostname is not None:
+            port = uri.port or DEFAULT_STREAM_PORTS.get(uri.scheme, 554)
+            address = f"{uri.hostname}:{port}"
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(uri.hostname, port), timeout
+                )
+            except (OSError, TimeoutError) as e:
+                return ComponentHealth(
+                    status=Status.DOWN,
+                    details={
+                        **details,
+                        "error": f"Stream {address} unreachable: {e!r}",
+                    },
+                    responseTime=time.perf_counter() - start,
+                )
+            writer.close()
+            details["stream"] = address
+
+        return ComponentHealth(
+            status=Status.UP,
+            details=details,
+            responseTime=time.perf_counter() - start,
+        )
+
+    def _get_system_date_and_time(self) -> None:
+        self.camera.devicemgmt.GetSystemDateAndTime()
+
+    async def get_snapshot_uri(self) -> str:
+        return await self._call(self._get_snapshot_uri)
+
+    def _get_snapshot_uri(self) -> str:
         uri = self.media.GetSnapshotUri({"ProfileToken": self.media_profile.token})
         self.logger.debug(f"Snapshot URI: {uri.Uri}")
         return uri.Uri
 
-    def get_stream_uri(self) -> str:
+    async def get_snapshot(self) -> bytes:
+        """
+        Fetch a JPEG snapshot from the camera's snapshot URI.
+
+        Snapshots are cached for a short while and concurrent callers share a single
+        request, which goes over the camera's pooled, authenticated session.
+        """
+        assert self._snapshot_cache is not None  # nosec B101
+        return await self._snapshot_cache.get()
+
+    def _fetch_snapshot(self) -> bytes:
+        response = self.session.get(
+            self.snapshot_uri, timeout=self.onvif_settings.onvif_camera_timeout
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def get_video_encoding(self) -> str | None:
+        return await self._call(self._get_video_encoding)
+
+    def _get_video_encoding(self) -> str | None:
+        return self.profiles[self.media_profile.token].encoding
+
+    async def get_profiles(self) -> list[MediaProfile]:
+        return await self._call(self._get_profiles)
+
+    def _get_profiles(self) -> list[MediaProfile]:
+        return list(self.profiles.values())
+
+    async def select_profile(
+        self, token: str | None = None, width: int | None = None
+    ) -> MediaProfile:
+        """
+        Pick the media profile to stream, by token or by the width it is watched at.
+
+        For a width, the narrowest video profile at least that wide is picked, so a
+        small viewer decodes the camera's substream rather than downscaling its main
+        stream. Without either, or if no profile is wide enough, the default profile.
+        """
+        return await self._call(self._select_profile, token, width)
+
+    def _select_profile(self, token: str | None, width: int | None) -> MediaProfile:
+        profiles = self.profiles
+        if token is not None:
+            if token not in profiles:
+                raise ValueError(f"Media profile {token} not found")
+            return profiles[token]
+
+        default = profiles[self.media_profile.token]
+        if width is None:
+            return default
+        wide_enough = [
+            profile
+            for profile in profiles.values()
+            if profile.encoding is not None
+            and profile.width is not None
+            and profile.width >= width
+        ]
+        return min(wide_enough, key=lambda profile: profile.width or 0, default=default)
+
+    async def get_stream_uri(
+        self, profile_token: str | None = None, refresh: bool = False
+    ) -> str:
+        """
+        The authorized stream URI of a media profile, the default one if not given
+
+        URIs are cached; `refresh` asks the camera again, e.g. once the cached one
+        stopped working.
+        """
+        if not refresh and (uri := self._stream_uris.get(profile_token)) is not None:
+            return uri
+        uri = await self._call(self._get_stream_uri, profile_token)
+        self._stream_uris[profile_token] = uri
+        return uri
+
+    def _request_stream_uri(self, profile_token: str | None = None) -> str:
         stream = self.media.GetStreamUri(
             {
                 "StreamSetup": {
                     "Stream": "RTP-Unicast",
                     "Transport": {"Protocol": "RTSP"},
                 },
-                "ProfileToken": self.media_profile.token,
+                "ProfileToken": profile_token or self.media_profile.token,
             }
         )
+        return stream.Uri
 
-        uri = stream.Uri
+    def _get_stream_uri(self, profile_token: str | None = None) -> str:
+        uri = self._request_stream_uri(profile_token)
         parsed = urlparse(uri)
 
         # Add username and password to the netloc part: username:password@host:port
@@ -69,9 +336,7 @@ class OnvifService(IOnvifService):
         self.logger.debug(f"Stream URI: {authorized_uri}")
         return authorized_uri
 
-    def _continuous_move(
-        self, pan: float = 0.0, tilt: float = 0.0, zoom: float = 0.0, timeout: float = 1
-    ):
+    def _send_continuous_move(self, pan: float, tilt: float, zoom: float) -> None:
         request = self.ptz.create_type("ContinuousMove")
         request.ProfileToken = self.media_profile.token
         request.Velocity = {
@@ -89,94 +354,243 @@ class OnvifService(IOnvifService):
             f"ContinuousMove request: pan={pan}, tilt={tilt}, zoom={zoom}"
         )
         self.ptz.ContinuousMove(request)
-        sleep(timeout)
-        self.ptz.Stop({"ProfileToken": request.ProfileToken})
+
+    def _send_stop(self) -> None:
+        self.ptz.Stop({"ProfileToken": self.media_profile.token})
         self.logger.debug("Stopped continuous move")
 
-    def move_pan(self, pan_velocity: PanVelocityType):
-        self._continuous_move(pan=pan_velocity)
+    async def _continuous_move(
+        self,
+        pan: float = 0.0,
+        tilt: float = 0.0,
+        zoom: float = 0.0,
+        timeout: float = 1,
+        wait: bool = False,
+    ):
+        """
+        Start a continuous move and schedule a Stop on the event loop after `timeout` seconds.
+
+        Moves go through the camera's command queue: a newer move replaces the pending
+        Stop and any move not sent yet. With `wait` the call returns once the move is
+        over, because it was stopped or replaced.
+        """
+        assert self._command_queue is not None  # nosec B101
+        await self._command_queue.move((pan, tilt, zoom), timeout, wait=wait)
+
+    async def stop(self):
+        assert self._command_queue is not None  # nosec B101
+        await self._command_queue.stop()
+
+    def get_ptz_stats(self) -> PTZCommandStats:
+        assert self._command_queue is not None  # nosec B101
+        return self._command_queue.stats()
+
+    async def move(
+        self,
+        pan_velocity: PanVelocityType = 0.0,
+        tilt_velocity: TiltVelocityType = 0.0,
+        zoom_velocity: ZoomVelocityType = 0.0,
+        duration: PTZDurationType = 1.0,
+        wait: bool = False,
+    ):
+        """Move along all axes at once with a single ContinuousMove for `duration` seconds."""
+        await self._continuous_move(
+            pan=pan_velocity,
+            tilt=tilt_velocity,
+            zoom=zoom_velocity,
+            timeout=duration,
+            wait=wait,
+        )
+
+    async def run_sequence(self, steps: list[PTZMove]) -> None:
+        """
+        Run timed vector moves back to back and return once the last one is over.
+
+        Each step starts when the previous one is due to end, without a Stop in
+        between. Steps are scheduled against the event loop clock, so the time it takes
+        to send a move doesn't add up over the sequence. The camera is stopped if the
+        sequence fails or is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        try:
+            for step in steps[:-1]:
+                await self.move(
+                    step.pan_velocity,
+                    step.tilt_velocity,
+                    step.zoom_velocity,
+                    duration=step.duration + SEQUENCE_STEP_OVERLAP,
+                )
+                deadline += step.duration
+                await asyncio.sleep(max(deadline - loop.time(), 0))
+
+            last = steps[-1]
+            await self.move(
+                last.pan_velocity,
+                last.tilt_velocity,
+                last.zoom_velocity,
+                duration=max(deadline + last.duration - loop.time(), 0.01),
+                wait=True,
+            )
+        except BaseException:
+            try:
+                await self.stop()
+            except ONVIF_ERRORS as e:
+                self.logger.error(f"Failed to stop PTZ sequence: {e}")
+            raise
+
+    async def move_pan(self, pan_velocity: PanVelocityType, wait: bool = False):
+        await self._continuous_move(pan=pan_velocity, wait=wait)
 
-    def move_tilt(self, tilt_velocity: TiltVelocityType):
-        self._continuous_move(tilt=tilt_velocity)
+    async def move_tilt(self, tilt_velocity: TiltVelocityType, wait: bool = False):
+        await self._continuous_move(tilt=tilt_velocity, wait=wait)
 
-    def move_zoom(self, zoom_velocity: ZoomVelocityType):
-        self._continuous_move(zoom=zoom_velocity)
+    async def move_zoom(self, zoom_velocity: ZoomVelocityType, wait: bool = False):
+        await self._continuous_move(zoom=zoom_velocity, wait=wait)
 
-    def move_left(self, velocity: PanVelocityType | None = None):
+    async def move_left(
+        self, velocity: PanVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.pan_velocity
-        self.move_pan(pan_velocity=-velocity)
+        await self.move_pan(pan_velocity=-velocity, wait=wait)
 
-    def move_right(self, velocity: PanVelocityType | None = None):
+    async def move_right(
+        self, velocity: PanVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.pan_velocity
-        self.move_pan(pan_velocity=velocity)
+        await self.move_pan(pan_velocity=velocity, wait=wait)
 
-    def move_up(self, velocity: TiltVelocityType | None = None):
+    async def move_up(
+        self, velocity: TiltVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.tilt_velocity
-        self.move_tilt(tilt_velocity=velocity)
+        await self.move_tilt(tilt_velocity=velocity, wait=wait)
 
-    def move_down(self, velocity: TiltVelocityType | None = None):
+    async def move_down(
+        self, velocity: TiltVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.tilt_velocity
-        self.move_tilt(tilt_velocity=-velocity)
+        await self.move_tilt(tilt_velocity=-velocity, wait=wait)
 
-    def zoom_in(self, velocity: ZoomVelocityType | None = None):
+    async def zoom_in(
+        self, velocity: ZoomVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.zoom_velocity
-        self.move_zoom(zoom_velocity=velocity)
+        await self.move_zoom(zoom_velocity=velocity, wait=wait)
 
-    def zoom_out(self, velocity: ZoomVelocityType | None = None):
+    async def zoom_out(
+        self, velocity: ZoomVelocityType | None = None, wait: bool = False
+    ):
         if velocity is None:
             velocity = self.ptz_settings.zoom_velocity
-        self.move_zoom(zoom_velocity=-velocity)
+        await self.move_zoom(zoom_velocity=-velocity, wait=wait)
+
+    def _get_profile_token(self) -> str:
+        return self.media_profile.token
+
+    def _get_presets(self) -> list:
+        return self.ptz.GetPresets({"ProfileToken": self.media_profile.token})
+
+    async def _get_preset_index(
+        self, refresh: bool = False
+    ) -> tuple[PresetIndex, bool]:
+        """
+        Return the preset index of the active profile and whether it was just fetched.
+
+        The index is only fetched from the camera when it is stale or `refresh` is set.
+        """
+        profile_token = await self._call(self._get_profile_token)
+        index = self._preset_indexes.get(profile_token)
+        if index is None:
+            index = PresetIndex(ttl=self.ptz_settings.preset_cache_ttl)
+            self._preset_indexes[profile_token] = index
 
-    def list_presets(self) -> list[str]:
-        presets = self.ptz.GetPresets({"ProfileToken": self.media_profile.token})
-        return [preset.Name for preset in presets]
+        async with self._preset_lock:
+            # Another request may have refreshed the index while we were waiting
+            if refresh or not index.is_fresh:
+                presets = await self._call(self._get_presets)
+                index.replace(
+                    (preset.Name, preset.token) for preset in presets if preset.Name
+                )
+                return index, True
+        return index, False
 
-    def delete_preset(self, preset_name: str):
-        preset_token = self.get_preset_token(preset_name)
+    async def list_presets(self) -> list[str]:
+        index, _ = await self._get_preset_index()
+        return index.names()
+
+    async def delete_preset(self, preset_name: str):
+        index, _ = await self._get_preset_index()
+        preset_token = await self.get_preset_token(preset_name)
+        try:
+            await self._call(self._remove_preset, preset_token)
+        except Exception:
+            index.invalidate()
+            raise
+        index.remove(preset_name)
+        self.logger.debug(f"Preset {preset_name} deleted")
+
+    def _remove_preset(self, preset_token: str) -> None:
         request = self.ptz.create_type("RemovePreset")
         request.ProfileToken = self.media_profile.token
         request.PresetToken = preset_token
         self.ptz.RemovePreset(request)
-        self.logger.debug(f"Preset {preset_name} deleted")
 
-    def get_preset_details(self) -> list[dict]:
+    async def get_preset_details(self) -> list[dict]:
         """Get detailed information about all presets including name and token."""
-        presets = self.ptz.GetPresets({"ProfileToken": self.media_profile.token})
-        return [{"name": preset.Name, "token": preset.token} for preset in presets]
-
-    def get_preset_token(self, preset_name: str) -> str:
-        """Get the token for a preset by name."""
-        presets = self.ptz.GetPresets({"ProfileToken": self.media_profile.token})
-        for preset in presets:
-            if preset.Name == preset_name:
-                return preset.token
-        raise ValueError(f"Preset {preset_name} not found")
-
-    def goto_preset(self, preset_name: str):
-        preset_token = self.get_preset_token(preset_name)
+        index, _ = await self._get_preset_index()
+        return [{"name": name, "token": token} for name, token in index.items()]
+
+    async def get_preset_token(self, preset_name: str) -> str:
+        """Get the token for a preset by name, refreshing the index once on a miss."""
+        index, fetched = await self._get_preset_index()
+        preset_token = index.get(preset_name)
+        if preset_token is None and not fetched:
+            index, _ = await self._get_preset_index(refresh=True)
+            preset_token = index.get(preset_name)
+        if preset_token is None:
+            raise ValueError(f"Preset {preset_name} not found")
+        return preset_token
+
+    async def goto_preset(self, preset_name: str):
+        preset_token = await self.get_preset_token(preset_name)
+        try:
+            await self._call(self._goto_preset, preset_token)
+        except Exception:
+            # The preset may have been removed from the camera behind our back
+            index, _ = await self._get_preset_index()
+            index.invalidate()
+            raise
+
+    def _goto_preset(self, preset_token: str) -> None:
         request = self.ptz.create_type("GotoPreset")
         request.ProfileToken = self.media_profile.token
         request.PresetToken = preset_token
         self.ptz.GotoPreset(request)
 
-    def set_preset(self, preset_name: str):
+    async def set_preset(self, preset_name: str):
         # Check if preset already exists
-        if preset_name in self.list_presets():
+        index, _ = await self._get_preset_index()
+        if index.get(preset_name) is not None:
             raise ValueError(
                 f"Preset {preset_name} already exists. Please delete it first."
             )
 
+        preset_token = await self._call(self._set_preset, preset_name)
+        index.set(preset_name, preset_token)
+        self.logger.debug(f"Preset {preset_name} set")
+
+    def _set_preset(self, preset_name: str) -> str:
         # SetPreset requires a PresetToken, which should be None for creating new presets
-        self.ptz.SetPreset(
+        return self.ptz.SetPreset(
             {
                 "ProfileToken": self.media_profile.token,
                 "PresetName": preset_name,
                 "PresetToken": None,
             }
         )
-        self.logger.debug(f"Preset {preset_name} set")
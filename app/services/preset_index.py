@@ -0,0 +1,46 @@
+import time
+from collections.abc import Iterable
+
+
+class PresetIndex:
+    """
+    In-memory preset name → token index for one camera profile
+
+    The index is filled from a `GetPresets` call and considered fresh for `ttl`
+    seconds. Writes done through the API update it directly, so they don't need
+    another round trip to the camera.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._tokens: dict[str, str] = {}
+        self._fetched_at: float | None = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            self._fetched_at is not None
+            and time.monotonic() - self._fetched_at < self.ttl
+        )
+
+    def replace(self, presets: Iterable[tuple[str, str]]) -> None:
+        self._tokens = dict(presets)
+        self._fetched_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._fetched_at = None
+
+    def get(self, name: str) -> str | None:
+        return self._tokens.get(name)
+
+    def set(self, name: str, token: str) -> None:
+        self._tokens[name] = token
+
+    def remove(self, name: str) -> None:
+        self._tokens.pop(name, None)
+
+    def names(self) -> list[str]:
+        return list(self._tokens)
+
+    def items(self) -> list[tuple[str, str]]:
+        return list(self._tokens.items())
@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.core.exceptions import ServiceClosedError
+from app.core.types import LoggerType
+from app.schemas.ptz import PTZCommandStats
+
+Velocity = tuple[float, float, float]
+
+
+@dataclass(eq=False)
+class _Move:
+    velocity: Velocity
+    sent: asyncio.Future[None]
+    # Only created for a caller waiting for the move to be over
+    finished: asyncio.Future[None] | None
+
+
+def _resolve(future: asyncio.Future[None] | None) -> None:
+    if future is not None and not future.done():
+        future.set_result(None)
+
+
+def _fail(future: asyncio.Future[None] | None, error: BaseException) -> None:
+    if future is not None and not future.done():
+        future.set_exception(error)
+
+
+def _closed_error() -> ServiceClosedError:
+    return ServiceClosedError("PTZ command queue is closed")
+
+
+class PTZCommandQueue:
+    """
+    Per-camera PTZ command queue where the latest velocity wins
+
+    A single worker sends commands to the camera one at a time. Moves submitted while
+    another is in flight replace each other, so only the newest one is sent
+    (coalesced). A move whose velocity is already applied isn't re-sent, it only
+    extends the deadline of the scheduled Stop (dropped). Stop discards any pending
+    move and is handled before it. Closing the queue fails every command still
+    waiting, later ones raise ServiceClosedError.
+    """
+
+    def __init__(
+        self,
+        send_move: Callable[[float, float, float], Awaitable[None]],
+        send_stop: Callable[[], Awaitable[None]],
+        logger: LoggerType,
+    ):
+        self._send_move = send_move
+        self._send_stop = send_stop
+        self.logger = logger
+
+        self._pending: _Move | None = None
+        self._active: _Move | None = None
+        self._velocity: Velocity | None = None
+        self._stop_requested = False
+        self._stop_waiters: list[asyncio.Future[None]] = []
+        self._stop_timer: asyncio.TimerHandle | None = None
+        self._wake = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._closed = False
+
+        self._submitted = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._stops = 0
+
+    def stats(self) -> PTZCommandStats:
+        return PTZCommandStats(
+            submitted=self._submitted,
+            sent=self._sent,
+            coalesced=self._coalesced,
+            dropped=self._dropped,
+            stops=self._stops,
+        )
+
+    async def move(self, velocity: Velocity, duration: float, wait: bool = False):
+        """
+        Queue a continuous move and schedule a Stop after `duration` seconds.
+
+        Returns once the move has been sent, coalesced or dropped. With `wait` it
+        returns once the move is over, because it was stopped or replaced.
+        """
+        if self._closed:
+            raise _closed_error()
+        loop = asyncio.get_running_loop()
+        move = _Move(
+            velocity, loop.create_future(), loop.create_future() if wait else None
+        )
+        self._submitted += 1
+
+        if self._pending is not None:
+            self._coalesced += 1
+            self._finish(self._pending)
+        self._pending = move
+
+        self._cancel_stop_timer()
+        self._stop_timer = loop.call_later(duration, self._on_stop_timer)
+        self._wake_worker()
+
+        await move.sent
+        if move.finished is not None:
+            await move.finished
+
+    async def stop(self) -> None:
+        """Stop the camera now, discarding any move that hasn't been sent yet."""
+        if self._closed:
+            raise _closed_error()
+        if self._pending is not None:
+            self._dropped += 1
+            self._finish(self._pending)
+            self._pending = None
+        self._cancel_stop_timer()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._stop_waiters.append(waiter)
+        self._stop_requested = True
+        self._wake_worker()
+        await waiter
+
+    async def close(self) -> None:
+        """Stop the camera if it may be moving, and fail the commands still waiting."""
+        if self._closed:
+            return
+        self._closed = True
+        self._cancel_stop_timer()
+        moving = self._velocity is not None or self._pending is not None
+        if self._worker is not None:
+            # A command being sent fails its waiters when it is cancelled
+            self._worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+
+        # A caller whose move failed to be sent doesn't wait for it to be over
+        error = _closed_error()
+        if self._pending is not None:
+            _fail(self._pending.sent, error)
+            _resolve(self._pending.finished)
+            self._pending = None
+        if self._active is not None:
+            _fail(self._active.finished, error)
+            self._active = None
+        for waiter in self._stop_waiters:
+            _fail(waiter, error)
+        self._stop_waiters = []
+
+        # Don't leave the camera moving when it is disconnected before its Stop is due
+        if moving:
+            try:
+                await self._send_stop()
+            except Exception as e:  # noqa: BLE001 - closing goes on whatever stopping raised
+                self.logger.error(f"Failed to stop continuous move: {e}")
+
+    def _wake_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._wake.set()
+
+    def _cancel_stop_timer(self) -> None:
+        if self._stop_timer is not None:
+            self._stop_timer.cancel()
+            self._stop_timer = None
+
+    def _on_stop_timer(self) -> None:
+        self._stop_timer = None
+        # A move still waiting to be sent has outlived its duration already
+        if self._pending is not None:
+            self._dropped += 1
+            self._finish(self._pending)
+            self._pending = None
+        self._stop_requested = True
+        self._wake.set()
+
+    def _finish(self, move: _Move) -> None:
+        _resolve(move.sent)
+        _resolve(move.finished)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+
+            if self._stop_requested:
+                await self._process_stop()
+            if self._pending is not None:
+                await self._process_move()
+
+    async def _process_stop(self) -> None:
+        self._stop_requested = False
+        waiters, self._stop_waiters = self._stop_waiters, []
+        try:
+            await self._send_stop()
+        except asyncio.CancelledError:
+            for waiter in waiters:
+                _fail(waiter, _closed_error())
+            raise
+        except Exception as e:  # noqa: BLE001 - handed to the waiters, which would hang
+            self.logger.error(f"Failed to stop continuous move: {e}")
+            for waiter in waiters:
+                _fail(waiter, e)
+            return
+
+        self._stops += 1
+        self._velocity = None
+        if self._active is not None:
+            self._finish(self._active)
+            self._active = None
+        for waiter in waiters:
+            _resolve(waiter)
+
+    async def _process_move(self) -> None:
+        move, self._pending = self._pending, None
+        assert move is not None  # nosec B101
+
+        if move.velocity == self._velocity:
+            self._dropped += 1
+        else:
+            try:
+                await self._send_move(*move.velocity)
+            except asyncio.CancelledError:
+                _fail(move.sent, _closed_error())
+                _resolve(move.finished)
+                raise
+            except Exception as e:  # noqa: BLE001 - handed to the mover, which would hang
+                _fail(move.sent, e)
+                _resolve(move.finished)
+                return
+            self._sent += 1
+            self._velocity = move.velocity
+
+        if self._active is not None:
+            self._finish(self._active)
+        self._active = move
+        _resolve(move.sent)
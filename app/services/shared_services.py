@@ -1,7 +1,9 @@
 from pydantic import BaseModel, ConfigDict
 
+from app.contracts.services.camera_registry import ICameraRegistry
+from app.contracts.services.frame_broker import IFrameBrokerService
 from app.contracts.services.health_check import IHealthCheckService
-from app.contracts.services.onvif_service import IOnvifService
+from app.contracts.services.hls import IHlsService
 
 
 class SharedServices(BaseModel):
@@ -14,14 +16,23 @@ class SharedServices(BaseModel):
     """
 
     health_check_service: IHealthCheckService
-    onvif_service: IOnvifService
+    camera_registry: ICameraRegistry
+    frame_broker: IFrameBrokerService
+    hls_service: IHlsService
 
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     async def initialize(self) -> None:
         """Initialize the services"""
-        pass
+        await self.frame_broker.start()
+        await self.hls_service.start()
+        await self.camera_registry.warm_up()
+        await self.frame_broker.start_always_warm(self.camera_registry)
+        await self.health_check_service.start()
 
     async def cleanup(self) -> None:
         """Cleanup the services"""
-        pass
+        await self.health_check_service.stop()
+        await self.hls_service.stop()
+        await self.frame_broker.stop()
+        await self.camera_registry.close()
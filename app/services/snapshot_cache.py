@@ -0,0 +1,48 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+
+class SnapshotCache:
+    """
+    Latest snapshot fetched from one camera, served from memory for `ttl` seconds
+
+    Concurrent requests for a stale snapshot share a single fetch from the camera
+    instead of each opening their own request.
+    """
+
+    def __init__(self, ttl: float, fetch: Callable[[], Awaitable[bytes]]):
+        self.ttl = ttl
+        self._fetch = fetch
+        self._snapshot: bytes | None = None
+        self._fetched_at: float | None = None
+        self._inflight: asyncio.Task[bytes] | None = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            self._fetched_at is not None
+            and time.monotonic() - self._fetched_at < self.ttl
+        )
+
+    async def get(self) -> bytes:
+        if self._snapshot is not None and self.is_fresh:
+            return self._snapshot
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._refresh())
+        # A cancelled request must not cancel the fetch other requests are waiting for
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self) -> bytes:
+        try:
+            snapshot = await self._fetch()
+        finally:
+            self._inflight = None
+        self._snapshot = snapshot
+        self._fetched_at = time.monotonic()
+        return snapshot
+
+    def close(self) -> None:
+        if self._inflight is not None:
+            self._inflight.cancel()
+            self._inflight = None
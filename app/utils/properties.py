@@ -0,0 +1,33 @@
+import threading
+from functools import cached_property
+from typing import Any
+
+_LOCK_KEY = "__locked_cached_property_lock__"
+
+
+class locked_cached_property(cached_property):
+    """
+    A `cached_property` that computes its value at most once, even across threads
+
+    The standard `cached_property` has no locking, so two threads hitting a cold
+    property both run the (possibly slow) getter. Each instance gets its own re-entrant
+    lock, so properties depending on each other can be resolved while holding it and
+    separate instances never wait on each other.
+    """
+
+    def __get__(self, instance: Any, owner: type | None = None) -> Any:
+        if instance is None:
+            return self
+
+        cache = instance.__dict__
+        try:
+            return cache[self.attrname]
+        except KeyError:
+            pass
+
+        lock = cache.setdefault(_LOCK_KEY, threading.RLock())
+        with lock:
+            try:
+                return cache[self.attrname]
+            except KeyError:
+                return super().__get__(instance, owner)
@@ -0,0 +1,180 @@
+"""Helpers shared by the benchmarks: API subprocesses, resource usage and results."""
+
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess  # nosec B404
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Awaitable, Callable, Sequence
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from fastapi import FastAPI
+
+SERVER_START_TIMEOUT = 30.0
+
+
+def summarize(samples: Sequence[float]) -> dict[str, float]:
+    """Mean and percentiles of a list of samples, all 0 when there are none."""
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def parse_counts(value: str) -> list[int]:
+    """Parse a comma separated ramp, e.g. `1,2,4,8`."""
+    return [int(count) for count in value.split(",")]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_usage(pid: int) -> tuple[float, float]:
+    """CPU seconds used so far and resident memory in MiB of a process (Linux only)."""
+    with open(f"/proc/{pid}/stat") as f:
+        # Skip past the command name, which may contain spaces
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    return cpu, rss
+
+
+def fetch_json(port: int, path: str) -> Any:
+    with urllib.request.urlopen(  # nosec B310
+        f"http://127.0.0.1:{port}{path}", timeout=10
+    ) as response:
+        return json.load(response)
+
+
+def start_process(module: str, *args: str) -> subprocess.Popen:
+    """Run a benchmark module in a subprocess with the same interpreter."""
+    return subprocess.Popen([sys.executable, "-m", module, *args])  # nosec B603
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    process.wait()
+
+
+def wait_for_server(process: subprocess.Popen, port: int, path: str = "/") -> None:
+    """Wait until a subprocess answers HTTP requests on `port`."""
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(  # nosec B310
+                f"http://127.0.0.1:{port}{path}", timeout=1
+            ):
+                return
+        except urllib.error.HTTPError:
+            # Answering at all is enough, e.g. the fake camera's 404 for GET /
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Process didn't answer on port {port} in time")
+
+
+def create_benchmark_app(
+    cameras: dict[str, dict[str, Any]],
+    on_startup: Callable[[], Awaitable[None]] | None = None,
+    on_shutdown: Callable[[], Awaitable[None]] | None = None,
+    **environment: str,
+) -> FastAPI:
+    """
+    Create the API for a benchmark's API process
+
+    The cameras and any further settings are passed through the environment, like in
+    production. The hooks run inside the app's lifespan, after its own services have
+    started and before they stop.
+    """
+    os.environ["CAMERAS"] = json.dumps(cameras)
+    os.environ.update(environment)
+
+    from app.core.app_factory import create_app
+    from app.core.config import Settings
+
+    app = create_app(Settings())  # type: ignore[call-arg]
+    # Per-request logging would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with app_lifespan(app):
+            if on_startup is not None:
+                await on_startup()
+            try:
+                yield
+            finally:
+                if on_shutdown is not None:
+                    await on_shutdown()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+def environment_info() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(
+    path: Path, benchmark: str, config: dict[str, Any], steps: list[dict]
+) -> dict[str, Any]:
+    results = {
+        "benchmark": benchmark,
+        "created_at": datetime.now(UTC).isoformat(),
+        "config": config,
+        "environment": environment_info(),
+        "steps": steps,
+    }
+    path.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {path}")
+    return results
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    key: str,
+    metrics: Sequence[tuple[str, Callable[[dict], float]]],
+) -> None:
+    """Print how each ramp step, matched on `key`, changed against a previous run."""
+    previous = {step[key]: step for step in baseline["steps"]}
+    print("\nChange against baseline:")
+    for step in results["steps"]:
+        before = previous.get(step[key])
+        if before is None:
+            continue
+        changes = []
+        for name, metric in metrics:
+            old, new = metric(before), metric(step)
+            change = (new - old) / old * 100 if old else 0.0
+            changes.append(f"{name} {change:+.1f}%")
+        print(f"{step[key]:>4} {key}: " + ", ".join(changes))
@@ -0,0 +1,340 @@
+"""
+Local stand-in for an ONVIF camera
+
+Implements the Device, Media and PTZ SOAP operations used by `OnvifService` with a
+configurable response latency and failure rate, so the API can be exercised and
+benchmarked without a physical camera.
+
+    python -m benchmarks.fake_onvif_camera --port 8080 --latency 0.05 --failure-rate 0.01
+"""
+
+import argparse
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import cv2
+import numpy as np
+
+SOAP_ENV = "http://www.w3.org/2003/05/soap-envelope"
+NAMESPACES = {
+    "tds": "http://www.onvif.org/ver10/device/wsdl",
+    "trt": "http://www.onvif.org/ver10/media/wsdl",
+    "tptz": "http://www.onvif.org/ver20/ptz/wsdl",
+    "tt": "http://www.onvif.org/ver10/schema",
+}
+
+DEVICE_PATH = "/onvif/device_service"
+MEDIA_PATH = "/onvif/media_service"
+PTZ_PATH = "/onvif/ptz_service"
+
+# Grey 320x240 still served from the snapshot URI
+SNAPSHOT_JPEG = cv2.imencode(".jpg", np.full((240, 320, 3), 128, np.uint8))[1].tobytes()
+
+
+@dataclass
+class FakeProfile:
+    token: str
+    name: str
+    encoding: str = "H264"
+    width: int = 1920
+    height: int = 1080
+    frame_rate: int = 25
+    stream_uri: str = "rtsp://127.0.0.1:8554/stream"
+
+
+@dataclass
+class FakeCameraState:
+    """Mutable camera state shared by all request handler threads."""
+
+    profiles: list[FakeProfile]
+    snapshot_uri: str = ""
+    latency: float = 0.0
+    failure_rate: float = 0.0
+    presets: dict[str, str] = field(default_factory=dict)
+    velocity: tuple[float, float, float] = (0.0, 0.0, 0.0)
+    calls: dict[str, int] = field(default_factory=dict)
+    connections: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    _next_preset: int = 1
+
+    def record(self, operation: str) -> None:
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def add_preset(self, name: str) -> str:
+        with self.lock:
+            token = f"preset_{self._next_preset}"
+            self._next_preset += 1
+            self.presets[token] = name
+            return token
+
+
+def _envelope(body: str) -> bytes:
+    namespaces = " ".join(f'xmlns:{p}="{ns}"' for p, ns in NAMESPACES.items())
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<s:Envelope xmlns:s="{SOAP_ENV}" {namespaces}><s:Body>{body}</s:Body></s:Envelope>'
+    ).encode()
+
+
+def _fault(reason: str) -> bytes:
+    return _envelope(
+        "<s:Fault><s:Code><s:Value>s:Receiver</s:Value></s:Code>"
+        f'<s:Reason><s:Text xml:lang="en">{escape(reason)}</s:Text></s:Reason></s:Fault>'
+    )
+
+
+def _text(body: ElementTree.Element, local_name: str) -> str | None:
+    for element in body.iter():
+        if element.tag.rsplit("}", 1)[-1] == local_name:
+            return element.text
+    return None
+
+
+def _float_attr(body: ElementTree.Element, local_name: str, attr: str) -> float:
+    for element in body.iter():
+        if element.tag.rsplit("}", 1)[-1] == local_name:
+            return float(element.get(attr, 0.0))
+    return 0.0
+
+
+class FakeOnvifHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ThreadingHTTPServer
+    state: FakeCameraState
+
+    def setup(self) -> None:
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/snapshot.jpg":
+            self.send_error(404)
+            return
+        self.state.record("Snapshot")
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(SNAPSHOT_JPEG)))
+        self.end_headers()
+        self.wfile.write(SNAPSHOT_JPEG)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        envelope = ElementTree.fromstring(self.rfile.read(length))
+        body = envelope.find(f"{{{SOAP_ENV}}}Body")
+        request = body[0] if body is not None and len(body) else None
+        operation = request.tag.rsplit("}", 1)[-1] if request is not None else ""
+        self.state.record(operation)
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        if random.random() < self.state.failure_rate:  # nosec B311
+            self._send(500, _fault(f"Injected failure for {operation}"))
+            return
+
+        handler = getattr(self, f"_op_{operation}", None)
+        if handler is None or request is None:
+            self._send(500, _fault(f"Unsupported operation {operation}"))
+            return
+        try:
+            status, response = 200, _envelope(handler(request))
+        except KeyError as e:
+            status, response = 500, _fault(f"Unknown token {e}")
+        self._send(status, response)
+
+    def _send(self, status: int, payload: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/soap+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @property
+    def _base_url(self) -> str:
+        host = self.headers.get("Host") or f"127.0.0.1:{self.server.server_port}"
+        return f"http://{host}"
+
+    # ─────────────────────────────── Device ───────────────────────────────
+    def _op_GetCapabilities(self, request) -> str:
+        return (
+            "<tds:GetCapabilitiesResponse><tds:Capabilities>"
+            f"<tt:Device><tt:XAddr>{self._base_url}{DEVICE_PATH}</tt:XAddr></tt:Device>"
+            f"<tt:Media><tt:XAddr>{self._base_url}{MEDIA_PATH}</tt:XAddr></tt:Media>"
+            f"<tt:PTZ><tt:XAddr>{self._base_url}{PTZ_PATH}</tt:XAddr></tt:PTZ>"
+            "</tds:Capabilities></tds:GetCapabilitiesResponse>"
+        )
+
+    def _op_GetSystemDateAndTime(self, request) -> str:
+        now = time.gmtime()
+        return (
+            "<tds:GetSystemDateAndTimeResponse><tds:SystemDateAndTime>"
+            "<tt:DateTimeType>Manual</tt:DateTimeType>"
+            "<tt:DaylightSavings>false</tt:DaylightSavings>"
+            "<tt:UTCDateTime>"
+            f"<tt:Time><tt:Hour>{now.tm_hour}</tt:Hour><tt:Minute>{now.tm_min}</tt:Minute>"
+            f"<tt:Second>{now.tm_sec}</tt:Second></tt:Time>"
+            f"<tt:Date><tt:Year>{now.tm_year}</tt:Year><tt:Month>{now.tm_mon}</tt:Month>"
+            f"<tt:Day>{now.tm_mday}</tt:Day></tt:Date>"
+            "</tt:UTCDateTime>"
+            "</tds:SystemDateAndTime></tds:GetSystemDateAndTimeResponse>"
+        )
+
+    # ─────────────────────────────── Media ───────────────────────────────
+    def _profile(self, request) -> FakeProfile:
+        token = _text(request, "ProfileToken")
+        for profile in self.state.profiles:
+            if profile.token == token:
+                return profile
+        raise KeyError(token)
+
+    def _op_GetProfiles(self, request) -> str:
+        profiles = "".join(
+            f'<trt:Profiles token="{p.token}" fixed="true">'
+            f"<tt:Name>{escape(p.name)}</tt:Name>"
+            f'<tt:VideoEncoderConfiguration token="encoder_{p.token}">'
+            f"<tt:Name>{escape(p.name)}</tt:Name><tt:UseCount>1</tt:UseCount>"
+            f"<tt:Encoding>{p.encoding}</tt:Encoding>"
+            f"<tt:Resolution><tt:Width>{p.width}</tt:Width><tt:Height>{p.height}</tt:Height></tt:Resolution>"
+            "<tt:Quality>5</tt:Quality>"
+            f"<tt:RateControl><tt:FrameRateLimit>{p.frame_rate}</tt:FrameRateLimit>"
+            "<tt:EncodingInterval>1</tt:EncodingInterval><tt:BitrateLimit>4096</tt:BitrateLimit></tt:RateControl>"
+            "</tt:VideoEncoderConfiguration>"
+            f'<tt:PTZConfiguration token="ptz_{p.token}"><tt:Name>ptz</tt:Name>'
+            "<tt:UseCount>1</tt:UseCount><tt:NodeToken>ptz_node</tt:NodeToken></tt:PTZConfiguration>"
+            "</trt:Profiles>"
+            for p in self.state.profiles
+        )
+        return f"<trt:GetProfilesResponse>{profiles}</trt:GetProfilesResponse>"
+
+    def _op_GetStreamUri(self, request) -> str:
+        profile = self._profile(request)
+        return (
+            "<trt:GetStreamUriResponse><trt:MediaUri>"
+            f"<tt:Uri>{escape(profile.stream_uri)}</tt:Uri>"
+            "<tt:InvalidAfterConnect>false</tt:InvalidAfterConnect>"
+            "<tt:InvalidAfterReboot>false</tt:InvalidAfterReboot>"
+            "<tt:Timeout>PT0S</tt:Timeout>"
+            "</trt:MediaUri></trt:GetStreamUriResponse>"
+        )
+
+    def _op_GetSnapshotUri(self, request) -> str:
+        self._profile(request)
+        uri = self.state.snapshot_uri or f"{self._base_url}/snapshot.jpg"
+        return (
+            "<trt:GetSnapshotUriResponse><trt:MediaUri>"
+            f"<tt:Uri>{escape(uri)}</tt:Uri>"
+            "<tt:InvalidAfterConnect>false</tt:InvalidAfterConnect>"
+            "<tt:InvalidAfterReboot>false</tt:InvalidAfterReboot>"
+            "<tt:Timeout>PT0S</tt:Timeout>"
+            "</trt:MediaUri></trt:GetSnapshotUriResponse>"
+        )
+
+    # ─────────────────────────────── PTZ ───────────────────────────────
+    def _op_ContinuousMove(self, request) -> str:
+        self._profile(request)
+        with self.state.lock:
+            self.state.velocity = (
+                _float_attr(request, "PanTilt", "x"),
+                _float_attr(request, "PanTilt", "y"),
+                _float_attr(request, "Zoom", "x"),
+            )
+        return "<tptz:ContinuousMoveResponse/>"
+
+    def _op_Stop(self, request) -> str:
+        self._profile(request)
+        with self.state.lock:
+            self.state.velocity = (0.0, 0.0, 0.0)
+        return "<tptz:StopResponse/>"
+
+    def _op_GetPresets(self, request) -> str:
+        self._profile(request)
+        with self.state.lock:
+            presets = list(self.state.presets.items())
+        return (
+            "<tptz:GetPresetsResponse>"
+            + "".join(
+                f'<tptz:Preset token="{token}"><tt:Name>{escape(name)}</tt:Name></tptz:Preset>'
+                for token, name in presets
+            )
+            + "</tptz:GetPresetsResponse>"
+        )
+
+    def _op_SetPreset(self, request) -> str:
+        self._profile(request)
+        name = _text(request, "PresetName") or ""
+        token = _text(request, "PresetToken")
+        if token:
+            with self.state.lock:
+                self.state.presets[token] = name
+        else:
+            token = self.state.add_preset(name)
+        return f"<tptz:SetPresetResponse><tptz:PresetToken>{token}</tptz:PresetToken></tptz:SetPresetResponse>"
+
+    def _op_GotoPreset(self, request) -> str:
+        self._profile(request)
+        token = _text(request, "PresetToken") or ""
+        with self.state.lock:
+            self.state.presets[token]
+        return "<tptz:GotoPresetResponse/>"
+
+    def _op_RemovePreset(self, request) -> str:
+        self._profile(request)
+        token = _text(request, "PresetToken") or ""
+        with self.state.lock:
+            del self.state.presets[token]
+        return "<tptz:RemovePresetResponse/>"
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    state: FakeCameraState | None = None,
+) -> tuple[ThreadingHTTPServer, FakeCameraState]:
+    """Start the fake camera on a background thread and return the server and its state."""
+    if state is None:
+        state = FakeCameraState(profiles=[FakeProfile(token="profile_1", name="main")])
+    handler = type("Handler", (FakeOnvifHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--stream-uri", default="rtsp://127.0.0.1:8554/stream")
+    args = parser.parse_args()
+
+    state = FakeCameraState(
+        profiles=[
+            FakeProfile(token="profile_1", name="main", stream_uri=args.stream_uri)
+        ],
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+    )
+    server, _ = serve(args.host, args.port, state)
+    print(f"Fake ONVIF camera listening on {args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
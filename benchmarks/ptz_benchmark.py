@@ -0,0 +1,428 @@
+"""
+PTZ and preset API load benchmark
+
+Starts the fake ONVIF camera and the API in subprocesses, then drives the
+`/api/v1/ptz/{camera_id}/*` endpoints with a ramp of concurrent workers, each sending
+a weighted mix of moves, stops and preset operations back to back. For every step of
+the ramp it reports:
+
+- requests per second and errors, in total and per operation
+- request latency percentiles, in total and per operation
+- event loop stall in the API process: how late a 10 ms timer fires, and the total
+  time the loop was blocked for longer than 20 ms
+
+Results are written as JSON, so runs can be compared for regressions with `--baseline`:
+
+    uv run python -m benchmarks.ptz_benchmark --concurrency 1,8,32 --latency 0.05
+    uv run python -m benchmarks.ptz_benchmark --failure-rate 0.01 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from pathlib import Path
+
+from benchmarks.common import (
+    compare,
+    create_benchmark_app,
+    fetch_json,
+    free_port,
+    parse_counts,
+    start_process,
+    stop_process,
+    summarize,
+    wait_for_server,
+    write_results,
+)
+
+STATS_PATH = "/benchmark/stats"
+# Event loop monitor: timer interval, and the lateness counted as a stall
+MONITOR_INTERVAL = 0.01
+STALL_THRESHOLD = 0.02
+# Presets created up front for the goto operation
+SEED_PRESETS = 5
+SEED_ATTEMPTS = 5
+DEFAULT_MIX = "move=50,stop=15,list_presets=15,goto_preset=10,set_delete_preset=10"
+MOVE_DIRECTIONS = ("left", "right", "up", "down", "zoom_in", "zoom_out")
+
+
+# ───────────────────────────────API PROCESS───────────────────────────────
+
+
+class EventLoopMonitor:
+    """Measures how late the event loop runs a periodic timer."""
+
+    def __init__(self):
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + MONITOR_INTERVAL
+            await asyncio.sleep(MONITOR_INTERVAL)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def collect(self, reset: bool) -> dict:
+        lags = self.lags
+        if reset:
+            self.lags = []
+        stalls = [lag for lag in lags if lag >= STALL_THRESHOLD]
+        return {
+            "loop_lag_ms": summarize([lag * 1000 for lag in lags]),
+            "stalls": len(stalls),
+            "stall_ms": round(sum(stalls) * 1000, 1),
+        }
+
+
+def serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    monitor = EventLoopMonitor()
+    app = create_benchmark_app(
+        {
+            f"cam{index}": {
+                "onvif_camera_ip_address": "127.0.0.1",
+                "onvif_camera_port": args.camera_port,
+                "onvif_camera_user": "benchmark",
+                "onvif_camera_password": "benchmark",
+            }
+            for index in range(args.cameras)
+        },
+        on_startup=monitor.start,
+        on_shutdown=monitor.stop,
+    )
+
+    @app.get(STATS_PATH)
+    async def get_benchmark_stats(reset: bool = False):
+        return monitor.collect(reset)
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ───────────────────────────────BENCHMARK───────────────────────────────
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client, so the load generator stays cheap."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def request(self, method: str, path: str) -> int:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                "127.0.0.1", self.port
+            )
+        assert self._reader is not None  # nosec B101
+        try:
+            self._writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                "Content-Length: 0\r\n\r\n".encode()
+            )
+            head = (await self._reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+            status = int(head.split(" ", 2)[1])
+            headers = {
+                name.strip().lower(): value.strip()
+                for name, _, value in (
+                    line.partition(":") for line in head.split("\r\n")[1:] if line
+                )
+            }
+            await self._reader.readexactly(int(headers.get("content-length", 0)))
+            if headers.get("connection") == "close":
+                await self.close()
+            return status
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class Recorder:
+    """Latencies and errors per operation for the current ramp step."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, operation: str, started: float, ok: bool) -> None:
+        self.latencies[operation].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[operation] += 1
+
+
+class Worker:
+    """Sends a weighted mix of PTZ operations back to back over one connection."""
+
+    def __init__(
+        self,
+        index: int,
+        port: int,
+        camera_ids: list[str],
+        mix: dict[str, int],
+        recorder: "list[Recorder]",
+    ):
+        self.index = index
+        self.connection = HttpConnection(port)
+        self.camera_ids = camera_ids
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        # Shared holder, so every worker switches to a new recorder between steps
+        self.recorder = recorder
+        self.random = random.Random(index)  # nosec B311
+        self._counter = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.connection.close()
+
+    async def _call(self, operation: str, method: str, path: str) -> None:
+        started = time.perf_counter()
+        try:
+            status = await self.connection.request(method, path)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            status = 0
+        self.recorder[0].record(operation, started, status == 200)
+
+    async def _run(self) -> None:
+        while True:
+            camera_id = self.random.choice(self.camera_ids)
+            base = f"/api/v1/ptz/{camera_id}"
+            operation = self.random.choices(self.operations, self.weights)[0]
+
+            if operation == "move":
+                direction = self.random.choice(MOVE_DIRECTIONS)
+                await self._call("move", "POST", f"{base}/{direction}?velocity=0.5")
+            elif operation == "stop":
+                await self._call("stop", "POST", f"{base}/stop")
+            elif operation == "list_presets":
+                await self._call("list_presets", "GET", f"{base}/presets")
+            elif operation == "goto_preset":
+                preset = f"bench-{self.random.randrange(SEED_PRESETS)}"
+                await self._call("goto_preset", "POST", f"{base}/preset/{preset}")
+            elif operation == "set_delete_preset":
+                self._counter += 1
+                preset = f"worker-{self.index}-{self._counter}"
+                await self._call(
+                    "set_preset", "POST", f"{base}/preset?preset_name={preset}"
+                )
+                await self._call("delete_preset", "DELETE", f"{base}/preset/{preset}")
+
+
+async def seed_presets(port: int, camera_ids: list[str]) -> None:
+    for camera_id in camera_ids:
+        base = f"/api/v1/ptz/{camera_id}"
+        for index in range(SEED_PRESETS):
+            preset = f"bench-{index}"
+            # Retried, as the fake camera may be injecting failures. A failed request
+            # may still have created the preset, so the list is checked every time.
+            for _ in range(SEED_ATTEMPTS):
+                try:
+                    presets = await asyncio.to_thread(
+                        fetch_json, port, f"{base}/presets"
+                    )
+                except OSError:
+                    continue
+                if preset in presets["presets"]:
+                    break
+                connection = HttpConnection(port)
+                try:
+                    await connection.request(
+                        "POST", f"{base}/preset?preset_name={preset}"
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    pass
+                finally:
+                    await connection.close()
+            else:
+                raise RuntimeError(f"Failed to create preset {preset} on {camera_id}")
+
+
+async def run_benchmark(port: int, args: argparse.Namespace) -> list[dict]:
+    camera_ids = [f"cam{index}" for index in range(args.cameras)]
+    await seed_presets(port, camera_ids)
+
+    recorder = [Recorder()]
+    workers: list[Worker] = []
+    steps = []
+    try:
+        for concurrency in args.concurrency:
+            while len(workers) < concurrency:
+                worker = Worker(len(workers), port, camera_ids, args.mix, recorder)
+                worker.start()
+                workers.append(worker)
+
+            await asyncio.sleep(args.warmup)
+            recorder[0] = Recorder()
+            await asyncio.to_thread(fetch_json, port, f"{STATS_PATH}?reset=true")
+            started = time.monotonic()
+            await asyncio.sleep(args.duration)
+            elapsed = time.monotonic() - started
+            step_recorder = recorder[0]
+            loop = await asyncio.to_thread(fetch_json, port, STATS_PATH)
+
+            latencies = [
+                latency
+                for samples in step_recorder.latencies.values()
+                for latency in samples
+            ]
+            step = {
+                "concurrency": concurrency,
+                "duration_s": round(elapsed, 2),
+                "requests_per_s": round(len(latencies) / elapsed, 1),
+                "errors": sum(step_recorder.errors.values()),
+                "latency_ms": summarize(latencies),
+                "operations": {
+                    operation: {
+                        "requests": len(samples),
+                        "errors": step_recorder.errors[operation],
+                        "latency_ms": summarize(samples),
+                    }
+                    for operation, samples in sorted(step_recorder.latencies.items())
+                },
+                **loop,
+            }
+            steps.append(step)
+            print(
+                f"{concurrency:>4} workers: {step['requests_per_s']:>7.1f} req/s, "
+                f"{step['errors']} errors, latency p50 {step['latency_ms']['p50']:.1f} "
+                f"p95 {step['latency_ms']['p95']:.1f} p99 {step['latency_ms']['p99']:.1f} ms, "
+                f"loop lag p99 {step['loop_lag_ms']['p99']:.1f} ms, "
+                f"stalled {step['stall_ms']:.0f} ms"
+            )
+    finally:
+        await asyncio.gather(*(worker.stop() for worker in workers))
+    return steps
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in {
+            "move",
+            "stop",
+            "list_presets",
+            "goto_preset",
+            "set_delete_preset",
+        }:
+            raise argparse.ArgumentTypeError(f"Unknown operation {operation}")
+        mix[operation] = int(weight or 1)
+    return mix
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=parse_counts,
+        default=[1, 4, 16, 64],
+        help="Comma separated worker counts to ramp through",
+    )
+    parser.add_argument("--cameras", type=int, default=1, help="Cameras to spread over")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=DEFAULT_MIX, help="Operation weights"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Fake camera response latency"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="Fake camera SOAP fault rate"
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument(
+        "--warmup", type=float, default=2.0, help="Seconds before measuring each step"
+    )
+    parser.add_argument("--output", type=Path, default=Path("ptz-benchmark.json"))
+    parser.add_argument("--baseline", type=Path, help="Previous results to compare to")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--camera-port", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    camera_port, port = free_port(), free_port()
+    camera = start_process(
+        "benchmarks.fake_onvif_camera",
+        "--port",
+        str(camera_port),
+        "--latency",
+        str(args.latency),
+        "--failure-rate",
+        str(args.failure_rate),
+    )
+    api = None
+    try:
+        wait_for_server(camera, camera_port)
+        api = start_process(
+            "benchmarks.ptz_benchmark",
+            "--serve",
+            "--port",
+            str(port),
+            "--camera-port",
+            str(camera_port),
+            "--cameras",
+            str(args.cameras),
+        )
+        wait_for_server(api, port, STATS_PATH)
+        steps = asyncio.run(run_benchmark(port, args))
+    finally:
+        if api is not None:
+            stop_process(api)
+        stop_process(camera)
+
+    config = {
+        "cameras": args.cameras,
+        "mix": args.mix,
+        "camera_latency_s": args.latency,
+        "camera_failure_rate": args.failure_rate,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+    }
+    results = write_results(args.output, "ptz", config, steps)
+
+    if args.baseline:
+        compare(
+            results,
+            json.loads(args.baseline.read_text()),
+            "concurrency",
+            (
+                ("req/s", lambda step: step["requests_per_s"]),
+                ("latency p95", lambda step: step["latency_ms"]["p95"]),
+                ("latency p99", lambda step: step["latency_ms"]["p99"]),
+                ("stall", lambda step: step["stall_ms"]),
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
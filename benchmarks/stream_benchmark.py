@@ -0,0 +1,508 @@
+"""
+Streaming throughput benchmark
+
+Runs the API in a subprocess, whose camera capture loop reads a synthetic or local
+video file in place of the camera's stream, ramps up concurrent MJPEG clients against
+the stream endpoint and reports, for every step of the ramp:
+
+- frames per second delivered, in total and per client
+- per-frame decode and JPEG encode time in the API process
+- capture-to-socket latency percentiles, from frame capture to its arrival at a client
+- CPU and RSS of the API process, in total and per client (Linux only)
+
+Results are written as JSON, so runs can be compared for regressions with `--baseline`:
+
+    uv run python -m benchmarks.stream_benchmark --clients 1,2,4,8,16 --output before.json
+    uv run python -m benchmarks.stream_benchmark --source clip.mp4 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import atexit
+import json
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from typing import cast
+
+import cv2
+import numpy as np
+
+from app.schemas.stream import MediaProfile
+from app.services.frame_broker import (
+    CameraFrameSource,
+    FrameBrokerService,
+    FrameSource,
+)
+from app.services.mjpeg import MJPEG_PART_HEADER, MJPEG_PART_TRAILER, Frame
+from benchmarks.common import (
+    compare,
+    create_benchmark_app,
+    fetch_json,
+    free_port,
+    parse_counts,
+    process_usage,
+    start_process,
+    stop_process,
+    summarize,
+    wait_for_server,
+    write_results,
+)
+
+CAMERA_ID = "bench"
+STREAM_PATH = f"/api/v1/stream/stream/{CAMERA_ID}"
+STATS_PATH = "/benchmark/stats"
+# Frames of the synthetic video the camera source loops over
+SYNTHETIC_FRAMES = 50
+
+# JPEG comment segment carrying the frame's capture time, so clients in another
+# process can measure latency against the shared monotonic clock
+_TIMESTAMP_SEGMENT = struct.Struct(">2sHd")
+_COMMENT_MARKER = b"\xff\xfe"
+_JPEG_END = b"\xff\xd9" + MJPEG_PART_TRAILER
+
+
+# ───────────────────────────────API PROCESS───────────────────────────────
+
+
+class FrameTimings:
+    """Decode and encode times recorded by the API process, reset between ramp steps."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decode: list[float] = []
+        self.encode: list[float] = []
+
+    def record(self, samples: list[float], seconds: float) -> None:
+        with self._lock:
+            samples.append(seconds * 1000)
+
+    def collect(self, reset: bool) -> dict:
+        with self._lock:
+            result = {
+                "decoded": len(self.decode),
+                "encoded": len(self.encode),
+                "decode_ms": summarize(self.decode),
+                "encode_ms": summarize(self.encode),
+            }
+            if reset:
+                self.decode = []
+                self.encode = []
+        return result
+
+
+TIMINGS = FrameTimings()
+
+
+class TimedFrame(Frame):
+    """Frame timing its JPEG encode and stamping its capture time into the JPEG."""
+
+    __slots__ = ()
+
+    def _encode(self) -> bytes:
+        start = time.perf_counter()
+        chunk = super()._encode()
+        TIMINGS.record(TIMINGS.encode, time.perf_counter() - start)
+        if not chunk:
+            return chunk
+        segment = _TIMESTAMP_SEGMENT.pack(
+            _COMMENT_MARKER, _TIMESTAMP_SEGMENT.size - 2, self.timestamp
+        )
+        # Right after the JPEG's start of image marker
+        split = len(MJPEG_PART_HEADER) + 2
+        return b"".join((chunk[:split], segment, chunk[split:]))
+
+
+class PacedCapture:
+    """
+    Capture of a local video file played back like a camera stream
+
+    Frames are grabbed at `fps` and the file is looped at its end, so the capture
+    loop never sees the stream end. The time spent grabbing and decoding every frame
+    is recorded.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, fps: float):
+        self._cap = cap
+        self._interval = 1.0 / fps
+        self._next_due = time.monotonic()
+        self._decode_time = 0.0
+
+    def isOpened(self) -> bool:
+        return self._cap.isOpened()
+
+    def grab(self) -> bool:
+        delay = self._next_due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # Can't keep up with the frame rate, carry on from now
+        self._next_due = max(self._next_due, time.monotonic()) + self._interval
+
+        start = time.perf_counter()
+        success = self._cap.grab()
+        if not success:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success = self._cap.grab()
+        self._decode_time = time.perf_counter() - start
+        return success
+
+    def retrieve(self) -> tuple[bool, np.ndarray]:
+        start = time.perf_counter()
+        success, image = self._cap.retrieve()
+        TIMINGS.record(TIMINGS.decode, self._decode_time + time.perf_counter() - start)
+        return success, image
+
+    def release(self) -> None:
+        self._cap.release()
+
+
+class BenchmarkCameraFrameSource(CameraFrameSource):
+    """The real capture loop, reading a local video file at the camera's pace."""
+
+    frame_type = TimedFrame
+    fps = 25.0
+
+    def _open_capture(self, passthrough: bool = False) -> tuple[cv2.VideoCapture, bool]:
+        cap, passthrough = super()._open_capture(passthrough)
+        return cast(cv2.VideoCapture, PacedCapture(cap, self.fps)), passthrough
+
+
+def write_synthetic_video(path: Path, width: int, height: int, fps: float) -> None:
+    """Write a short MJPEG clip of noise, so every frame costs a real decode."""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height, width, 3), np.uint8)
+    writer = cv2.VideoWriter(
+        str(path), cv2.VideoWriter.fourcc(*"MJPG"), fps, (width, height)
+    )
+    try:
+        for index in range(SYNTHETIC_FRAMES):
+            image = np.roll(base, index * 8, axis=1)
+            cv2.putText(
+                image,
+                str(index),
+                (20, height // 2),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                2,
+                (255, 255, 255),
+                3,
+            )
+            writer.write(image)
+    finally:
+        writer.release()
+
+
+class BenchmarkFrameBroker(FrameBrokerService):
+    """Frame broker capturing with `BenchmarkCameraFrameSource` from a video file."""
+
+    fps: float = 25.0
+
+    def _create_camera_source(
+        self,
+        camera_id: str,
+        stream_uri: str,
+        passthrough: bool,
+        resolve_stream_uri: Callable[[], str] | None,
+        profile: str | None = None,
+    ) -> FrameSource:
+        source = BenchmarkCameraFrameSource(
+            camera_id,
+            stream_uri,
+            self.logger,
+            self._on_source_stopped,
+            passthrough,
+            resolve_stream_uri=resolve_stream_uri,
+            reconnect_delay=self.reconnect_delay,
+            max_reconnect_delay=self.max_reconnect_delay,
+            profile=profile,
+        )
+        source.fps = self.fps
+        return source
+
+
+class BenchmarkCamera:
+    """The few ONVIF calls the stream endpoint makes, answered without a camera."""
+
+    # The video file streamed in place of the camera's RTSP stream
+    stream_uri = ""
+
+    async def select_profile(
+        self, token: str | None = None, width: int | None = None
+    ) -> MediaProfile:
+        return MediaProfile(token="benchmark", default=True)
+
+    async def get_stream_uri(
+        self, profile_token: str | None = None, refresh: bool = False
+    ) -> str:
+        return self.stream_uri
+
+    async def get_video_encoding(self) -> str | None:
+        return None
+
+
+def serve(args: argparse.Namespace) -> None:
+    import structlog
+    import uvicorn
+
+    from app.api.dependencies import get_frame_broker, get_onvif_service
+
+    if args.source:
+        BenchmarkCamera.stream_uri = args.source
+    else:
+        directory = tempfile.TemporaryDirectory()
+        atexit.register(directory.cleanup)
+        BenchmarkCamera.stream_uri = str(Path(directory.name) / "synthetic.avi")
+        write_synthetic_video(
+            Path(BenchmarkCamera.stream_uri), args.width, args.height, args.fps
+        )
+
+    broker = BenchmarkFrameBroker(fps=args.fps, logger=structlog.get_logger())
+    # The camera is registered only to satisfy the settings, it is never contacted
+    app = create_benchmark_app(
+        {
+            CAMERA_ID: {
+                "onvif_camera_ip_address": "127.0.0.1",
+                "onvif_camera_user": "benchmark",
+                "onvif_camera_password": "benchmark",
+            }
+        },
+        on_startup=broker.start,
+        on_shutdown=broker.stop,
+        CAMERA_WARMUP_TIMEOUT="0",
+    )
+    app.dependency_overrides[get_frame_broker] = lambda: broker
+    app.dependency_overrides[get_onvif_service] = BenchmarkCamera
+
+    @app.get(STATS_PATH)
+    async def get_benchmark_stats(reset: bool = False):
+        stats = broker.get_stats(CAMERA_ID)
+        return {
+            **TIMINGS.collect(reset),
+            "source_fps": stats.fps if stats else 0.0,
+        }
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ───────────────────────────────BENCHMARK───────────────────────────────
+
+
+class StreamClient:
+    """MJPEG viewer counting frames and measuring their capture-to-socket latency."""
+
+    def __init__(self, port: int, query: str):
+        self.port = port
+        self.path = f"{STREAM_PATH}?{query}" if query else STREAM_PATH
+        self.frames = 0
+        self.latencies: list[float] = []
+        self.error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def reset(self) -> None:
+        self.frames = 0
+        self.latencies = []
+
+    async def _run(self) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+            # HTTP/1.0 so the body isn't chunked and parts can be parsed as they are
+            writer.write(
+                f"GET {self.path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in status.split(b"\r\n", 1)[0]:
+                self.error = status.split(b"\r\n", 1)[0].decode()
+                return
+
+            buffer = bytearray()
+            while data := await reader.read(256 * 1024):
+                buffer += data
+                self._parse(buffer)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.error = str(e)
+        finally:
+            writer.close()
+
+    def _parse(self, buffer: bytearray) -> None:
+        while True:
+            start = buffer.find(MJPEG_PART_HEADER)
+            if start < 0:
+                return
+            end = buffer.find(_JPEG_END, start + len(MJPEG_PART_HEADER))
+            if end < 0:
+                del buffer[:start]
+                return
+
+            received = time.monotonic()
+            jpeg_start = start + len(MJPEG_PART_HEADER)
+            marker, _, timestamp = _TIMESTAMP_SEGMENT.unpack_from(
+                buffer, jpeg_start + 2
+            )
+            if marker == _COMMENT_MARKER:
+                self.latencies.append((received - timestamp) * 1000)
+            self.frames += 1
+            del buffer[: end + len(_JPEG_END)]
+
+
+def fetch_server_stats(port: int, reset: bool) -> dict:
+    return fetch_json(port, f"{STATS_PATH}?reset={str(reset).lower()}")
+
+
+async def run_step(
+    clients: list[StreamClient], pid: int, port: int, args: argparse.Namespace
+) -> dict:
+    await asyncio.sleep(args.warmup)
+    for client in clients:
+        client.reset()
+    await asyncio.to_thread(fetch_server_stats, port, True)
+    cpu_start, _ = process_usage(pid)
+    started = time.monotonic()
+
+    await asyncio.sleep(args.duration)
+
+    elapsed = time.monotonic() - started
+    cpu_end, rss = process_usage(pid)
+    server = await asyncio.to_thread(fetch_server_stats, port, False)
+
+    frames = [client.frames for client in clients]
+    latencies = [latency for client in clients for latency in client.latencies]
+    cpu_percent = (cpu_end - cpu_start) / elapsed * 100
+    return {
+        "clients": len(clients),
+        "duration_s": round(elapsed, 2),
+        "source_fps": server["source_fps"],
+        "delivered_fps": round(sum(frames) / elapsed, 2),
+        "fps_per_client": {
+            "mean": round(sum(frames) / len(frames) / elapsed, 2),
+            "min": round(min(frames) / elapsed, 2),
+        },
+        "decode_ms": server["decode_ms"],
+        "encode_ms": server["encode_ms"],
+        "latency_ms": summarize(latencies),
+        "cpu_percent": round(cpu_percent, 1),
+        "cpu_percent_per_client": round(cpu_percent / len(clients), 2),
+        "rss_mb": round(rss, 1),
+        "errors": sum(client.error is not None for client in clients),
+    }
+
+
+async def run_benchmark(pid: int, port: int, args: argparse.Namespace) -> list[dict]:
+    _, baseline_rss = process_usage(pid)
+    clients: list[StreamClient] = []
+    steps = []
+    try:
+        for count in args.clients:
+            while len(clients) < count:
+                client = StreamClient(port, args.query)
+                client.start()
+                clients.append(client)
+
+            step = await run_step(clients, pid, port, args)
+            step["rss_mb_per_client"] = round(
+                (step["rss_mb"] - baseline_rss) / len(clients), 2
+            )
+            steps.append(step)
+            print(
+                f"{count:>4} clients: {step['delivered_fps']:>8.1f} fps delivered, "
+                f"{step['fps_per_client']['min']:>5.1f} min/client, "
+                f"latency p50 {step['latency_ms']['p50']:.1f} "
+                f"p95 {step['latency_ms']['p95']:.1f} ms, "
+                f"decode {step['decode_ms']['mean']:.2f} ms, "
+                f"encode {step['encode_ms']['mean']:.2f} ms, "
+                f"CPU {step['cpu_percent']:.0f}%, RSS {step['rss_mb']:.0f} MiB"
+            )
+    finally:
+        await asyncio.gather(*(client.stop() for client in clients))
+    return steps
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--source", help="Video file to loop over, synthetic frames if not set"
+    )
+    parser.add_argument(
+        "--width", type=int, default=1280, help="Width of synthetic frames"
+    )
+    parser.add_argument(
+        "--height", type=int, default=720, help="Height of synthetic frames"
+    )
+    parser.add_argument("--fps", type=float, default=25.0, help="Source frame rate")
+    parser.add_argument(
+        "--clients",
+        type=parse_counts,
+        default=[1, 2, 4, 8, 16],
+        help="Comma separated client counts to ramp through",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument(
+        "--warmup", type=float, default=2.0, help="Seconds before measuring each step"
+    )
+    parser.add_argument(
+        "--query", default="", help="Stream query string, e.g. width=320&fps=10"
+    )
+    parser.add_argument("--output", type=Path, default=Path("stream-benchmark.json"))
+    parser.add_argument("--baseline", type=Path, help="Previous results to compare to")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    port = free_port()
+    command = ["--serve", "--port", str(port), "--width", str(args.width)]
+    command += ["--height", str(args.height), "--fps", str(args.fps)]
+    if args.source:
+        command += ["--source", str(Path(args.source).resolve())]
+
+    process = start_process("benchmarks.stream_benchmark", *command)
+    try:
+        wait_for_server(process, port, STATS_PATH)
+        steps = asyncio.run(run_benchmark(process.pid, port, args))
+    finally:
+        stop_process(process)
+
+    config = {
+        "source": args.source or "synthetic",
+        "width": args.width,
+        "height": args.height,
+        "fps": args.fps,
+        "query": args.query,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "opencv": cv2.__version__,
+    }
+    results = write_results(args.output, "stream", config, steps)
+
+    if args.baseline:
+        compare(
+            results,
+            json.loads(args.baseline.read_text()),
+            "clients",
+            (
+                ("delivered_fps", lambda step: step["delivered_fps"]),
+                ("latency p95", lambda step: step["latency_ms"]["p95"]),
+                ("encode mean", lambda step: step["encode_ms"]["mean"]),
+                ("CPU/client", lambda step: step["cpu_percent_per_client"]),
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
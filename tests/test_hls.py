@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+import structlog
+
+from app.services.hls import HlsStream
+
+av = pytest.importorskip("av")
+
+FPS = 25
+GOP = 25  # One keyframe a second
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory) -> str:
+    """A 3 second H.264 clip with a keyframe every second."""
+    path = tmp_path_factory.mktemp("hls") / "clip.mp4"
+    with av.open(str(path), "w") as output:
+        stream = output.add_stream("libx264", rate=FPS)
+        stream.width, stream.height = 160, 120
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"g": str(GOP), "keyint_min": str(GOP), "bf": "0"}
+        for index in range(3 * FPS):
+            image = np.full((120, 160, 3), index * 3 % 256, np.uint8)
+            frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+            for packet in stream.encode(frame):
+                output.mux(packet)
+        for packet in stream.encode():
+            output.mux(packet)
+    return str(path)
+
+
+def run_stream(clip: str, until) -> tuple[HlsStream, str]:
+    """Remux `clip` until `until(stream)`; return the stream and its live playlist."""
+    stopped = threading.Event()
+    stream = HlsStream(
+        "cam",
+        clip,
+        segment_duration=1.0,
+        window_size=10,
+        idle_timeout=30.0,
+        logger=structlog.get_logger(),
+        on_stopped=lambda _: stopped.set(),
+        reconnect_delay=0.05,
+        max_reconnect_delay=0.05,
+    )
+    stream.start()
+    try:
+        assert stream.wait_ready(10.0)
+        for _ in range(100):
+            if until(stream):
+                break
+            stopped.wait(0.1)
+        playlist = stream.playlist()
+    finally:
+        stream.stop(10.0)
+    assert stopped.is_set()
+    return stream, playlist
+
+
+def test_remux_cuts_segments_on_keyframes(clip):
+    stream, _ = run_stream(clip, lambda s: s.segment(2) is not None)
+
+    init = stream.init_segment(0)
+    assert init is not None
+    assert init[4:8] == b"ftyp"
+    assert b"moov" in init
+
+    playlist = stream.playlist().splitlines()
+    assert playlist[0] == "#EXTM3U"
+    assert playlist[5] == '#EXT-X-MAP:URI="init_0.mp4"'
+    durations = [
+        float(line.removeprefix("#EXTINF:").rstrip(","))
+        for line in playlist
+        if line.startswith("#EXTINF:")
+    ]
+    assert durations[:3] == pytest.approx([1.0, 1.0, 1.0], abs=0.05)
+    for sequence in range(3):
+        assert f"segment_{sequence}.m4s" in playlist
+        segment = stream.segment(sequence)
+        assert segment is not None
+        assert segment[4:8] == b"moof"
+        assert b"mdat" in segment
+
+
+def test_remux_reconnects_when_the_source_ends(clip):
+    # The clip ends after 3 segments, the next ones come from reopening it
+    stream, live_playlist = run_stream(clip, lambda s: s.segment(4) is not None)
+
+    assert stream.segment(4) is not None
+    playlist = live_playlist.splitlines()
+    assert playlist.index("#EXT-X-DISCONTINUITY") == playlist.index("segment_2.m4s") + 1
+    # The reopened clip is muxed again, with an init segment of its own
+    discontinuity = playlist.index("#EXT-X-DISCONTINUITY")
+    assert playlist[discontinuity + 1] == '#EXT-X-MAP:URI="init_1.mp4"'
+    assert stream.init_segment(0) is not None
+    assert stream.init_segment(1) is not None
+    # Only a stopped stream ends its playlist
+    assert "#EXT-X-ENDLIST" not in playlist
+    assert stream.playlist().splitlines()[-1] == "#EXT-X-ENDLIST"
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+import structlog
+
+from app.core.config import OnvifSettings, PTZSettings
+from app.services import preset_index
+from app.services.onvif_service import OnvifService
+from app.services.preset_index import PresetIndex
+from benchmarks.fake_onvif_camera import FakeCameraState, serve
+
+
+@pytest.fixture
+def camera():
+    server, state = serve()
+    yield server.server_port, state
+    server.shutdown()
+    server.server_close()
+
+
+def run_with_service(port: int, scenario):
+    """Run `scenario(service)` against the fake camera listening on `port`."""
+
+    async def main():
+        service = OnvifService(
+            camera_id="cam",
+            onvif_settings=OnvifSettings(
+                ONVIF_CAMERA_IP_ADDRESS="127.0.0.1",
+                ONVIF_CAMERA_PORT=port,
+                ONVIF_CAMERA_USER="user",
+                ONVIF_CAMERA_PASSWORD="password",
+            ),
+            ptz_settings=PTZSettings(
+                PTZ_PAN_VELOCITY=0.5, tilt_velocity=0.5, PTZ_ZOOM_VELOCITY=0.5
+            ),
+            logger=structlog.get_logger(),
+        )
+        try:
+            return await scenario(service)
+        finally:
+            await service.close()
+
+    return asyncio.run(main())
+
+
+def get_presets_calls(state: FakeCameraState) -> int:
+    return state.calls.get("GetPresets", 0)
+
+
+def test_set_and_delete_update_the_index_without_fetching_it(camera):
+    port, state = camera
+
+    async def scenario(service: OnvifService):
+        await service.set_preset("home")
+        await service.set_preset("door")
+        await service.delete_preset("home")
+        return await service.list_presets()
+
+    presets = run_with_service(port, scenario)
+
+    assert presets == ["door"]
+    assert sorted(state.presets.values()) == ["door"]
+    # Only the first lookup fetched the presets, the writes went to the index
+    assert get_presets_calls(state) == 1
+
+
+def test_unknown_preset_refreshes_the_index_once(camera):
+    port, state = camera
+
+    async def scenario(service: OnvifService):
+        await service.list_presets()
+        # Added on the camera behind the service's back
+        token = state.add_preset("garden")
+        found = await service.get_preset_token("garden")
+        with pytest.raises(ValueError, match="Preset missing not found"):
+            await service.get_preset_token("missing")
+        return token, found
+
+    token, found = run_with_service(port, scenario)
+
+    assert found == token
+    # The initial fetch, plus one refresh per miss
+    assert get_presets_calls(state) == 3
+
+
+def test_index_goes_stale_after_its_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(preset_index.time, "monotonic", lambda: now)
+    index = PresetIndex(ttl=60.0)
+    assert not index.is_fresh
+
+    index.replace([("home", "preset_1")])
+    assert index.is_fresh
+    now += 59.0
+    assert index.is_fresh
+    now += 1.0
+    assert not index.is_fresh
+    # Stale entries are still served until the index is fetched again
+    assert index.get("home") == "preset_1"
+
+    index.replace([("door", "preset_2")])
+    assert index.is_fresh
+    assert index.names() == ["door"]
+    index.invalidate()
+    assert not index.is_fresh
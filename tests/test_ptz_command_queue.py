@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+import structlog
+
+from app.core.exceptions import ServiceClosedError
+from app.services.ptz_command_queue import PTZCommandQueue
+
+# Long enough for no scheduled Stop to fire during a test
+DURATION = 60.0
+
+
+class FakeCamera:
+    """Records the commands sent to it; sends block while `gate` is cleared."""
+
+    def __init__(self):
+        self.commands: list[tuple[float, float, float] | str] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.error: Exception | None = None
+
+    async def send_move(self, pan: float, tilt: float, zoom: float) -> None:
+        self.commands.append((pan, tilt, zoom))
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def send_stop(self) -> None:
+        self.commands.append("stop")
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+
+    def queue(self) -> PTZCommandQueue:
+        return PTZCommandQueue(self.send_move, self.send_stop, structlog.get_logger())
+
+
+async def in_flight(camera: FakeCamera, count: int) -> None:
+    """Wait until `count` commands have reached the camera."""
+    while len(camera.commands) < count:
+        await asyncio.sleep(0)
+
+
+def test_moves_submitted_while_one_is_sent_are_coalesced():
+    async def scenario():
+        camera = FakeCamera()
+        queue = camera.queue()
+        camera.gate.clear()
+        first = asyncio.create_task(queue.move((0.1, 0, 0), DURATION))
+        await in_flight(camera, 1)
+        replaced = asyncio.create_task(queue.move((0.2, 0, 0), DURATION))
+        latest = asyncio.create_task(queue.move((0.3, 0, 0), DURATION))
+        await asyncio.sleep(0)
+        camera.gate.set()
+        await asyncio.gather(first, replaced, latest)
+        await queue.close()
+        return camera, queue.stats()
+
+    camera, stats = asyncio.run(scenario())
+
+    assert camera.commands[:2] == [(0.1, 0, 0), (0.3, 0, 0)]
+    assert stats.submitted == 3
+    assert stats.sent == 2
+    assert stats.coalesced == 1
+
+
+def test_move_with_the_current_velocity_is_not_sent_again():
+    async def scenario():
+        camera = FakeCamera()
+        queue = camera.queue()
+        await queue.move((0.5, 0, 0), DURATION)
+        await queue.move((0.5, 0, 0), DURATION)
+        commands = list(camera.commands)
+        await queue.close()
+        return commands, queue.stats()
+
+    commands, stats = asyncio.run(scenario())
+
+    assert commands == [(0.5, 0, 0)]
+    assert stats.sent == 1
+    assert stats.dropped == 1
+
+
+def test_stop_discards_the_pending_move_and_goes_first():
+    async def scenario():
+        camera = FakeCamera()
+        queue = camera.queue()
+        camera.gate.clear()
+        first = asyncio.create_task(queue.move((0.1, 0, 0), DURATION))
+        await in_flight(camera, 1)
+        discarded = asyncio.create_task(queue.move((0.2, 0, 0), DURATION))
+        await asyncio.sleep(0)
+        stop = asyncio.create_task(queue.stop())
+        await asyncio.sleep(0)
+        after_stop = asyncio.create_task(queue.move((0.3, 0, 0), DURATION))
+        await asyncio.sleep(0)
+        camera.gate.set()
+        await asyncio.gather(first, discarded, stop, after_stop)
+        commands = list(camera.commands)
+        await queue.close()
+        return commands, queue.stats()
+
+    commands, stats = asyncio.run(scenario())
+
+    assert commands == [(0.1, 0, 0), "stop", (0.3, 0, 0)]
+    assert stats.stops == 1
+    assert stats.dropped == 1
+
+
+def test_send_errors_are_raised_to_the_waiting_callers():
+    async def scenario():
+        camera = FakeCamera()
+        queue = camera.queue()
+        camera.error = OSError("camera unreachable")
+        with pytest.raises(OSError, match="camera unreachable"):
+            await queue.move((0.1, 0, 0), DURATION)
+        with pytest.raises(OSError, match="camera unreachable"):
+            await queue.stop()
+        camera.error = None
+        # The queue keeps working once the camera answers again
+        await queue.move((0.2, 0, 0), DURATION)
+        commands = list(camera.commands)
+        await queue.close()
+        return commands, queue.stats()
+
+    commands, stats = asyncio.run(scenario())
+
+    assert commands == [(0.1, 0, 0), "stop", (0.2, 0, 0)]
+    assert stats.sent == 1
+    assert stats.stops == 0
+
+
+def test_close_fails_waiting_commands_and_refuses_new_ones():
+    async def scenario():
+        camera = FakeCamera()
+        queue = camera.queue()
+        held = asyncio.create_task(queue.move((0.1, 0, 0), DURATION, wait=True))
+        await in_flight(camera, 1)
+        camera.gate.clear()
+        sending = asyncio.create_task(queue.move((0.2, 0, 0), DURATION))
+        await in_flight(camera, 2)
+        # Closing cancels the move being sent before the camera's answer is handled
+        camera.gate.set()
+        await queue.close()
+
+        for task in (held, sending):
+            with pytest.raises(ServiceClosedError):
+                await task
+        with pytest.raises(ServiceClosedError):
+            await queue.move((0.3, 0, 0), DURATION)
+        with pytest.raises(ServiceClosedError):
+            await queue.stop()
+        return camera.commands
+
+    commands = asyncio.run(scenario())
+
+    # The camera is still stopped on the way out
+    assert commands[-1] == "stop"
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.services.snapshot_cache import SnapshotCache
+
+
+class FakeCamera:
+    """Counts snapshot fetches; a fetch blocks until `gate` is set."""
+
+    def __init__(self):
+        self.fetches = 0
+        self.gate = asyncio.Event()
+        self.error: Exception | None = None
+
+    async def fetch(self) -> bytes:
+        self.fetches += 1
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return f"jpeg {self.fetches}".encode()
+
+
+def test_concurrent_requests_share_one_fetch():
+    async def scenario():
+        camera = FakeCamera()
+        cache = SnapshotCache(ttl=60.0, fetch=camera.fetch)
+        requests = [asyncio.create_task(cache.get()) for _ in range(10)]
+        await asyncio.sleep(0)
+        camera.gate.set()
+        snapshots = await asyncio.gather(*requests)
+        # Served from memory while it is fresh
+        snapshots.append(await cache.get())
+        return camera.fetches, snapshots
+
+    fetches, snapshots = asyncio.run(scenario())
+
+    assert fetches == 1
+    assert snapshots == [b"jpeg 1"] * 11
+
+
+def test_stale_snapshot_is_fetched_again():
+    async def scenario():
+        camera = FakeCamera()
+        camera.gate.set()
+        cache = SnapshotCache(ttl=0.0, fetch=camera.fetch)
+        return [await cache.get(), await cache.get()]
+
+    assert asyncio.run(scenario()) == [b"jpeg 1", b"jpeg 2"]
+
+
+def test_cancelled_request_does_not_cancel_the_shared_fetch():
+    async def scenario():
+        camera = FakeCamera()
+        cache = SnapshotCache(ttl=60.0, fetch=camera.fetch)
+        cancelled = asyncio.create_task(cache.get())
+        waiting = asyncio.create_task(cache.get())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        camera.gate.set()
+        return camera, await waiting
+
+    camera, snapshot = asyncio.run(scenario())
+
+    assert snapshot == b"jpeg 1"
+    assert camera.fetches == 1
+
+
+def test_failed_fetch_is_raised_to_every_request_and_retried():
+    async def scenario():
+        camera = FakeCamera()
+        camera.error = OSError("camera unreachable")
+        cache = SnapshotCache(ttl=60.0, fetch=camera.fetch)
+        requests = [asyncio.create_task(cache.get()) for _ in range(3)]
+        await asyncio.sleep(0)
+        camera.gate.set()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        camera.error = None
+        return results, await cache.get()
+
+    results, snapshot = asyncio.run(scenario())
+
+    assert all(isinstance(result, OSError) for result in results)
+    assert snapshot == b"jpeg 2"
+
+
+def test_close_cancels_the_fetch_in_flight():
+    async def scenario():
+        camera = FakeCamera()
+        cache = SnapshotCache(ttl=60.0, fetch=camera.fetch)
+        request = asyncio.create_task(cache.get())
+        await asyncio.sleep(0)
+        cache.close()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+
+    asyncio.run(scenario())